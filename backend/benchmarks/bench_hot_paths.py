@@ -0,0 +1,72 @@
+"""Micro-benchmarks for the CPU-bound helpers used on every generation"""
+import base64
+
+import server
+
+
+def _outfit_request(**overrides):
+    data = {
+        "atmosphere": "elegant",
+        "suit_type": "Costume 3 pièces",
+        "lapel_type": "Revers cran aigu large",
+        "pocket_type": "En biais avec rabat",
+        "shoe_type": "Richelieu noires",
+        "accessory_type": "Nœud papillon",
+        "gender": "homme",
+        "fabric_description": "Laine bleu nuit à fines rayures",
+    }
+    data.update(overrides)
+    return server.OutfitRequestCreate(**data)
+
+
+def bench_render_generated_image(benchmark, sample_image):
+    watermarked, master = benchmark(
+        server.render_generated_image, sample_image, server.IMAGE_STORAGE_FORMAT, str(server.WATERMARK_PATH)
+    )
+    assert watermarked != master
+
+
+def bench_build_outfit_prompt(benchmark):
+    outfit_request = _outfit_request()
+    prompt = benchmark(server.build_outfit_prompt, outfit_request)
+    assert "Costume 3 pièces" in prompt
+
+
+def bench_build_outfit_prompt_custom_descriptions(benchmark):
+    outfit_request = _outfit_request(
+        suit_type="Costume 2 pièces",
+        shoe_type="Description texte",
+        custom_shoe_description="Derbies en daim gris",
+        accessory_type="Description texte",
+        custom_accessory_description="Lavallière en soie bordeaux",
+    )
+    prompt = benchmark(server.build_outfit_prompt, outfit_request)
+    assert "SANS GILET" in prompt
+
+
+def bench_build_modification_prompt(benchmark):
+    original_request = server.OutfitRequest(**_outfit_request().dict())
+    prompt = benchmark(server.build_modification_prompt, original_request, "Changer la cravate en bleu marine")
+    assert "bleu marine" in prompt
+
+
+def bench_base64_encode_reference_image(benchmark, sample_image):
+    encoded = benchmark(lambda: base64.b64encode(sample_image).decode('utf-8'))
+    assert len(encoded) > len(sample_image)
+
+
+def bench_base64_decode_model_output(benchmark, sample_image):
+    encoded = base64.b64encode(sample_image).decode('utf-8')
+    decoded = benchmark(base64.b64decode, encoded)
+    assert decoded == sample_image
+
+
+def bench_hash_password(benchmark):
+    # bcrypt is deliberately slow, keep the number of rounds small
+    hashed = benchmark.pedantic(server.hash_password, args=("Motdepasse123",), rounds=5, iterations=1)
+    assert hashed.startswith("$2")
+
+
+def bench_verify_password(benchmark):
+    hashed = server.hash_password("Motdepasse123")
+    assert benchmark.pedantic(server.verify_password, args=("Motdepasse123", hashed), rounds=5, iterations=1)
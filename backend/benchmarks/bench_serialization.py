@@ -0,0 +1,86 @@
+"""Serialization cost of 1000-row list responses, before and after orjson"""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import server
+
+ROWS = 1000
+
+
+@pytest.fixture(scope="module")
+def request_rows():
+    """Raw outfit_requests documents as Motor returns them (naive UTC datetimes)"""
+    now = datetime.utcnow()
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "atmosphere": "elegant",
+            "suit_type": "Costume 3 pièces",
+            "lapel_type": "Revers cran aigu large",
+            "pocket_type": "En biais avec rabat",
+            "shoe_type": "Richelieu noires",
+            "accessory_type": "Nœud papillon",
+            "gender": "homme",
+            "fabric_description": "Laine bleu nuit à fines rayures, doublure satin bordeaux",
+            "custom_shoe_description": None,
+            "custom_accessory_description": None,
+            "email": "client@example.com",
+            "user_email": f"user{i % 40}@example.com",
+            "image_format": "webp",
+            "status": "succeeded",
+            "failure_reason": None,
+            "timestamp": now - timedelta(minutes=i),
+        }
+        for i in range(ROWS)
+    ]
+
+
+@pytest.fixture(scope="module")
+def user_rows():
+    now = datetime.utcnow()
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "nom": f"Utilisateur {i}",
+            "email": f"user{i}@example.com",
+            "role": "client",
+            "images_used_total": i % 5,
+            "images_limit_total": 5,
+            "images_reserved_total": 0,
+            "created_at": now - timedelta(days=i),
+            "is_active": True,
+            "is_verified": True,
+        }
+        for i in range(ROWS)
+    ]
+
+
+def bench_requests_pydantic_json(benchmark, request_rows):
+    """Previous path: OutfitRequest per row, jsonable_encoder, stdlib json"""
+    body = benchmark(lambda: JSONResponse(jsonable_encoder([server.OutfitRequest(**row) for row in request_rows])).body)
+    assert body.startswith(b"[")
+
+
+def bench_requests_orjson(benchmark, request_rows):
+    body = benchmark(lambda: server.FastJSONResponse(request_rows).body)
+    assert body.startswith(b"[")
+
+
+def bench_requests_summary_orjson(benchmark, request_rows):
+    summaries = [{name: row[name] for name in server.REQUEST_SUMMARY_FIELDS} for row in request_rows]
+    body = benchmark(lambda: server.FastJSONResponse(summaries).body)
+    assert b"fabric_description" not in body
+
+
+def bench_users_pydantic_json(benchmark, user_rows):
+    body = benchmark(lambda: JSONResponse(jsonable_encoder([server.User(**row).model_dump() for row in user_rows])).body)
+    assert body.startswith(b"[")
+
+
+def bench_users_orjson(benchmark, user_rows):
+    body = benchmark(lambda: server.FastJSONResponse(user_rows).body)
+    assert body.startswith(b"[")
@@ -0,0 +1,44 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BENCH_DIR = Path(__file__).parent
+BACKEND_DIR = BENCH_DIR.parent
+REPO_DIR = BACKEND_DIR.parent
+
+# server.py connects lazily, so a placeholder URL is enough to import it
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'tailorview_bench')
+os.environ.setdefault('EMERGENT_LLM_KEY', 'benchmark')
+sys.path.insert(0, str(BACKEND_DIR))
+
+import server  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def sample_images():
+    """Representative generated images (largest first) from generated_images/"""
+    paths = sorted(
+        (REPO_DIR / "generated_images").glob("*.png"),
+        key=lambda p: p.stat().st_size,
+        reverse=True
+    )
+    if not paths:
+        pytest.skip("No sample images in generated_images/")
+    return [p.read_bytes() for p in paths[:3]]
+
+
+@pytest.fixture(scope="session")
+def sample_image(sample_images):
+    return sample_images[0]
+
+
+@pytest.fixture(scope="session", autouse=True)
+def watermark_logo():
+    """Point the watermark at the logo shipped with the repository"""
+    original = server.WATERMARK_PATH
+    server.WATERMARK_PATH = REPO_DIR / "logo_watermark.png"
+    yield server.WATERMARK_PATH
+    server.WATERMARK_PATH = original
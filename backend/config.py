@@ -0,0 +1,124 @@
+"""Typed configuration of the TailorView backend.
+
+Kept apart from server.py so the launcher can read the settings the
+workers will run with without importing the app, its clients or its
+side effects on os.environ.
+"""
+from pathlib import Path
+from typing import Literal, Optional
+
+from pydantic import Field, SecretStr, field_validator, model_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+BACKEND_DIR = Path(__file__).parent
+
+
+class Settings(BaseSettings):
+    """Typed configuration, read from the environment (and backend/.env) once.
+
+    Every field maps to the upper-case environment variable of the same name.
+    Invalid or incomplete configuration fails at import, before serving.
+    """
+    model_config = SettingsConfigDict(env_file=BACKEND_DIR / '.env', extra='ignore')
+    
+    # Core
+    mongo_url: SecretStr
+    db_name: str
+    jwt_secret: SecretStr = SecretStr('your-secret-key-change-this')
+    cors_origins: str = '*'
+    frontend_url: str = 'http://localhost:3000'
+    watermark_path: Path = Path('/app/logo_watermark.png')
+    
+    # Email
+    smtp_server: str = 'mail.infomaniak.com'
+    smtp_port: int = Field(587, ge=1, le=65535)
+    sender_email: Optional[str] = None
+    sender_password: Optional[SecretStr] = None
+    email_outbox_interval_seconds: int = Field(60, gt=0)
+    email_outbox_max_attempts: int = Field(5, ge=1)
+    email_outbox_claim_seconds: int = Field(300, gt=0)
+    email_outbox_batch_size: int = Field(20, ge=1)
+    
+    # Image model
+    emergent_llm_key: SecretStr
+    model_max_concurrency: int = Field(8, ge=1)
+    model_max_concurrency_per_user: int = Field(2, ge=1)
+    model_max_queue_wait_seconds: float = Field(60, gt=0)
+    model_cluster_max_concurrency: Optional[int] = Field(None, ge=1)  # defaults to model_max_concurrency
+    model_slot_lease_seconds: float = Field(600, gt=0)
+    model_call_timeout_seconds: float = Field(90, gt=0)
+    model_call_max_attempts: int = Field(3, ge=1)
+    model_retry_base_delay_seconds: float = Field(1, ge=0)
+    model_retry_max_delay_seconds: float = Field(10, ge=0)
+    model_hedge_enabled: bool = False
+    model_hedge_percentile: float = Field(0.95, gt=0, lt=1)
+    model_breaker_failure_threshold: int = Field(5, ge=1)
+    model_breaker_reset_seconds: float = Field(30, gt=0)
+    model_input_max_side: int = Field(1024, ge=256)
+    modify_batch_max_items: int = Field(10, ge=1)
+    
+    # Image storage
+    image_storage_backend: Literal['local', 's3'] = 'local'
+    image_storage_dir: Path = Path('/app/generated_images')
+    s3_bucket: Optional[str] = None
+    s3_prefix: str = 'generated_images/'
+    s3_endpoint_url: Optional[str] = None  # e.g. a MinIO server
+    s3_region: Optional[str] = None
+    image_storage_format: Literal['webp', 'avif', 'jpeg', 'png'] = 'webp'
+    image_storage_quality: int = Field(90, ge=1, le=100)
+    image_worker_processes: int = Field(0, ge=0)
+    image_cache_max_age_seconds: int = Field(365 * 24 * 3600, ge=0)
+    
+    # Downloads
+    download_url_secret: Optional[SecretStr] = None  # defaults to jwt_secret
+    download_url_ttl_seconds: int = Field(3600, gt=0)
+    download_export_url_ttl_seconds: int = Field(30 * 24 * 3600, gt=0)  # links in spreadsheet exports
+    download_require_signature: bool = False
+    download_offload: Literal['none', 'x-accel-redirect', 'x-sendfile'] = 'none'
+    download_accel_prefix: str = '/protected-images/'
+    download_bundle_max_items: int = Field(100, ge=1)
+    
+    # Coordination, statistics
+    coordination_backend: Literal['local', 'mongo'] = 'local'
+    lease_grace_seconds: float = Field(30, ge=0)
+    settings_sync_interval_seconds: float = Field(30, gt=0)
+    stats_cache_ttl_seconds: int = Field(15, ge=0)
+    analytics_rollup_interval_seconds: int = Field(600, gt=0)
+    
+    # Retention, 0 disables a policy
+    retention_max_age_days: int = Field(0, ge=0)
+    retention_inactive_user_days: int = Field(0, ge=0)
+    retention_storage_budget_bytes: int = Field(0, ge=0)
+    retention_action: Literal['delete', 'archive'] = 'delete'
+    retention_email_queue_days: int = Field(30, ge=0)
+    retention_delete_orphan_files: bool = False
+    retention_batch_size: int = Field(200, ge=1)
+    retention_sweep_interval_seconds: int = Field(6 * 3600, gt=0)
+    
+    # Cold tier, 0 disables the archival of old images into monthly bundles
+    cold_archive_after_days: int = Field(0, ge=0)
+    cold_bundle_max_bytes: int = Field(64 * 1024 * 1024, gt=0)
+    cold_cache_ttl_seconds: int = Field(24 * 3600, gt=0)
+    cold_archive_interval_seconds: int = Field(6 * 3600, gt=0)
+    
+    # Reconciliation of request records with image storage
+    reconcile_interval_seconds: int = Field(6 * 3600, gt=0)
+    reconcile_pending_timeout_seconds: int = Field(3600, gt=0)
+    reconcile_repair: bool = True
+    
+    @field_validator('image_storage_format', 'download_offload', 'image_storage_backend', 'coordination_backend', mode='before')
+    @classmethod
+    def lower_case(cls, value):
+        return value.lower() if isinstance(value, str) else value
+    
+    @model_validator(mode='after')
+    def check_dependencies(self):
+        if bool(self.sender_email) != bool(self.sender_password):
+            raise ValueError("SENDER_EMAIL and SENDER_PASSWORD must be set together")
+        if self.image_storage_backend == 's3' and not self.s3_bucket:
+            raise ValueError("S3_BUCKET must be set when IMAGE_STORAGE_BACKEND=s3")
+        return self
+    
+    @property
+    def smtp_password(self) -> Optional[str]:
+        return self.sender_password.get_secret_value() if self.sender_password else None
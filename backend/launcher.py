@@ -0,0 +1,179 @@
+"""Production entry point for the TailorView backend.
+
+Usage:
+    python launcher.py                    # prod preset, sized from the available CPUs
+    python launcher.py --preset dev       # single worker with auto-reload
+    python launcher.py --workers 4 --image-workers 2 --print-config
+
+API workers are uvicorn processes running the async app (uvloop + httptools
+in production). Watermarking and transcoding run in a separate process pool
+inside each worker (IMAGE_WORKER_PROCESSES), so CPU-bound image work never
+blocks request handling. Settings come from the environment and backend/.env,
+as in the workers; an IMAGE_WORKER_PROCESSES set there wins over the preset.
+
+On SIGTERM uvicorn stops accepting connections and waits up to the graceful
+timeout for in-flight requests. The default covers a full generation:
+model retries plus the limiter queue wait. The orchestrator's kill timeout
+(e.g. Kubernetes terminationGracePeriodSeconds) must be longer than that.
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import math
+import os
+from pathlib import Path
+
+import uvicorn
+
+BACKEND_DIR = Path(__file__).parent
+
+logger = logging.getLogger("launcher")
+
+PRESETS = {
+    "dev": {
+        "workers": 1,
+        "image_workers": 0,
+        "reload": True,
+        "loop": "auto",
+        "http": "auto",
+        "keep_alive": 5,
+        "graceful_timeout": 5,
+        "access_log": True,
+    },
+    "prod": {
+        "workers": None,  # sized from the CPUs
+        "image_workers": None,  # sized from the CPUs
+        "reload": False,
+        "loop": "uvloop",
+        "http": "httptools",
+        # Longer than the idle timeout of common load balancers (60s), so the
+        # balancer never reuses a connection the server is closing
+        "keep_alive": 75,
+        "graceful_timeout": None,  # generation budget
+        "access_log": False,
+    },
+}
+
+
+def available_cpus() -> int:
+    """CPUs this process may use, honouring affinity and cgroup v2 quotas"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def load_settings():
+    """Settings the workers will run with: the environment, then backend/.env.
+
+    Read from config rather than server, so the parent neither builds the
+    app's clients nor copies backend/.env into the environment the workers
+    inherit (server would then take those keys for process variables that
+    a settings reload must not override).
+    """
+    from config import Settings
+    return Settings()
+
+
+def generation_budget(settings) -> int:
+    """Worst-case duration of a generation request, in seconds"""
+    attempts = settings.model_call_max_attempts
+    return math.ceil(
+        settings.model_call_timeout_seconds * attempts
+        + settings.model_retry_max_delay_seconds * (attempts - 1)
+        + settings.model_max_queue_wait_seconds
+    )
+
+
+def resolve_config(args) -> dict:
+    preset = dict(PRESETS[args.preset])
+    for name in preset:
+        value = getattr(args, name, None)
+        if value is not None:
+            preset[name] = value
+
+    settings = load_settings()
+    cpus = available_cpus()
+    # An image pool size configured in the environment or backend/.env wins
+    # over the preset, the command line over both
+    configured = 'image_worker_processes' in settings.model_fields_set
+    if args.image_workers is None and configured:
+        preset["image_workers"] = settings.image_worker_processes
+    # Requests spend their time awaiting the model, Mongo and storage, so one
+    # async worker per CPU saturates the machine; image work gets the same
+    # CPUs through its own pool, split between the workers
+    if preset["workers"] is None:
+        preset["workers"] = max(1, min(cpus, args.max_workers))
+    if preset["image_workers"] is None:
+        preset["image_workers"] = max(1, cpus // preset["workers"])
+    if preset["graceful_timeout"] is None:
+        preset["graceful_timeout"] = generation_budget(settings)
+    if preset["reload"] and preset["workers"] > 1:
+        logger.warning("Auto-reload only supports one worker, ignoring --workers")
+        preset["workers"] = 1
+
+    # Fall back to the pure-Python implementations when the fast ones are missing
+    for name, module in (("loop", "uvloop"), ("http", "httptools")):
+        if preset[name] == module and importlib.util.find_spec(module) is None:
+            logger.warning(f"{module} is not installed, falling back to the default {name}")
+            preset[name] = "auto"
+
+    preset.update(host=args.host, port=args.port, cpus=cpus, image_workers_configured=configured)
+    return preset
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the TailorView backend")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default=os.getenv('SERVER_PRESET', 'prod'))
+    parser.add_argument("--host", default=os.getenv('HOST', '0.0.0.0'))
+    parser.add_argument("--port", type=int, default=int(os.getenv('PORT', '8001')))
+    parser.add_argument("--workers", type=int, help="API worker processes (default: one per CPU)")
+    parser.add_argument("--max-workers", type=int, default=int(os.getenv('MAX_WORKERS', '8')))
+    parser.add_argument("--image-workers", type=int, help="Image processes per API worker, 0 to use threads")
+    parser.add_argument("--keep-alive", type=int, help="Idle keep-alive timeout in seconds")
+    parser.add_argument("--graceful-timeout", type=int, help="Seconds to drain in-flight requests on SIGTERM")
+    parser.add_argument("--print-config", action="store_true", help="Print the resolved configuration and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    config = resolve_config(args)
+    if args.print_config:
+        print(json.dumps(config, indent=2))
+        return
+
+    # Read by server.py in each worker process, which would otherwise keep
+    # the value from the environment or backend/.env
+    if args.image_workers is not None or not config["image_workers_configured"]:
+        os.environ['IMAGE_WORKER_PROCESSES'] = str(config["image_workers"])
+    logger.info(
+        f"Starting {config['workers']} worker(s) on {config['host']}:{config['port']} "
+        f"({config['cpus']} CPUs, {config['image_workers']} image process(es) per worker)"
+    )
+    uvicorn.run(
+        "server:app",
+        app_dir=str(BACKEND_DIR),
+        host=config["host"],
+        port=config["port"],
+        workers=config["workers"],
+        reload=config["reload"],
+        reload_dirs=[str(BACKEND_DIR)] if config["reload"] else None,
+        loop=config["loop"],
+        http=config["http"],
+        timeout_keep_alive=config["keep_alive"],
+        timeout_graceful_shutdown=config["graceful_timeout"],
+        access_log=config["access_log"],
+        proxy_headers=True,
+        forwarded_allow_ips=os.getenv('FORWARDED_ALLOW_IPS', '127.0.0.1'),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Maintenance commands for the TailorView backend.
+
+Usage:
+    python manage.py migrate-image-layout [--dry-run] [--batch-size N]
+    python manage.py rebuild-stats
+    python manage.py rollup-analytics [--days N | --backfill]
+    python manage.py sweep-retention [--dry-run]
+    python manage.py reconcile [--dry-run]
+    python manage.py archive-cold [--dry-run]
+    python manage.py backfill-lineage
+"""
+import argparse
+import asyncio
+import json
+
+import server
+
+
+async def migrate_image_layout(args):
+    return await server.migrate_image_layout(dry_run=args.dry_run, batch_size=args.batch_size)
+
+
+async def rebuild_stats(args):
+    return await server.rebuild_stats()
+
+
+async def rollup_analytics(args):
+    if args.backfill:
+        return await server.backfill_rollups()
+    return await server.rollup_days(args.days)
+
+
+async def sweep_retention(args):
+    return await server.run_retention_sweep(dry_run=args.dry_run)
+
+
+async def reconcile(args):
+    return await server.run_reconciliation(dry_run=args.dry_run)
+
+
+async def archive_cold(args):
+    return await server.run_cold_archival(dry_run=args.dry_run)
+
+
+async def backfill_lineage(args):
+    return await server.backfill_lineage()
+
+
+async def run(args):
+    server.open_database()
+    try:
+        return await args.handler(args)
+    finally:
+        server.close_database()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TailorView maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    migrate = subparsers.add_parser(
+        "migrate-image-layout",
+        help="Move flat generated_<id>.png images into the sharded ab/cd/ layout"
+    )
+    migrate.add_argument("--dry-run", action="store_true", help="Only count the images that would be moved")
+    migrate.add_argument("--batch-size", type=int, default=500)
+    migrate.set_defaults(handler=migrate_image_layout)
+    
+    rebuild = subparsers.add_parser("rebuild-stats", help="Recompute the admin statistics counters")
+    rebuild.set_defaults(handler=rebuild_stats)
+    
+    rollup = subparsers.add_parser("rollup-analytics", help="Recompute the daily analytics rollups")
+    rollup.add_argument("--days", type=int, default=2, help="Number of days to recompute, today included")
+    rollup.add_argument("--backfill", action="store_true", help="Recompute every day since the first request")
+    rollup.set_defaults(handler=rollup_analytics)
+    
+    sweep = subparsers.add_parser("sweep-retention", help="Apply the retention policies to requests, images and queued emails")
+    sweep.add_argument("--dry-run", action="store_true", help="Only report what would be expired")
+    sweep.set_defaults(handler=sweep_retention)
+    
+    check = subparsers.add_parser("reconcile", help="Check request records against image storage and repair them")
+    check.add_argument("--dry-run", action="store_true", help="Only report the inconsistencies")
+    check.set_defaults(handler=reconcile)
+    
+    cold = subparsers.add_parser("archive-cold", help="Pack old images into monthly bundles and evict restored ones")
+    cold.add_argument("--dry-run", action="store_true", help="Only report what would be bundled")
+    cold.set_defaults(handler=archive_cold)
+    
+    lineage = subparsers.add_parser("backfill-lineage", help="Record the modification chain on requests created before lineage tracking")
+    lineage.set_defaults(handler=backfill_lineage)
+    
+    args = parser.parse_args()
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
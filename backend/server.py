@@ -1,11 +1,11 @@
-from fastapi import FastAPI, APIRouter, File, UploadFile, Form, HTTPException, Depends, BackgroundTasks
-from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
+from fastapi import FastAPI, APIRouter, File, UploadFile, Form, HTTPException, Depends, BackgroundTasks, Request
+from fastapi.responses import JSONResponse, ORJSONResponse, FileResponse, StreamingResponse, Response, RedirectResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from dotenv import load_dotenv
+from dotenv import load_dotenv, dotenv_values
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
-from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, EmailStr, ValidationError
+from typing import AsyncIterator, Callable, List, Optional
 import os
 import logging
 import uuid
@@ -17,9 +17,23 @@ import bcrypt
 import re
 import csv
 import json
+import time
+import math
+import itertools
+import hashlib
+import hmac
+import gzip
+import tarfile
+import zipfile
+import random
+import socket
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from collections import defaultdict, deque
+from contextlib import contextmanager, asynccontextmanager
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw, ImageFont, features
 import io
 import smtplib
 from email.mime.multipart import MIMEMultipart
@@ -27,25 +41,947 @@ from email.mime.base import MIMEBase
 from email import encoders
 from email.mime.text import MIMEText
 from emergentintegrations.llm.chat import LlmChat, UserMessage, ImageContent
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne, monitoring
+from pymongo.errors import DuplicateKeyError
+from cachetools import TTLCache
+import orjson
+
+from config import Settings
 
 ROOT_DIR = Path(__file__).parent
+# Variables set by the process environment win over backend/.env, on reload too
+PROCESS_ENV_KEYS = frozenset(os.environ)
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Settings read when they are used, which a reload therefore applies without a
+# restart; every other field is bound to a module constant at import.
+RELOADABLE_SETTINGS = frozenset({
+    "smtp_server", "smtp_port", "sender_email", "sender_password", "frontend_url", "emergent_llm_key"
+})
+
+settings = Settings()
+
+def get_settings() -> Settings:
+    """Current settings; a dependency for routes and the accessor for services"""
+    return settings
+
+def reload_settings() -> dict:
+    """Re-read the environment and backend/.env, swapping the settings if they validate"""
+    global settings
+    for key, value in dotenv_values(ROOT_DIR / '.env').items():
+        if key not in PROCESS_ENV_KEYS and value is not None:
+            os.environ[key] = value
+    new_settings = Settings()
+    changed = sorted(name for name in Settings.model_fields if getattr(new_settings, name) != getattr(settings, name))
+    settings = new_settings
+    return {
+        "changed": changed,
+        "restart_required": [name for name in changed if name not in RELOADABLE_SETTINGS]
+    }
+
+# Metrics
+GENERATION_STAGE_SECONDS = Histogram(
+    "tailorview_generation_stage_seconds",
+    "Time spent in each stage of the image generation pipelines",
+    ["pipeline", "stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+)
+GENERATION_SECONDS = Histogram(
+    "tailorview_generation_seconds",
+    "End-to-end duration of the image generation pipelines",
+    ["pipeline", "outcome"],
+    buckets=(0.5, 1, 2.5, 5, 10, 15, 20, 30, 45, 60, 90, 120, 180)
+)
+HTTP_REQUESTS = Counter(
+    "tailorview_http_requests_total",
+    "HTTP requests handled, by route template and status code",
+    ["method", "route", "status"]
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "tailorview_http_request_seconds",
+    "HTTP request latency by route template",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "tailorview_http_requests_in_flight",
+    "HTTP requests currently being handled"
+)
+MONGO_COMMAND_SECONDS = Histogram(
+    "tailorview_mongo_command_seconds",
+    "MongoDB command latency by command and collection",
+    ["command", "collection", "outcome"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+SMTP_ATTEMPTS = Counter(
+    "tailorview_smtp_attempts_total",
+    "SMTP delivery attempts by server, port and result",
+    ["server", "port", "result"]
+)
+MODEL_CALL_SECONDS = Histogram(
+    "tailorview_model_call_seconds",
+    "Latency of image model calls",
+    ["operation"],
+    buckets=(0.5, 1, 2.5, 5, 7.5, 10, 15, 20, 30, 45, 60, 90, 120)
+)
+MODEL_CALL_FAILURES = Counter(
+    "tailorview_model_call_failures_total",
+    "Failed image model calls by reason",
+    ["operation", "reason"]
+)
+MODEL_QUEUE_WAIT_SECONDS = Histogram(
+    "tailorview_model_queue_wait_seconds",
+    "Time spent waiting for an image model slot, by role",
+    ["role"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+)
+MODEL_QUEUE_DEPTH = Gauge(
+    "tailorview_model_queue_depth",
+    "Requests waiting for an image model slot"
+)
+MODEL_CALLS_IN_FLIGHT = Gauge(
+    "tailorview_model_calls_in_flight",
+    "Image model calls currently holding a limiter slot"
+)
+MODEL_LIMITER_REJECTIONS = Counter(
+    "tailorview_model_limiter_rejections_total",
+    "Requests turned away by the image model limiter",
+    ["role", "reason"]
+)
+MODEL_CALL_RETRIES = Counter(
+    "tailorview_model_call_retries_total",
+    "Image model calls retried after a retryable failure",
+    ["operation", "reason"]
+)
+MODEL_CALL_HEDGES = Counter(
+    "tailorview_model_call_hedges_total",
+    "Hedged second requests sent to the image model, by which request won",
+    ["operation", "winner"]
+)
+MODEL_CIRCUIT_STATE = Gauge(
+    "tailorview_model_circuit_state",
+    "Image model circuit breaker state (0 closed, 1 half-open, 2 open)"
+)
+MODEL_CIRCUIT_REJECTIONS = Counter(
+    "tailorview_model_circuit_rejections_total",
+    "Image model calls refused because the circuit breaker is open",
+    ["operation"]
+)
+STARTUP_SECONDS = Gauge(
+    "tailorview_startup_seconds",
+    "Duration of each application startup step in this process",
+    ["step"]
+)
+EMAIL_QUEUE_PENDING = Gauge(
+    "tailorview_email_queue_pending",
+    "Emails waiting in the email queue for manual processing"
+)
+GENERATED_IMAGES_FILES = Gauge(
+    "tailorview_generated_images_files",
+    "Number of files in the generated images directory"
+)
+GENERATED_IMAGES_BYTES = Gauge(
+    "tailorview_generated_images_bytes",
+    "Disk space used by the generated images directory"
+)
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Feed MongoDB command timings into Prometheus"""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self._collections[(event.connection_id, event.request_id)] = collection if isinstance(collection, str) else ""
+
+    def _observe(self, event, outcome):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_SECONDS.labels(event.command_name, collection, outcome).observe(event.duration_micros / 1e6)
+
+    def succeeded(self, event):
+        self._observe(event, "success")
+
+    def failed(self, event):
+        self._observe(event, "failure")
+
+class PrometheusMiddleware:
+    """ASGI middleware recording request counts, latency and in-flight requests per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        status_code = 500
+        
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            # Label by route template rather than raw path to keep cardinality bounded
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route_path).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(scope["method"], route_path, str(status_code)).inc()
+
+# MongoDB connection, opened by the lifespan handler (AppContext.start) or by
+# scripts through open_database, and closed on shutdown.
+client: Optional[AsyncIOMotorClient] = None
+db = None
+
+def open_database():
+    """Create the Mongo client, which connects lazily, and bind db"""
+    global client, db
+    if client is None:
+        client = AsyncIOMotorClient(settings.mongo_url.get_secret_value(), event_listeners=[MongoCommandMetrics()])
+        db = client[settings.db_name]
+    return db
+
+def close_database():
+    global client, db
+    if client is not None:
+        client.close()
+    client = db = None
 
 # Create the main app
-app = FastAPI()
+class FastJSONResponse(ORJSONResponse):
+    """orjson-rendered responses; naive datetimes coming from Mongo are UTC"""
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build the process-wide resources once, release them on shutdown"""
+    await app_context.start()
+    try:
+        yield
+    finally:
+        await app_context.stop()
+
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
 api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
 
 # JWT Configuration
-JWT_SECRET = os.getenv('JWT_SECRET', 'your-secret-key-change-this')
+JWT_SECRET = settings.jwt_secret.get_secret_value()
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_HOURS = 24
 
+class StageTimer:
+    """Collect per-stage timings for one run of a generation pipeline"""
+
+    def __init__(self, pipeline: str):
+        self.pipeline = pipeline
+        self.started_at = datetime.now(timezone.utc)
+        self.stages = {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+            GENERATION_STAGE_SECONDS.labels(self.pipeline, name).observe(elapsed)
+
+    def finish(self, outcome: str) -> dict:
+        """Record the end-to-end duration and return the timings document"""
+        total = time.perf_counter() - self._start
+        GENERATION_SECONDS.labels(self.pipeline, outcome).observe(total)
+        return {
+            "pipeline": self.pipeline,
+            "outcome": outcome,
+            "started_at": self.started_at,
+            "total_ms": round(total * 1000, 1),
+            "stages_ms": {name: round(elapsed * 1000, 1) for name, elapsed in self.stages.items()}
+        }
+
+async def save_request_timings(request_id: str, timer: StageTimer, outcome: str, extra: Optional[dict] = None):
+    """Persist the pipeline timings (and any extra fields) on the outfit_requests document"""
+    try:
+        await db.outfit_requests.update_one(
+            {"id": request_id},
+            {"$set": {"timings": timer.finish(outcome), **(extra or {})}}
+        )
+    except Exception as e:
+        logger.warning(f"Could not save timings for request {request_id}: {e}")
+
+@app.get("/metrics")
+async def metrics():
+    """Expose Prometheus metrics"""
+    try:
+        EMAIL_QUEUE_PENDING.set(await db.email_queue.count_documents({"status": "pending"}))
+    except Exception as e:
+        logger.warning(f"Could not count pending emails: {e}")
+    
+    try:
+        files, total_bytes = await cached_storage_usage()
+        GENERATED_IMAGES_FILES.set(files)
+        GENERATED_IMAGES_BYTES.set(total_bytes)
+    except Exception as e:
+        logger.warning(f"Could not measure image storage usage: {e}")
+    
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+# Image storage
+IMAGE_STORAGE_BACKEND = settings.image_storage_backend
+IMAGE_STORAGE_DIR = settings.image_storage_dir
+S3_BUCKET = settings.s3_bucket
+S3_PREFIX = settings.s3_prefix
+S3_ENDPOINT_URL = settings.s3_endpoint_url
+S3_REGION = settings.s3_region
+STORAGE_CHUNK_SIZE = 64 * 1024
+STORAGE_USAGE_TTL_SECONDS = 60
+
+# Stored rendition of generated images
+IMAGE_FORMATS = {
+    "webp": {"extension": "webp", "mime": "image/webp", "pil": "WEBP"},
+    "avif": {"extension": "avif", "mime": "image/avif", "pil": "AVIF"},
+    "jpeg": {"extension": "jpg", "mime": "image/jpeg", "pil": "JPEG"},
+    "png": {"extension": "png", "mime": "image/png", "pil": "PNG"}
+}
+IMAGE_EXTENSIONS = {spec["extension"]: name for name, spec in IMAGE_FORMATS.items()}
+IMAGE_STORAGE_FORMAT = settings.image_storage_format
+IMAGE_STORAGE_QUALITY = settings.image_storage_quality
+if IMAGE_STORAGE_FORMAT == "avif" and not features.check("avif"):
+    # Pillow built without libavif
+    IMAGE_STORAGE_FORMAT = "webp"
+
+class ObjectInfo(BaseModel):
+    key: str
+    size: int
+    modified_at: datetime
+    etag: Optional[str] = None
+
+class ImageStorage:
+    """Where generated images are kept. Keys are relative, slash-separated paths."""
+
+    async def put(self, key: str, data: bytes, content_type: str = "image/png") -> None:
+        raise NotImplementedError
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Return the object bytes, or None if it does not exist"""
+        raise NotImplementedError
+
+    async def stream(
+        self, key: str, chunk_size: int = STORAGE_CHUNK_SIZE, start: int = 0, end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """Yield the object (or bytes start..end inclusive) in chunks without loading it fully in memory"""
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> bool:
+        """Delete an object, returning False if it did not exist"""
+        raise NotImplementedError
+
+    async def stat(self, key: str) -> Optional[ObjectInfo]:
+        raise NotImplementedError
+
+    async def presign(self, key: str, expires_in: int = 3600) -> Optional[str]:
+        """Return a time-limited URL serving the object directly, if the backend supports it"""
+        return None
+
+    async def list_keys(self, recursive: bool = True) -> AsyncIterator[str]:
+        """Yield object keys, only the top level ones when recursive is False"""
+        raise NotImplementedError
+
+    async def move(self, source: str, destination: str) -> None:
+        """Move an object to a new key, readers see it at one key or the other"""
+        raise NotImplementedError
+
+    async def usage(self, key_filter: Optional[Callable[[str], bool]] = None) -> tuple:
+        """Return (object count, total bytes), of the keys accepted by key_filter if given"""
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Filesystem path of the object when stored on local disk"""
+        return None
+
+class LocalImageStorage(ImageStorage):
+    """Store images on the local filesystem under a root directory"""
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return self._path(key)
+
+    async def put(self, key: str, data: bytes, content_type: str = "image/png") -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so readers never see a partial image
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        async with aiofiles.open(tmp_path, 'wb') as f:
+            await f.write(data)
+        os.replace(tmp_path, path)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        try:
+            async with aiofiles.open(self._path(key), 'rb') as f:
+                return await f.read()
+        except FileNotFoundError:
+            return None
+
+    async def stream(
+        self, key: str, chunk_size: int = STORAGE_CHUNK_SIZE, start: int = 0, end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        async with aiofiles.open(self._path(key), 'rb') as f:
+            if start:
+                await f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = await f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    async def delete(self, key: str) -> bool:
+        try:
+            self._path(key).unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    async def stat(self, key: str) -> Optional[ObjectInfo]:
+        try:
+            st = self._path(key).stat()
+        except FileNotFoundError:
+            return None
+        return ObjectInfo(
+            key=key,
+            size=st.st_size,
+            modified_at=datetime.fromtimestamp(st.st_mtime, timezone.utc)
+        )
+
+    async def list_keys(self, recursive: bool = True) -> AsyncIterator[str]:
+        if not self.root.exists():
+            return
+        if not recursive:
+            entries = await asyncio.to_thread(lambda: [e.name for e in os.scandir(self.root) if e.is_file()])
+            for name in entries:
+                if not name.startswith("."):
+                    yield name
+            return
+        # Walk in a thread a batch at a time, never holding the whole tree
+        batches = self._walk_keys()
+        while True:
+            batch = await asyncio.to_thread(next, batches, None)
+            if batch is None:
+                break
+            for key in batch:
+                yield key
+
+    def _walk_keys(self, batch_size: int = 1000):
+        batch = []
+        for dirpath, _, filenames in os.walk(self.root):
+            relative = Path(dirpath).relative_to(self.root)
+            for filename in filenames:
+                if not filename.startswith("."):
+                    batch.append((relative / filename).as_posix())
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    async def move(self, source: str, destination: str) -> None:
+        destination_path = self._path(destination)
+        destination_path.parent.mkdir(parents=True, exist_ok=True)
+        # Same filesystem, so the rename is atomic
+        os.replace(self._path(source), destination_path)
+
+    def _usage(self, key_filter: Optional[Callable[[str], bool]] = None) -> tuple:
+        files = 0
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            relative = Path(dirpath).relative_to(self.root)
+            for filename in filenames:
+                if filename.startswith("."):
+                    continue
+                if key_filter and not key_filter((relative / filename).as_posix()):
+                    continue
+                try:
+                    total += os.stat(os.path.join(dirpath, filename)).st_size
+                    files += 1
+                except FileNotFoundError:
+                    continue
+        return files, total
+
+    async def usage(self, key_filter: Optional[Callable[[str], bool]] = None) -> tuple:
+        return await asyncio.to_thread(self._usage, key_filter)
+
+class S3ImageStorage(ImageStorage):
+    """Store images in an S3-compatible bucket (AWS S3, MinIO, ...)"""
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None, region: Optional[str] = None):
+        import boto3
+        
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    @staticmethod
+    def _is_missing(error: Exception) -> bool:
+        code = getattr(error, "response", {}).get("Error", {}).get("Code")
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    async def put(self, key: str, data: bytes, content_type: str = "image/png") -> None:
+        await asyncio.to_thread(
+            self.client.put_object,
+            Bucket=self.bucket, Key=self._key(key), Body=data, ContentType=content_type
+        )
+
+    async def get(self, key: str) -> Optional[bytes]:
+        try:
+            response = await asyncio.to_thread(self.client.get_object, Bucket=self.bucket, Key=self._key(key))
+        except Exception as e:
+            if self._is_missing(e):
+                return None
+            raise
+        return await asyncio.to_thread(response["Body"].read)
+
+    async def stream(
+        self, key: str, chunk_size: int = STORAGE_CHUNK_SIZE, start: int = 0, end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        params = {"Bucket": self.bucket, "Key": self._key(key)}
+        if start or end is not None:
+            params["Range"] = f"bytes={start}-{'' if end is None else end}"
+        response = await asyncio.to_thread(self.client.get_object, **params)
+        body = response["Body"]
+        try:
+            while True:
+                chunk = await asyncio.to_thread(body.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+
+    async def delete(self, key: str) -> bool:
+        if not await self.stat(key):
+            return False
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=self._key(key))
+        return True
+
+    async def stat(self, key: str) -> Optional[ObjectInfo]:
+        try:
+            response = await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=self._key(key))
+        except Exception as e:
+            if self._is_missing(e):
+                return None
+            raise
+        return ObjectInfo(
+            key=key,
+            size=response["ContentLength"],
+            modified_at=response["LastModified"],
+            etag=response.get("ETag", "").strip('"') or None
+        )
+
+    async def presign(self, key: str, expires_in: int = 3600) -> Optional[str]:
+        return await asyncio.to_thread(
+            self.client.generate_presigned_url,
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._key(key)},
+            ExpiresIn=expires_in
+        )
+
+    async def list_keys(self, recursive: bool = True) -> AsyncIterator[str]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        params = {"Bucket": self.bucket, "Prefix": self.prefix}
+        if not recursive:
+            params["Delimiter"] = "/"
+        pages = paginator.paginate(**params)
+        iterator = iter(pages)
+        while True:
+            page = await asyncio.to_thread(next, iterator, None)
+            if page is None:
+                break
+            for obj in page.get("Contents", []):
+                yield obj["Key"][len(self.prefix):]
+
+    async def move(self, source: str, destination: str) -> None:
+        # Copy then delete: both keys exist briefly, never neither
+        await asyncio.to_thread(
+            self.client.copy_object,
+            Bucket=self.bucket,
+            Key=self._key(destination),
+            CopySource={"Bucket": self.bucket, "Key": self._key(source)}
+        )
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=self._key(source))
+
+    def _usage(self, key_filter: Optional[Callable[[str], bool]] = None) -> tuple:
+        files = 0
+        total = 0
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get("Contents", []):
+                if key_filter and not key_filter(obj["Key"][len(self.prefix):]):
+                    continue
+                files += 1
+                total += obj["Size"]
+        return files, total
+
+    async def usage(self, key_filter: Optional[Callable[[str], bool]] = None) -> tuple:
+        return await asyncio.to_thread(self._usage, key_filter)
+
+def create_image_storage() -> ImageStorage:
+    if IMAGE_STORAGE_BACKEND == "s3":
+        if not S3_BUCKET:
+            raise RuntimeError("S3_BUCKET must be set when IMAGE_STORAGE_BACKEND=s3")
+        return S3ImageStorage(S3_BUCKET, S3_PREFIX, S3_ENDPOINT_URL, S3_REGION)
+    return LocalImageStorage(IMAGE_STORAGE_DIR)
+
+image_storage = create_image_storage()
+_storage_usage_cache = {"at": 0.0, "value": (0, 0)}
+
+async def cached_storage_usage() -> tuple:
+    """Storage usage, recomputed at most once per STORAGE_USAGE_TTL_SECONDS"""
+    if time.monotonic() - _storage_usage_cache["at"] > STORAGE_USAGE_TTL_SECONDS:
+        _storage_usage_cache["value"] = await image_storage.usage()
+        _storage_usage_cache["at"] = time.monotonic()
+    return _storage_usage_cache["value"]
+
+GENERATED_FILENAME_PATTERN = re.compile(r"^generated_([0-9a-fA-F-]{36})\.(png|webp|avif|jpg)$")
+
+def image_shard(request_id: str) -> str:
+    """Two-level shard directory ("ab/cd") derived from a hash of the request id"""
+    digest = hashlib.md5(request_id.encode('utf-8')).hexdigest()
+    return f"{digest[:2]}/{digest[2:4]}"
+
+def image_filename(request_id: str, image_format: str = "png") -> str:
+    """File name of the generated image. Download URLs keep the historical .png name,
+    the stored rendition is picked by content negotiation."""
+    return f"generated_{request_id}.{IMAGE_FORMATS[image_format]['extension']}"
+
+def image_key(request_id: str, image_format: str = None) -> str:
+    """Storage key of the generated image for a request"""
+    return f"{image_shard(request_id)}/{image_filename(request_id, image_format or IMAGE_STORAGE_FORMAT)}"
+
+RENDITION_PREFIX = "renditions/"
+
+def rendition_key(request_id: str, image_format: str) -> str:
+    """Storage key of a cached transcoded rendition"""
+    return f"{RENDITION_PREFIX}{image_format}/{image_key(request_id, image_format)}"
+
+# Images expired by the retention sweep with RETENTION_ACTION=archive
+ARCHIVE_PREFIX = "archive/"
+# Monthly bundles of old images, and the images restored from them for download
+COLD_PREFIX = "cold/"
+COLD_CACHE_PREFIX = "cold-cache/"
+# Unwatermarked model output, the base for modifications
+MASTER_PREFIX = "masters/"
+
+def master_key(request_id: str, image_format: str) -> str:
+    return MASTER_PREFIX + image_key(request_id, image_format)
+
+# Copies that are not live images: archived, bundled, restored for a while, emailed
+OFFLINE_PREFIXES = (ARCHIVE_PREFIX, COLD_PREFIX, COLD_CACHE_PREFIX, "email_queue/")
+
+def hot_image_request_id(key: str) -> Optional[str]:
+    """Request id of a live per-request key (image, master or rendition), None for any other key"""
+    if key.startswith(OFFLINE_PREFIXES):
+        return None
+    match = GENERATED_FILENAME_PATTERN.match(key.rsplit("/", 1)[-1])
+    return match.group(1) if match else None
+
+def is_hot_image_key(key: str) -> bool:
+    """Keys the storage budget is measured over"""
+    return hot_image_request_id(key) is not None
+
+def request_image_keys(request: dict) -> list:
+    """Keys the image of a request record can live at"""
+    if request.get("image_format"):
+        return [image_key(request["id"], request["image_format"])]
+    # Records from before image_format: PNG, sharded or still flat
+    return [image_key(request["id"], "png"), legacy_image_key(request["id"])]
+
+def request_hot_keys(request: dict) -> list:
+    """Live keys a request record can own: its image, its master and its renditions"""
+    request_id = request["id"]
+    image_format = request.get("image_format")
+    keys = request_image_keys(request)
+    if request.get("master_format"):
+        keys.append(master_key(request_id, request["master_format"]))
+    keys += [rendition_key(request_id, name) for name in IMAGE_FORMATS if name != (image_format or "png")]
+    return keys
+
+def legacy_image_key(request_id: str) -> str:
+    """Flat key used before images were sharded"""
+    return image_filename(request_id, "png")
+
+def image_key_candidates(request_id: str) -> list:
+    """Every key the image of a request may live at, most likely first"""
+    formats = [IMAGE_STORAGE_FORMAT] + [name for name in IMAGE_FORMATS if name != IMAGE_STORAGE_FORMAT]
+    return [(image_key(request_id, name), name) for name in formats] + [(legacy_image_key(request_id), "png")]
+
+async def resolve_image(request_id: str) -> Optional[tuple]:
+    """Find where the image of a request is stored and in which format, falling back
+    to older formats and to the flat layout for images that have not been migrated"""
+    for key, image_format in image_key_candidates(request_id):
+        if await image_storage.stat(key):
+            return key, image_format
+    return None
+
+async def read_image(request_id: str) -> Optional[tuple]:
+    """Return (bytes, format) of the stored image of a request"""
+    for key, image_format in image_key_candidates(request_id):
+        data = await image_storage.get(key)
+        if data is not None:
+            return data, image_format
+    return await read_cold_image(request_id)
+
+IMAGE_KEYS_PROJECTION = {"_id": 0, "id": 1, "image_format": 1, "master_format": 1, "archive_key": 1, "archive_master_key": 1}
+
+async def delete_image(request_id: str, request: Optional[dict] = None) -> bool:
+    """Delete the image of a request with its master, renditions, archived and cold copies.
+
+    Only the keys the record can own are deleted, the record being looked up
+    when not given; without any record every known location is tried.
+    Returns whether the image itself existed.
+    """
+    if request is None:
+        request = await db.outfit_requests.find_one({"id": request_id}, IMAGE_KEYS_PROJECTION)
+    if request is None:
+        image_keys = [key for key, _ in image_key_candidates(request_id)]
+        image_keys += [ARCHIVE_PREFIX + key for key in image_keys]
+        other_keys = [MASTER_PREFIX + key for key, _ in image_key_candidates(request_id)]
+        other_keys += [ARCHIVE_PREFIX + key for key in other_keys]
+        other_keys += [rendition_key(request_id, image_format) for image_format in IMAGE_FORMATS]
+    else:
+        image_keys = request_image_keys(request)
+        if request.get("archive_key"):
+            image_keys.append(request["archive_key"])
+        other_keys = request_hot_keys(request)[len(request_image_keys(request)):]
+        if request.get("image_format") and not request.get("master_format"):
+            # Failed generations may have stored a master before recording its format
+            other_keys.append(master_key(request_id, request["image_format"]))
+        if request.get("archive_master_key"):
+            other_keys.append(request["archive_master_key"])
+    
+    entry = await db.cold_index.find_one_and_delete({"_id": request_id})
+    if entry:
+        other_keys.append(COLD_CACHE_PREFIX + image_key(request_id, entry["image_format"]))
+    results = await asyncio.gather(*(image_storage.delete(key) for key in image_keys + other_keys))
+    if entry and not await db.cold_index.find_one({"bundle_key": entry["bundle_key"]}, {"_id": 1}):
+        # Last image of the bundle, nothing references it any more
+        await image_storage.delete(entry["bundle_key"])
+    return bool(entry) or any(results[:len(image_keys)])
+
+def encode_image(image: Image.Image, image_format: str) -> bytes:
+    """Encode a PIL image in one of IMAGE_FORMATS"""
+    spec = IMAGE_FORMATS[image_format]
+    if spec["pil"] == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+    output = io.BytesIO()
+    if spec["pil"] == "PNG":
+        image.save(output, format="PNG", optimize=False)
+    else:
+        image.save(output, format=spec["pil"], quality=IMAGE_STORAGE_QUALITY)
+    return output.getvalue()
+
+def transcode_image(data: bytes, image_format: str) -> bytes:
+    return encode_image(Image.open(io.BytesIO(data)), image_format)
+
+# CPU-bound image work (watermarking, transcoding) runs in its own pool so it
+# never stalls the event loop serving the API. With IMAGE_WORKER_PROCESSES=0
+# it runs in the default thread pool instead of separate processes.
+IMAGE_WORKER_PROCESSES = settings.image_worker_processes
+image_executor: Optional[ProcessPoolExecutor] = None
+
+def start_image_executor():
+    global image_executor
+    if IMAGE_WORKER_PROCESSES > 0 and image_executor is None:
+        # spawn rather than fork: the parent already runs Motor and event loop threads
+        image_executor = ProcessPoolExecutor(
+            max_workers=IMAGE_WORKER_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+
+def stop_image_executor():
+    global image_executor
+    if image_executor is not None:
+        image_executor.shutdown(wait=True, cancel_futures=True)
+        image_executor = None
+
+async def run_image_task(func: Callable, *args):
+    """Run a picklable, module-level image function in the image pool"""
+    return await asyncio.get_running_loop().run_in_executor(image_executor, func, *args)
+
+async def ensure_rendition(request_id: str, source_key: str, image_format: str) -> str:
+    """Return the key of a cached rendition of the image in image_format, creating it if needed"""
+    key = rendition_key(request_id, image_format)
+    if not await image_storage.stat(key):
+        source = await image_storage.get(source_key)
+        if source is None:
+            raise HTTPException(status_code=404, detail="Image not found")
+        await image_storage.put(key, await run_image_task(transcode_image, source, image_format), IMAGE_FORMATS[image_format]["mime"])
+    return key
+
+IMAGE_CACHE_MAX_AGE_SECONDS = settings.image_cache_max_age_seconds
+
+def image_etag(request_id: str, image_format: str, size: int) -> str:
+    """Strong ETag of a rendition. Generated images never change once written, so the
+    request id, format and size identify the bytes without hashing them."""
+    return f'"{request_id}.{image_format}.{size}"'
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Evaluate an If-None-Match / If-Range header against an ETag"""
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+def parse_byte_range(header: str, size: int) -> Optional[tuple]:
+    """Parse a single "bytes=start-end" range into inclusive offsets.
+
+    Returns None when the header should be ignored (multiple ranges, other units)
+    and raises 416 when the range cannot be satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(size - int(last), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+# Signed download URLs
+DOWNLOAD_URL_SECRET = settings.download_url_secret.get_secret_value() if settings.download_url_secret else JWT_SECRET
+DOWNLOAD_URL_TTL_SECONDS = settings.download_url_ttl_seconds
+DOWNLOAD_EXPORT_URL_TTL_SECONDS = settings.download_export_url_ttl_seconds
+DOWNLOAD_REQUIRE_SIGNATURE = settings.download_require_signature
+# "none" streams through the app, "x-accel-redirect" (nginx) or "x-sendfile" (apache,
+# lighttpd) hand local files to the front server, object storage redirects to a presigned URL
+DOWNLOAD_OFFLOAD = settings.download_offload
+DOWNLOAD_ACCEL_PREFIX = settings.download_accel_prefix
+
+def sign_download(filename: str, expires: int) -> str:
+    """HMAC-SHA256 over the file name and expiry timestamp"""
+    message = f"{filename}:{expires}".encode('utf-8')
+    digest = hmac.new(DOWNLOAD_URL_SECRET.encode('utf-8'), message, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode('ascii')
+
+def verify_download_signature(filename: str, expires: int, signature: str) -> bool:
+    """Check a signed download URL without touching the database"""
+    if expires < int(time.time()):
+        return False
+    return hmac.compare_digest(sign_download(filename, expires), signature)
+
+def signed_download_url(filename: str, ttl: int = None) -> str:
+    """Signed URL valid for ttl to 2 * ttl seconds.
+
+    The expiry is rounded up to a multiple of ttl, so the URL of an image
+    stays the same within each window and browsers can reuse their cache.
+    """
+    ttl = ttl or DOWNLOAD_URL_TTL_SECONDS
+    expires = (int(time.time()) + ttl) // ttl * ttl + ttl
+    return f"/api/download/signed/{filename}?expires={expires}&sig={sign_download(filename, expires)}"
+
+def negotiate_image_format(stored_format: str, requested_extension: str, explicit_format: Optional[str], accept: str) -> str:
+    """Pick the rendition to serve.
+
+    An explicit ?format= wins, then a file name carrying the stored extension.
+    Otherwise the stored rendition is only served to clients that list its type
+    in Accept, everyone else gets the format of the requested file name.
+    """
+    if explicit_format in IMAGE_FORMATS:
+        return explicit_format
+    requested_format = IMAGE_EXTENSIONS.get(requested_extension, "png")
+    if requested_format == stored_format:
+        return stored_format
+    accepted = {part.split(";")[0].strip().lower() for part in accept.split(",")}
+    if IMAGE_FORMATS[stored_format]["mime"] in accepted:
+        return stored_format
+    return requested_format
+
+async def migrate_image_layout(dry_run: bool = False, batch_size: int = 500) -> dict:
+    """Move flat generated_<id>.png images into the sharded layout.
+
+    Safe to run while the API is serving: readers fall back to the flat key
+    until an image has been moved, and each move is atomic per image.
+    """
+    moved = 0
+    skipped = 0
+    failed = 0
+    batch = []
+    
+    async def flush():
+        nonlocal moved, failed
+        for source, destination in batch:
+            try:
+                await image_storage.move(source, destination)
+                moved += 1
+            except Exception as e:
+                # Typically deleted or moved by someone else in the meantime
+                logger.warning(f"Could not move {source} to {destination}: {e}")
+                failed += 1
+        batch.clear()
+    
+    async for key in image_storage.list_keys(recursive=False):
+        match = GENERATED_FILENAME_PATTERN.match(key)
+        if not match:
+            skipped += 1
+            continue
+        destination = image_key(match.group(1), IMAGE_EXTENSIONS[match.group(2)])
+        if dry_run:
+            moved += 1
+            continue
+        batch.append((key, destination))
+        if len(batch) >= batch_size:
+            await flush()
+            logger.info(f"Image layout migration: {moved} images moved so far")
+    if batch:
+        await flush()
+    
+    return {"moved": moved, "skipped": skipped, "failed": failed, "dry_run": dry_run}
+
 # User Models
 class UserRole(str):
     CLIENT = "client"
@@ -68,6 +1004,7 @@ class User(BaseModel):
     role: str = UserRole.CLIENT
     images_used_total: int = 0
     images_limit_total: int = 5  # Limite par défaut de 5 images
+    images_reserved_total: int = 0  # Credits held by generations in progress
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     is_active: bool = True
     verification_token: Optional[str] = None
@@ -76,6 +1013,14 @@ class User(BaseModel):
     class Config:
         extra = "ignore"  # Ignore extra fields from database
 
+# Fields returned by the admin user list, read straight from Mongo
+USER_LIST_FIELDS = tuple(name for name in User.model_fields if name != "verification_token")
+USER_DEFAULTS = {
+    name: field.default
+    for name, field in User.model_fields.items()
+    if not field.is_required() and field.default_factory is None
+}
+
 class UserUpdate(BaseModel):
     role: Optional[str] = None
     images_limit_total: Optional[int] = None
@@ -131,6 +1076,173 @@ async def get_user_or_admin(current_user: User = Depends(get_current_user)) -> U
         raise HTTPException(status_code=403, detail="User or Admin access required")
     return current_user
 
+# Credit reservations
+CREDIT_PROJECTION = {"_id": 0, "images_used_total": 1, "images_limit_total": 1, "images_reserved_total": 1}
+
+def credit_summary(user_data: dict) -> dict:
+    """Build the user_credits payload from a users document"""
+    used = user_data.get("images_used_total", 0)
+    limit = user_data.get("images_limit_total", 0)
+    reserved = user_data.get("images_reserved_total", 0)
+    return {
+        "used": used,
+        "limit": limit,
+        "reserved": reserved,
+        "remaining": max(limit - used - reserved, 0)
+    }
+
+class CreditReservation:
+    """Image credits held for a user while generations are in progress.
+
+    Credits are reserved atomically before calling the model, then either
+    committed (moved to images_used_total) or released back to the user.
+    """
+
+    def __init__(self, user_id: str, count: int, credits: dict):
+        self.user_id = user_id
+        self.count = count
+        self.pending = count
+        self.credits = credits
+
+    @classmethod
+    async def acquire(cls, user_id: str, count: int = 1) -> "CreditReservation":
+        """Reserve count credits, raising 403 if the user does not have enough left"""
+        user_data = await db.users.find_one_and_update(
+            {
+                "id": user_id,
+                "$expr": {
+                    "$lte": [
+                        {"$add": ["$images_used_total", {"$ifNull": ["$images_reserved_total", 0]}, count]},
+                        "$images_limit_total"
+                    ]
+                }
+            },
+            {"$inc": {"images_reserved_total": count}},
+            projection=CREDIT_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        if not user_data:
+            current = await db.users.find_one({"id": user_id}, CREDIT_PROJECTION) or {}
+            used = current.get("images_used_total", 0) + current.get("images_reserved_total", 0)
+            raise HTTPException(
+                status_code=403,
+                detail=f"Image generation limit exceeded. Used: {used}/{current.get('images_limit_total', 0)}"
+            )
+        return cls(user_id, count, credit_summary(user_data))
+
+    async def commit(self, count: Optional[int] = None) -> dict:
+        """Charge count of the reserved credits (all pending ones by default)"""
+        count = self.pending if count is None else min(count, self.pending)
+        if count > 0:
+            user_data = await db.users.find_one_and_update(
+                {"id": self.user_id},
+                {"$inc": {"images_reserved_total": -count, "images_used_total": count}},
+                projection=CREDIT_PROJECTION,
+                return_document=ReturnDocument.AFTER
+            )
+            self.pending -= count
+            if user_data:
+                self.credits = credit_summary(user_data)
+        return self.credits
+
+    async def release(self) -> dict:
+        """Give back every credit that has not been committed"""
+        if self.pending > 0:
+            user_data = await db.users.find_one_and_update(
+                {"id": self.user_id, "images_reserved_total": {"$gte": self.pending}},
+                {"$inc": {"images_reserved_total": -self.pending}},
+                projection=CREDIT_PROJECTION,
+                return_document=ReturnDocument.AFTER
+            )
+            self.pending = 0
+            if user_data:
+                self.credits = credit_summary(user_data)
+        return self.credits
+
+async def abandon_generation(reservation: Optional[CreditReservation], request_id: Optional[str] = None, reason: str = "error",
+                             timer: Optional[StageTimer] = None):
+    """Release reserved credits and mark the record of a failed generation as failed,
+    with the timings of the run when a timer is given"""
+    timings = {"timings": timer.finish("failed")} if timer else {}
+    try:
+        if reservation:
+            await reservation.release()
+        if request_id:
+            # The credit is only committed once the image is stored, so a
+            # failed record never keeps its file
+            result = await db.outfit_requests.update_one(
+                {"id": request_id},
+                {"$set": {"status": "failed", "failure_reason": reason, "failed_at": datetime.now(timezone.utc), **timings}}
+            )
+            if result.matched_count:
+                await delete_image(request_id)
+    except Exception as e:
+        logger.error(f"Error cleaning up failed generation {request_id}: {e}")
+
+async def store_generated_image(request_id: str, image: bytes, master: bytes) -> Optional[str]:
+    """Store the watermarked image, then its master; returns the master format, None if it could not be kept"""
+    mime = IMAGE_FORMATS[IMAGE_STORAGE_FORMAT]["mime"]
+    await image_storage.put(image_key(request_id), image, mime)
+    try:
+        await image_storage.put(master_key(request_id, IMAGE_STORAGE_FORMAT), master, mime)
+        return IMAGE_STORAGE_FORMAT
+    except Exception as e:
+        logger.warning(f"Could not store the master of request {request_id}: {e}")
+        return None
+
+async def read_modification_base(request: dict) -> Optional[bytes]:
+    """Image a modification starts from, sized for the model: the unwatermarked master,
+    or the stored image for requests created before masters were kept"""
+    data = None
+    if request.get("master_format"):
+        data = await image_storage.get(master_key(request["id"], request["master_format"]))
+    if data is None and request.get("archive_master_key"):
+        data = await image_storage.get(request["archive_master_key"])
+    if data is None and request.get("cold_bundle"):
+        data = await read_cold_master(request["id"])
+    if data is None:
+        stored = await read_image(request["id"])
+        if stored is None and request.get("archive_key"):
+            stored = (await image_storage.get(request["archive_key"]), None)
+        if stored is None or stored[0] is None:
+            return None
+        data = stored[0]
+    return await run_image_task(model_input_image, data, MODEL_INPUT_MAX_SIDE)
+
+# Upper bound on the parent lookups for records created before the lineage fields
+LINEAGE_MAX_WALK = 100
+LINEAGE_PROJECTION = {"_id": 0, "id": 1, "original_request_id": 1, "root_request_id": 1, "lineage_path": 1}
+
+async def request_lineage(request: dict) -> tuple:
+    """Return (root_request_id, ancestors root first) of a request. Recorded on every
+    request since lineage tracking; older chains are walked up once."""
+    if request.get("root_request_id"):
+        return request["root_request_id"], list(request.get("lineage_path") or [])
+    path = []
+    current = request
+    while current.get("original_request_id") and len(path) < LINEAGE_MAX_WALK:
+        parent = await db.outfit_requests.find_one({"id": current["original_request_id"]}, LINEAGE_PROJECTION)
+        if not parent:
+            break
+        if parent.get("root_request_id"):
+            return parent["root_request_id"], list(parent.get("lineage_path") or []) + [parent["id"]] + path
+        path.insert(0, parent["id"])
+        current = parent
+    return (path[0] if path else request["id"]), path
+
+async def backfill_lineage() -> dict:
+    """Record the lineage fields on requests created before they existed, parents first"""
+    updated = 0
+    cursor = db.outfit_requests.find({"root_request_id": {"$exists": False}}, LINEAGE_PROJECTION).sort("timestamp", 1)
+    async for request in cursor:
+        root_request_id, ancestors = await request_lineage(request)
+        await db.outfit_requests.update_one(
+            {"id": request["id"]},
+            {"$set": {"root_request_id": root_request_id, "lineage_path": ancestors, "lineage_depth": len(ancestors)}}
+        )
+        updated += 1
+    return {"updated": updated}
+
 # Define Models
 class OutfitRequest(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -146,8 +1258,73 @@ class OutfitRequest(BaseModel):
     custom_accessory_description: Optional[str] = None
     email: Optional[str] = None
     user_email: Optional[str] = None  # Track which user created the request
+    image_format: Optional[str] = None  # Format of the stored rendition, None for legacy PNG
+    status: Optional[str] = None  # pending, succeeded or failed; None for records older than the field
+    failure_reason: Optional[str] = None
+    original_request_id: Optional[str] = None  # Request this one modifies
+    root_request_id: Optional[str] = None  # First request of the modification chain, itself for a generation
+    lineage_depth: int = 0
+    lineage_path: List[str] = Field(default_factory=list)  # Ancestors, root first
     timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+# Generations are recorded as pending before the model call and marked succeeded
+# once their image is stored. Lists, stats and analytics only count succeeded
+# requests (and legacy records, which have no status); the (status, timestamp)
+# index serves both this filter and the admin ?status= filter.
+REQUEST_STATUSES = ("pending", "succeeded", "failed")
+SUCCEEDED_REQUESTS = {"status": {"$in": ["succeeded", None]}}
+
+def request_status_query(status: str) -> dict:
+    """Query for a ?status= filter: succeeded (default), pending, failed or all"""
+    if status == "all":
+        return {}
+    if status == "succeeded":
+        return dict(SUCCEEDED_REQUESTS)
+    if status in REQUEST_STATUSES:
+        return {"status": status}
+    raise HTTPException(status_code=400, detail=f"Statut inconnu : {status}")
+
+# List endpoints return these fields unless the caller asks for others with
+# ?fields=a,b,c (or ?fields=all); free-text descriptions stay on the detail route
+REQUEST_FIELDS = tuple(OutfitRequest.model_fields)
+REQUEST_SUMMARY_FIELDS = (
+    "id", "atmosphere", "suit_type", "lapel_type", "pocket_type", "shoe_type",
+    "accessory_type", "gender", "email", "user_email", "image_format", "status", "timestamp"
+)
+REQUEST_DEFAULTS = {
+    name: field.default
+    for name, field in OutfitRequest.model_fields.items()
+    if not field.is_required() and field.default_factory is None
+}
+
+def request_fields(fields: Optional[str]) -> tuple:
+    """Resolve a ?fields= parameter into the list of request fields to return"""
+    if not fields:
+        return REQUEST_SUMMARY_FIELDS
+    if fields == "all":
+        return REQUEST_FIELDS
+    selected = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in selected if name not in REQUEST_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return selected or REQUEST_SUMMARY_FIELDS
+
+async def find_request_rows(
+    query: dict, fields: tuple, limit: int = 1000, signed_urls: bool = False, url_ttl: int = None
+) -> list:
+    """Fetch projected request documents, with model defaults for legacy rows.
+
+    With signed_urls each row also carries a signed download URL of its image.
+    """
+    projection = {"_id": 0, **{name: 1 for name in fields}}
+    defaults = {name: REQUEST_DEFAULTS[name] for name in fields if name in REQUEST_DEFAULTS}
+    if signed_urls:
+        projection["id"] = 1
+    rows = await db.outfit_requests.find(query, projection).sort("timestamp", -1).to_list(limit)
+    if signed_urls:
+        return [{**defaults, **row, "signed_url": signed_download_url(image_filename(row["id"]), url_ttl)} for row in rows]
+    return [{**defaults, **row} for row in rows]
+
 class OutfitRequestCreate(BaseModel):
     atmosphere: str
     suit_type: str
@@ -208,15 +1385,31 @@ SHOE_TYPES = [
 
 ACCESSORY_TYPES = ["Nœud papillon", "Cravate", "Description texte"]
 
-async def apply_watermark(image_data: bytes) -> bytes:
-    """Apply watermark to generated image"""
+WATERMARK_PATH = settings.watermark_path
+# Longest side of the images sent back to the model as the base of a modification
+MODEL_INPUT_MAX_SIDE = settings.model_input_max_side
+
+async def finish_generated_image(image_data: bytes) -> tuple:
+    """Encode the model output in the storage format, returning (watermarked, master)"""
+    return await run_image_task(render_generated_image, image_data, IMAGE_STORAGE_FORMAT, str(WATERMARK_PATH))
+
+def render_generated_image(image_data: bytes, image_format: str, watermark_path: str) -> tuple:
+    """Blocking part of finish_generated_image, decoding the model output once"""
+    image = Image.open(io.BytesIO(image_data))
+    master = encode_image(image, image_format)
+    return encode_image(paste_watermark(image, watermark_path), image_format), master
+
+def model_input_image(image_data: bytes, max_side: int) -> bytes:
+    """Downscale an image to fit max_side and encode it as JPEG for the model"""
+    image = Image.open(io.BytesIO(image_data))
+    image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    return encode_image(image, "jpeg")
+
+def paste_watermark(image: Image.Image, watermark_path: str) -> Image.Image:
+    """Paste the logo at the bottom of the image, in place"""
     try:
-        # Open the generated image
-        image = Image.open(io.BytesIO(image_data))
-        
         # Open watermark
-        watermark_path = Path("/app/logo_watermark.png")
-        if watermark_path.exists():
+        if Path(watermark_path).exists():
             watermark = Image.open(watermark_path)
             
             # Calculate watermark size (80% of image width - 800% larger than before)
@@ -237,73 +1430,46 @@ async def apply_watermark(image_data: bytes) -> bytes:
             else:
                 image.paste(watermark, (x, y))
         
-        # Convert back to bytes
-        output = io.BytesIO()
-        image.save(output, format='PNG', quality=95)
-        return output.getvalue()
-        
     except Exception as e:
         logger.error(f"Error applying watermark: {e}")
-        return image_data
+    
+    return image
 
-async def generate_outfit_image(
-    model_image_data: bytes,
-    fabric_image_data: Optional[bytes],
-    shoe_image_data: Optional[bytes],
-    accessory_image_data: Optional[bytes],
-    outfit_request: OutfitRequestCreate
-) -> bytes:
-    """Generate outfit image using Gemini with Nano Banana model"""
+def build_outfit_prompt(outfit_request: OutfitRequestCreate) -> str:
+    """Build the generation prompt for an outfit request"""
+    atmosphere_desc = ATMOSPHERE_OPTIONS.get(outfit_request.atmosphere, outfit_request.atmosphere)
     
-    try:
-        # Get Emergent LLM key
-        api_key = os.getenv('EMERGENT_LLM_KEY')
-        
-        # Create chat instance
-        chat = LlmChat(
-            api_key=api_key, 
-            session_id=f"outfit_gen_{uuid.uuid4()}", 
-            system_message="You are a professional fashion designer specializing in wedding attire visualization."
-        )
-        chat.with_model("gemini", "gemini-2.5-flash-image-preview").with_params(modalities=["image", "text"])
-        
-        # Convert model image to base64
-        model_base64 = base64.b64encode(model_image_data).decode('utf-8')
-        
-        # Build detailed prompt with specific outfit specifications
-        atmosphere_desc = ATMOSPHERE_OPTIONS.get(outfit_request.atmosphere, outfit_request.atmosphere)
-        
-        # Gender-specific terms
-        person_term = "mariée" if outfit_request.gender == "femme" else "marié"
-        gender_desc = "femme" if outfit_request.gender == "femme" else "homme"
-        
-        # Detailed pocket specifications
-        pocket_details = {
-            "Slanted, no flaps": "slanted pockets without flaps, clean minimal lines",
-            "Slanted with flaps": "slanted pockets with fabric flaps covering the openings",
-            "Straight with flaps": "straight horizontal pockets with fabric flaps",
-            "Straight, no flaps": "straight horizontal pockets without flaps, welted style",
-            "Patch pockets": "patch pockets sewn on top of the jacket exterior"
-        }
-        
-        # Detailed lapel specifications  
-        lapel_details = {
-            "Standard notch lapel": "standard notch lapel with moderate width, classic business style",
-            "Wide notch lapel": "wide notch lapel with broader peak, more dramatic look",
-            "Standard peak lapel": "pointed peak lapel extending upward, formal style",
-            "Wide peak lapel": "wide pointed peak lapel, very formal and dramatic",
-            "Shawl collar with satin lapel": "rounded shawl collar with satin facing, tuxedo style",
-            "Standard double-breasted peak lapel": "peak lapel for double-breasted jacket, formal",
-            "Wide double-breasted peak lapel": "wide peak lapel for double-breasted jacket, very formal"
-        }
-        
-        # Suit composition details - FIXED: Use French terms for detection
-        suit_composition = ""
-        suit_composition_detailed = ""
-        
-        if "2 pièces" in outfit_request.suit_type.lower():
-            suit_composition = "EXACTLY 2 pieces: jacket and trousers ONLY. NO vest, NO waistcoat, NO third piece visible."
-            suit_composition_detailed = """
+    # Gender-specific terms
+    person_term = "mariée" if outfit_request.gender == "femme" else "marié"
+    gender_desc = "femme" if outfit_request.gender == "femme" else "homme"
+    
+    # Detailed pocket specifications
+    pocket_details = {
+        "Slanted, no flaps": "slanted pockets without flaps, clean minimal lines",
+        "Slanted with flaps": "slanted pockets with fabric flaps covering the openings",
+        "Straight with flaps": "straight horizontal pockets with fabric flaps",
+        "Straight, no flaps": "straight horizontal pockets without flaps, welted style",
+        "Patch pockets": "patch pockets sewn on top of the jacket exterior"
+    }
+    
+    # Detailed lapel specifications  
+    lapel_details = {
+        "Standard notch lapel": "standard notch lapel with moderate width, classic business style",
+        "Wide notch lapel": "wide notch lapel with broader peak, more dramatic look",
+        "Standard peak lapel": "pointed peak lapel extending upward, formal style",
+        "Wide peak lapel": "wide pointed peak lapel, very formal and dramatic",
+        "Shawl collar with satin lapel": "rounded shawl collar with satin facing, tuxedo style",
+        "Standard double-breasted peak lapel": "peak lapel for double-breasted jacket, formal",
+        "Wide double-breasted peak lapel": "wide peak lapel for double-breasted jacket, very formal"
+    }
+    
+    # Suit composition details - FIXED: Use French terms for detection
+    suit_composition = ""
+    suit_composition_detailed = ""
+    
+    if "2 pièces" in outfit_request.suit_type.lower():
+        suit_composition = "EXACTLY 2 pieces: jacket and trousers ONLY. NO vest, NO waistcoat, NO third piece visible."
+        suit_composition_detailed = """
 CRITICAL 2-PIECE SUIT REQUIREMENTS:
 - Show ONLY jacket and trousers (SANS GILET)
 - NO vest visible at all
@@ -313,10 +1479,10 @@ CRITICAL 2-PIECE SUIT REQUIREMENTS:
 - The jacket should be worn directly over a shirt/dress shirt
 - ABSOLUTELY NO vest or waistcoat or gilet layer between shirt and jacket
 - IMPORTANT: SANS GILET (without vest) is mandatory"""
-            
-        elif "3 pièces" in outfit_request.suit_type.lower():
-            suit_composition = "EXACTLY 3 pieces: jacket, trousers, AND waistcoat/vest. The vest MUST be visible under the jacket."
-            suit_composition_detailed = """
+        
+    elif "3 pièces" in outfit_request.suit_type.lower():
+        suit_composition = "EXACTLY 3 pieces: jacket, trousers, AND waistcoat/vest. The vest MUST be visible under the jacket."
+        suit_composition_detailed = """
 CRITICAL 3-PIECE SUIT REQUIREMENTS:
 - Show ALL 3 pieces: jacket, trousers, AND vest/waistcoat
 - The vest/waistcoat MUST be clearly visible under the open jacket
@@ -324,15 +1490,15 @@ CRITICAL 3-PIECE SUIT REQUIREMENTS:
 - The vest should cover the shirt front and be visible in the jacket opening
 - ALL THREE pieces must be clearly distinguishable
 - The vest is MANDATORY and MUST be visible"""
-        else:
-            # Fallback for any other suit type
-            suit_composition = "Standard suit composition as appropriate for the outfit type specified."
-            suit_composition_detailed = "Standard suit styling with appropriate number of pieces."
-        
-        pocket_spec = pocket_details.get(outfit_request.pocket_type, outfit_request.pocket_type)
-        lapel_spec = lapel_details.get(outfit_request.lapel_type, outfit_request.lapel_type)
-        
-        prompt = f"""Create a professional, photorealistic wedding photo of a {person_term} ({gender_desc}) using the attached full-length model photo.
+    else:
+        # Fallback for any other suit type
+        suit_composition = "Standard suit composition as appropriate for the outfit type specified."
+        suit_composition_detailed = "Standard suit styling with appropriate number of pieces."
+    
+    pocket_spec = pocket_details.get(outfit_request.pocket_type, outfit_request.pocket_type)
+    lapel_spec = lapel_details.get(outfit_request.lapel_type, outfit_request.lapel_type)
+    
+    prompt = f"""Create a professional, photorealistic wedding photo of a {person_term} ({gender_desc}) using the attached full-length model photo.
 
 CRITICAL REQUIREMENTS:
 - GENDER: The person must be clearly identifiable as a {gender_desc}
@@ -395,6 +1561,551 @@ FINAL VALIDATION CHECKLIST - VERIFY BEFORE GENERATING:
 ✓ Professional wedding photography quality maintained
 
 Generate a stunning, photorealistic wedding image with perfect attention to every specified detail, especially the correct suit composition."""
+    return prompt
+
+# Cluster coordination. Background jobs run under a Mongo lease so that only
+# one replica executes them; with COORDINATION_BACKEND=mongo the model call
+# limits are also enforced across workers and replicas.
+COORDINATION_BACKEND = settings.coordination_backend
+INSTANCE_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+LEASE_GRACE_SECONDS = settings.lease_grace_seconds
+
+async def acquire_lease(name: str, ttl_seconds: float) -> bool:
+    """Take or renew the named lease, False while another instance holds it"""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.leases.update_one(
+            {"_id": name, "$or": [{"holder": INSTANCE_ID}, {"expires_at": {"$lte": now}}]},
+            {"$set": {
+                "holder": INSTANCE_ID,
+                "expires_at": now + timedelta(seconds=ttl_seconds),
+                "renewed_at": now
+            }},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # The lease document exists and is held by someone else
+        return False
+
+async def release_lease(name: str):
+    await db.leases.delete_one({"_id": name, "holder": INSTANCE_ID})
+
+async def run_leased(name: str, job: Callable, ttl_seconds: float):
+    """Run job while renewing the named lease, cancelling it once the lease is lost.
+
+    The lease is renewed every third of its ttl, so a job outliving its
+    interval keeps it and no other instance starts the same job meanwhile.
+    """
+    task = asyncio.create_task(job())
+    heartbeat = ttl_seconds / 3
+    deadline = time.monotonic() + ttl_seconds
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=heartbeat)
+            if done:
+                return task.result()
+            try:
+                renewed = await acquire_lease(name, ttl_seconds)
+            except Exception as e:
+                logger.warning(f"Could not renew lease {name}: {e}")
+                # Keep going while the lease we hold is still valid
+                renewed = None if time.monotonic() + heartbeat < deadline else False
+            if renewed:
+                deadline = time.monotonic() + ttl_seconds
+            elif renewed is False:
+                logger.error(f"Lost lease {name}, stopping the job")
+                return
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+async def run_periodic(name: str, job: Callable, interval: float, leader_only: bool = True):
+    """Run job every interval seconds, on the lease holder only when leader_only"""
+    ttl = interval + LEASE_GRACE_SECONDS
+    try:
+        while True:
+            try:
+                if not leader_only:
+                    await job()
+                elif await acquire_lease(name, ttl):
+                    await run_leased(name, job, ttl)
+            except Exception as e:
+                logger.error(f"Background job {name} failed: {e}")
+            await asyncio.sleep(interval)
+    finally:
+        if leader_only:
+            try:
+                await release_lease(name)
+            except Exception as e:
+                logger.warning(f"Could not release lease {name}: {e}")
+
+# Image model concurrency limits
+MODEL_MAX_CONCURRENCY = settings.model_max_concurrency
+MODEL_MAX_CONCURRENCY_PER_USER = settings.model_max_concurrency_per_user
+MODEL_MAX_QUEUE_WAIT_SECONDS = settings.model_max_queue_wait_seconds
+
+# Lower value is served first
+ROLE_PRIORITIES = {
+    UserRole.ADMIN: 0,
+    UserRole.USER: 0,
+    UserRole.CLIENT: 1
+}
+
+class ModelCallLimiter:
+    """Bound concurrent image model calls globally and per user.
+
+    Waiting requests are served by role priority then arrival order. A
+    request whose estimated wait exceeds max_wait is rejected with a 429
+    and a Retry-After hint instead of piling up behind the upstream.
+    """
+
+    def __init__(self, max_concurrency: int, max_per_user: int, max_wait: float):
+        self.max_concurrency = max_concurrency
+        self.max_per_user = max_per_user
+        self.max_wait = max_wait
+        self.active = 0
+        self.active_per_user = defaultdict(int)
+        self._waiters = []  # (priority, seq, user_id, future)
+        self._seq = itertools.count()
+        self._durations = deque(maxlen=50)
+
+    def _average_duration(self) -> float:
+        return sum(self._durations) / len(self._durations) if self._durations else 20.0
+
+    def estimated_wait(self, priority: int, user_id: Optional[str] = None) -> float:
+        """Rough wait for a new request of the given priority, in seconds.
+
+        With a user_id the wait also covers the calls that user already has
+        running or queued, which the per-user cap serves a few at a time.
+        """
+        wait = 0.0
+        if self.active >= self.max_concurrency or self._waiters:
+            ahead = sum(1 for waiter in self._waiters if waiter[0] <= priority)
+            wait = (ahead // self.max_concurrency + 1) * self._average_duration()
+        if user_id is not None:
+            queued = self.active_per_user.get(user_id, 0) + sum(1 for waiter in self._waiters if waiter[2] == user_id)
+            if queued >= self.max_per_user:
+                wait = max(wait, ((queued - self.max_per_user) // self.max_per_user + 1) * self._average_duration())
+        return wait
+
+    def check_capacity(self, user_id: str, role: str):
+        """Reject with a 429 now if a new call of this user would wait longer than max_wait"""
+        estimate = self.estimated_wait(ROLE_PRIORITIES.get(role, ROLE_PRIORITIES[UserRole.CLIENT]), user_id)
+        if estimate > self.max_wait:
+            self._reject(role, "queue_full", estimate)
+
+    def _can_start(self, user_id: str) -> bool:
+        return self.active < self.max_concurrency and self.active_per_user[user_id] < self.max_per_user
+
+    def _grant(self, user_id: str):
+        self.active += 1
+        self.active_per_user[user_id] += 1
+        MODEL_CALLS_IN_FLIGHT.set(self.active)
+
+    def _release(self, user_id: str):
+        self.active -= 1
+        self.active_per_user[user_id] -= 1
+        if self.active_per_user[user_id] <= 0:
+            del self.active_per_user[user_id]
+        MODEL_CALLS_IN_FLIGHT.set(self.active)
+        self._dispatch()
+
+    def _dispatch(self):
+        """Hand free slots to the best waiters whose user is under the per-user cap"""
+        for waiter in sorted(self._waiters):
+            if self.active >= self.max_concurrency:
+                break
+            _, _, user_id, future = waiter
+            if future.done() or not self._can_start(user_id):
+                continue
+            self._waiters.remove(waiter)
+            self._grant(user_id)
+            future.set_result(None)
+        MODEL_QUEUE_DEPTH.set(len(self._waiters))
+
+    def _reject(self, role: str, reason: str, retry_after: float):
+        MODEL_LIMITER_REJECTIONS.labels(role, reason).inc()
+        raise HTTPException(
+            status_code=429,
+            detail="Le service de génération est très sollicité, veuillez réessayer dans quelques instants",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+    async def _acquire(self, user_id: str, role: str):
+        priority = ROLE_PRIORITIES.get(role, ROLE_PRIORITIES[UserRole.CLIENT])
+        if self._can_start(user_id) and not any(w[0] <= priority for w in self._waiters):
+            self._grant(user_id)
+            return
+        
+        self.check_capacity(user_id, role)
+        
+        future = asyncio.get_running_loop().create_future()
+        waiter = (priority, next(self._seq), user_id, future)
+        self._waiters.append(waiter)
+        self._dispatch()
+        try:
+            await asyncio.wait_for(future, timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            self._forget(waiter)
+            self._reject(role, "timeout", self._average_duration())
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was granted while the client went away
+                self._release(user_id)
+            else:
+                self._forget(waiter)
+            raise
+
+    def _forget(self, waiter):
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+        MODEL_QUEUE_DEPTH.set(len(self._waiters))
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, role: str, timer: Optional[StageTimer] = None):
+        """Hold a model call slot for the duration of the block"""
+        wait_start = time.perf_counter()
+        if timer:
+            with timer.stage("queue_wait"):
+                await self._acquire(user_id, role)
+        else:
+            await self._acquire(user_id, role)
+        MODEL_QUEUE_WAIT_SECONDS.labels(role).observe(time.perf_counter() - wait_start)
+        
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._durations.append(time.perf_counter() - start)
+            self._release(user_id)
+
+MODEL_CLUSTER_MAX_CONCURRENCY = settings.model_cluster_max_concurrency or MODEL_MAX_CONCURRENCY
+MODEL_SLOT_LEASE_SECONDS = settings.model_slot_lease_seconds
+
+class SharedModelCallLimiter(ModelCallLimiter):
+    """ModelCallLimiter whose caps also hold across workers and replicas.
+
+    Each process keeps its local priority queue; once a request has a local
+    slot it takes a cluster-wide one in the model_slots document. Holders
+    expire after slot_lease_seconds so slots of a crashed process come back.
+    """
+
+    SLOTS_ID = "model_calls"
+
+    def __init__(self, max_concurrency: int, max_per_user: int, max_wait: float,
+                 cluster_max_concurrency: int, slot_lease_seconds: float):
+        super().__init__(max_concurrency, max_per_user, max_wait)
+        self.cluster_max_concurrency = cluster_max_concurrency
+        self.slot_lease_seconds = slot_lease_seconds
+
+    async def _try_acquire_shared(self, token: str, user_id: str) -> bool:
+        now = datetime.now(timezone.utc)
+        await db.model_slots.update_one(
+            {"_id": self.SLOTS_ID},
+            {"$pull": {"holders": {"expires_at": {"$lte": now}}}},
+            upsert=True
+        )
+        holders = {"$ifNull": ["$holders", []]}
+        result = await db.model_slots.update_one(
+            {"_id": self.SLOTS_ID, "$expr": {"$and": [
+                {"$lt": [{"$size": holders}, self.cluster_max_concurrency]},
+                {"$lt": [
+                    {"$size": {"$filter": {"input": holders, "cond": {"$eq": ["$$this.user_id", user_id]}}}},
+                    self.max_per_user
+                ]}
+            ]}},
+            {"$push": {"holders": {
+                "token": token,
+                "user_id": user_id,
+                "instance": INSTANCE_ID,
+                "expires_at": now + timedelta(seconds=self.slot_lease_seconds)
+            }}}
+        )
+        return result.modified_count == 1
+
+    async def _acquire_shared(self, user_id: str, role: str) -> str:
+        token = str(uuid.uuid4())
+        deadline = time.monotonic() + self.max_wait
+        delay = 0.05
+        while not await self._try_acquire_shared(token, user_id):
+            if time.monotonic() + delay > deadline:
+                self._reject(role, "cluster_busy", self._average_duration())
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+        return token
+
+    async def _release_shared(self, token: str):
+        await db.model_slots.update_one({"_id": self.SLOTS_ID}, {"$pull": {"holders": {"token": token}}})
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, role: str, timer: Optional[StageTimer] = None):
+        async with super().slot(user_id, role, timer):
+            if timer:
+                with timer.stage("cluster_wait"):
+                    token = await self._acquire_shared(user_id, role)
+            else:
+                token = await self._acquire_shared(user_id, role)
+            try:
+                yield
+            finally:
+                await self._release_shared(token)
+
+if COORDINATION_BACKEND == "mongo":
+    model_limiter = SharedModelCallLimiter(
+        MODEL_MAX_CONCURRENCY, MODEL_MAX_CONCURRENCY_PER_USER, MODEL_MAX_QUEUE_WAIT_SECONDS,
+        MODEL_CLUSTER_MAX_CONCURRENCY, MODEL_SLOT_LEASE_SECONDS
+    )
+else:
+    model_limiter = ModelCallLimiter(MODEL_MAX_CONCURRENCY, MODEL_MAX_CONCURRENCY_PER_USER, MODEL_MAX_QUEUE_WAIT_SECONDS)
+
+# Image model resilience policy
+MODEL_NAME = "gemini-2.5-flash-image-preview"
+MODEL_CALL_TIMEOUT_SECONDS = settings.model_call_timeout_seconds
+MODEL_CALL_MAX_ATTEMPTS = settings.model_call_max_attempts
+MODEL_RETRY_BASE_DELAY_SECONDS = settings.model_retry_base_delay_seconds
+MODEL_RETRY_MAX_DELAY_SECONDS = settings.model_retry_max_delay_seconds
+MODEL_HEDGE_ENABLED = settings.model_hedge_enabled
+MODEL_HEDGE_PERCENTILE = settings.model_hedge_percentile
+MODEL_BREAKER_FAILURE_THRESHOLD = settings.model_breaker_failure_threshold
+MODEL_BREAKER_RESET_SECONDS = settings.model_breaker_reset_seconds
+
+RETRYABLE_ERROR_NAMES = {
+    "RateLimitError", "ServiceUnavailableError", "APIConnectionError", "APIError",
+    "InternalServerError", "Timeout", "APITimeoutError", "ConnectionError", "ClientConnectorError"
+}
+RETRYABLE_ERROR_MARKERS = (
+    "429", "500", "502", "503", "504", "rate limit", "overloaded", "unavailable",
+    "timeout", "timed out", "temporarily", "connection reset"
+)
+
+class ModelEmptyResponseError(Exception):
+    """The image model answered without returning an image"""
+
+def new_image_chat(session_prefix: str, system_message: str) -> LlmChat:
+    """Create a chat session configured for the image model"""
+    chat = LlmChat(
+        api_key=get_settings().emergent_llm_key.get_secret_value(),
+        session_id=f"{session_prefix}_{uuid.uuid4()}",
+        system_message=system_message
+    )
+    chat.with_model("gemini", MODEL_NAME).with_params(modalities=["image", "text"])
+    return chat
+
+def model_error_reason(error: Exception) -> str:
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(error, ModelEmptyResponseError):
+        return "no_image"
+    return type(error).__name__
+
+def is_retryable_model_error(error: Exception) -> bool:
+    """Timeouts, empty answers, rate limits, connection and 5xx errors are worth retrying"""
+    if isinstance(error, (asyncio.TimeoutError, ModelEmptyResponseError, ConnectionError)):
+        return True
+    if type(error).__name__ in RETRYABLE_ERROR_NAMES:
+        return True
+    status_code = getattr(error, "status_code", None)
+    if isinstance(status_code, int):
+        return status_code == 429 or status_code >= 500
+    message = str(error).lower()
+    return any(marker in message for marker in RETRYABLE_ERROR_MARKERS)
+
+class CircuitBreaker:
+    """Fail fast while the upstream keeps failing, probing again after a cool-down"""
+
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+    STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def _set_state(self, state: str):
+        self.state = state
+        MODEL_CIRCUIT_STATE.set(self.STATE_VALUES[state])
+
+    def retry_after(self) -> float:
+        return max(self.reset_seconds - (time.monotonic() - self.opened_at), 1.0)
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self._set_state(self.HALF_OPEN)
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self._probe_in_flight = False
+        if self.state != self.CLOSED:
+            logger.info("Image model circuit closed")
+            self._set_state(self.CLOSED)
+
+    def release_probe(self):
+        """Give up the half-open probe without a verdict, e.g. when its call was cancelled"""
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Image model circuit opened after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+class ModelCallPolicy:
+    """Timeouts, classified retries with jittered backoff, optional hedging and a
+    circuit breaker around image model calls"""
+
+    def __init__(
+        self,
+        timeout: float,
+        max_attempts: int,
+        base_delay: float,
+        max_delay: float,
+        hedge_enabled: bool,
+        hedge_percentile: float,
+        breaker: CircuitBreaker
+    ):
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.breaker = breaker
+        self._latencies = deque(maxlen=200)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Latency percentile after which a second request is sent, once enough samples exist"""
+        if not self.hedge_enabled or len(self._latencies) < 20:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[int(self.hedge_percentile * (len(ordered) - 1))]
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    async def _single_call(self, make_chat: Callable[[], LlmChat], msg: UserMessage, operation: str):
+        start = time.perf_counter()
+        try:
+            text, images = await asyncio.wait_for(
+                make_chat().send_message_multimodal_response(msg),
+                timeout=self.timeout
+            )
+            if not images:
+                raise ModelEmptyResponseError("The model did not return an image")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            MODEL_CALL_FAILURES.labels(operation, model_error_reason(e)).inc()
+            raise
+        finally:
+            MODEL_CALL_SECONDS.labels(operation).observe(time.perf_counter() - start)
+        self._latencies.append(time.perf_counter() - start)
+        return text, images
+
+    async def _attempt(self, make_chat: Callable[[], LlmChat], msg: UserMessage, operation: str):
+        """One attempt, possibly hedged with a second concurrent request"""
+        primary = asyncio.ensure_future(self._single_call(make_chat, msg, operation))
+        tasks = [primary]
+        try:
+            delay = self.hedge_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    tasks.append(asyncio.ensure_future(self._single_call(make_chat, msg, operation)))
+            
+            last_error = None
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tasks.remove(task)
+                    if task.exception() is None:
+                        if len(tasks) or task is not primary:
+                            MODEL_CALL_HEDGES.labels(operation, "primary" if task is primary else "hedge").inc()
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def call(self, make_chat: Callable[[], LlmChat], msg: UserMessage, operation: str):
+        """Send msg to the image model and return (text, images)"""
+        for attempt in range(1, self.max_attempts + 1):
+            if not self.breaker.allow():
+                MODEL_CIRCUIT_REJECTIONS.labels(operation).inc()
+                raise HTTPException(
+                    status_code=503,
+                    detail="Le service de génération est momentanément indisponible, veuillez réessayer plus tard",
+                    headers={"Retry-After": str(math.ceil(self.breaker.retry_after()))}
+                )
+            probe = self.breaker.state == CircuitBreaker.HALF_OPEN
+            try:
+                result = await self._attempt(make_chat, msg, operation)
+            except Exception as e:
+                retryable = is_retryable_model_error(e)
+                if retryable:
+                    self.breaker.record_failure()
+                else:
+                    # The upstream answered, it just did not like this request
+                    self.breaker.record_success()
+                if not retryable or attempt == self.max_attempts:
+                    raise
+                delay = self.backoff(attempt)
+                MODEL_CALL_RETRIES.labels(operation, model_error_reason(e)).inc()
+                logger.warning(f"Image model {operation} attempt {attempt} failed ({model_error_reason(e)}: {e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            except BaseException:
+                # Cancellation says nothing about the upstream, let the next call probe
+                if probe:
+                    self.breaker.release_probe()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+
+model_policy = ModelCallPolicy(
+    timeout=MODEL_CALL_TIMEOUT_SECONDS,
+    max_attempts=MODEL_CALL_MAX_ATTEMPTS,
+    base_delay=MODEL_RETRY_BASE_DELAY_SECONDS,
+    max_delay=MODEL_RETRY_MAX_DELAY_SECONDS,
+    hedge_enabled=MODEL_HEDGE_ENABLED,
+    hedge_percentile=MODEL_HEDGE_PERCENTILE,
+    breaker=CircuitBreaker(MODEL_BREAKER_FAILURE_THRESHOLD, MODEL_BREAKER_RESET_SECONDS)
+)
+
+async def generate_outfit_image(
+    model_image_data: bytes,
+    fabric_image_data: Optional[bytes],
+    shoe_image_data: Optional[bytes],
+    accessory_image_data: Optional[bytes],
+    outfit_request: OutfitRequestCreate,
+    timer: Optional[StageTimer] = None
+) -> tuple:
+    """Generate outfit image using Gemini with Nano Banana model, returning (watermarked, master)"""
+    timer = timer or StageTimer("generate")
+    
+    try:
+        # Convert model image to base64
+        model_base64 = base64.b64encode(model_image_data).decode('utf-8')
+        
+        # Build detailed prompt with specific outfit specifications
+        prompt = build_outfit_prompt(outfit_request)
         
         # Prepare file contents
         file_contents = [ImageContent(model_base64)]
@@ -420,31 +2131,63 @@ Generate a stunning, photorealistic wedding image with perfect attention to ever
         # Create message
         msg = UserMessage(text=prompt, file_contents=file_contents)
         
-        # Generate image
-        text, images = await chat.send_message_multimodal_response(msg)
+        # Generate image, a fresh chat session is opened for every attempt
+        with timer.stage("model_call"):
+            text, images = await model_policy.call(
+                lambda: new_image_chat(
+                    "outfit_gen",
+                    "You are a professional fashion designer specializing in wedding attire visualization."
+                ),
+                msg,
+                "generate"
+            )
         
         if images and len(images) > 0:
             # Decode base64 image
             image_bytes = base64.b64decode(images[0]['data'])
             
-            # Apply watermark
-            watermarked_image = await apply_watermark(image_bytes)
-            
-            return watermarked_image
+            # Apply watermark, keeping the unwatermarked master for modifications
+            with timer.stage("watermark"):
+                return await finish_generated_image(image_bytes)
         else:
             raise HTTPException(status_code=500, detail="Failed to generate image")
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating outfit image: {e}")
         raise HTTPException(status_code=500, detail=f"Image generation failed: {str(e)}")
 
+def smtp_result(error: Exception) -> str:
+    """Classify an SMTP failure for the delivery metrics"""
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return "auth_failure"
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return "recipient_refused"
+    if isinstance(error, (smtplib.SMTPConnectError, smtplib.SMTPServerDisconnected, OSError)):
+        return "connection_error"
+    return "error"
+
+def smtp_send(server: str, port: int, username: str, password: str, msg) -> None:
+    """Deliver a message over SSL (port 465) or STARTTLS; blocking, run it in a thread"""
+    if port == 465:
+        with smtplib.SMTP_SSL(server, port) as smtp:
+            smtp.login(username, password)
+            smtp.send_message(msg)
+    else:
+        with smtplib.SMTP(server, port) as smtp:
+            smtp.starttls()
+            smtp.login(username, password)
+            smtp.send_message(msg)
+
 async def send_verification_email(email: str, prenom: str, verification_token: str):
     """Send email verification email"""
     try:
-        smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
-        smtp_port = int(os.getenv('SMTP_PORT', '587'))
-        sender_email = os.getenv('SENDER_EMAIL')
-        sender_password = os.getenv('SENDER_PASSWORD')
+        config = get_settings()
+        smtp_server = config.smtp_server
+        smtp_port = config.smtp_port
+        sender_email = config.sender_email
+        sender_password = config.smtp_password
         
         if not sender_email or not sender_password:
             logger.warning("Email credentials not configured")
@@ -457,7 +2200,7 @@ async def send_verification_email(email: str, prenom: str, verification_token: s
         msg['Subject'] = "Vérifiez votre compte TailorView"
         
         # Verification URL - adjust domain as needed
-        verification_url = f"{os.getenv('FRONTEND_URL', 'http://localhost:3000')}/verify/{verification_token}"
+        verification_url = f"{config.frontend_url}/verify/{verification_token}"
         
         body = f"""
         Bonjour {prenom},
@@ -479,15 +2222,14 @@ async def send_verification_email(email: str, prenom: str, verification_token: s
         
         # Send email
         try:
-            with smtplib.SMTP(smtp_server, smtp_port) as server:
-                server.starttls()
-                server.login(sender_email, sender_password)
-                server.send_message(msg)
+            await asyncio.to_thread(smtp_send, smtp_server, smtp_port, sender_email, sender_password, msg)
             
+            SMTP_ATTEMPTS.labels(smtp_server, str(smtp_port), "success").inc()
             logger.info(f"Verification email sent to {email}")
             return True
             
         except Exception as smtp_error:
+            SMTP_ATTEMPTS.labels(smtp_server, str(smtp_port), smtp_result(smtp_error)).inc()
             logger.error(f"SMTP error: {smtp_error}")
             return False
         
@@ -498,10 +2240,11 @@ async def send_verification_email(email: str, prenom: str, verification_token: s
 async def send_invitation_email(email: str, prenom: str, verification_token: str, inviter_name: str):
     """Send invitation email for user created by admin"""
     try:
-        smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
-        smtp_port = int(os.getenv('SMTP_PORT', '587'))
-        sender_email = os.getenv('SENDER_EMAIL')
-        sender_password = os.getenv('SENDER_PASSWORD')
+        config = get_settings()
+        smtp_server = config.smtp_server
+        smtp_port = config.smtp_port
+        sender_email = config.sender_email
+        sender_password = config.smtp_password
         
         if not sender_email or not sender_password:
             logger.warning("Email credentials not configured")
@@ -514,7 +2257,7 @@ async def send_invitation_email(email: str, prenom: str, verification_token: str
         msg['Subject'] = "Invitation à rejoindre TailorView"
         
         # Setup URL - adjust domain as needed
-        setup_url = f"{os.getenv('FRONTEND_URL', 'http://localhost:3000')}/setup-password/{verification_token}"
+        setup_url = f"{config.frontend_url}/setup-password/{verification_token}"
         
         body = f"""
         Bonjour {prenom},
@@ -534,15 +2277,14 @@ async def send_invitation_email(email: str, prenom: str, verification_token: str
         
         # Send email
         try:
-            with smtplib.SMTP(smtp_server, smtp_port) as server:
-                server.starttls()
-                server.login(sender_email, sender_password)
-                server.send_message(msg)
+            await asyncio.to_thread(smtp_send, smtp_server, smtp_port, sender_email, sender_password, msg)
             
+            SMTP_ATTEMPTS.labels(smtp_server, str(smtp_port), "success").inc()
             logger.info(f"Invitation email sent to {email}")
             return True
             
         except Exception as smtp_error:
+            SMTP_ATTEMPTS.labels(smtp_server, str(smtp_port), smtp_result(smtp_error)).inc()
             logger.error(f"SMTP error: {smtp_error}")
             return False
         
@@ -550,14 +2292,15 @@ async def send_invitation_email(email: str, prenom: str, verification_token: str
         logger.error(f"Error sending invitation email: {e}")
         return False
 
-async def send_email_with_image(email: str, image_data: bytes, outfit_details: dict):
+async def send_email_with_image(email: str, image_data: bytes, outfit_details: dict, queue_on_failure: bool = True):
     """Send generated image via email - with fallback to email queue"""
     try:
         # Email configuration - Try Gmail as fallback
-        smtp_server = os.getenv('SMTP_SERVER', 'mail.infomaniak.com')
-        smtp_port = int(os.getenv('SMTP_PORT', '587'))
-        sender_email = os.getenv('SENDER_EMAIL')
-        sender_password = os.getenv('SENDER_PASSWORD')
+        config = get_settings()
+        smtp_server = config.smtp_server
+        smtp_port = config.smtp_port
+        sender_email = config.sender_email
+        sender_password = config.smtp_password
         
         logger.info(f"Attempting to send email to {email} using {smtp_server}:{smtp_port}")
         
@@ -615,71 +2358,153 @@ L'équipe Blandin & Delloye"""
         for config in smtp_configs:
             try:
                 logger.info(f"Trying SMTP: {config['server']}:{config['port']}")
+                await asyncio.to_thread(smtp_send, config['server'], config['port'], config['email'], config['password'], msg)
                 
-                if config['port'] == 465:
-                    # Use SSL for port 465
-                    with smtplib.SMTP_SSL(config['server'], config['port']) as server:
-                        server.login(config['email'], config['password'])
-                        server.send_message(msg)
-                else:
-                    # Use STARTTLS for port 587
-                    with smtplib.SMTP(config['server'], config['port']) as server:
-                        server.starttls()
-                        server.login(config['email'], config['password'])
-                        server.send_message(msg)
-                
+                SMTP_ATTEMPTS.labels(config['server'], str(config['port']), "success").inc()
                 logger.info(f"Email sent successfully to {email} via {config['server']}")
                 return True
                 
             except smtplib.SMTPAuthenticationError as auth_error:
+                SMTP_ATTEMPTS.labels(config['server'], str(config['port']), smtp_result(auth_error)).inc()
                 logger.warning(f"Auth failed for {config['server']}: {auth_error}")
                 continue
             except Exception as smtp_error:
+                SMTP_ATTEMPTS.labels(config['server'], str(config['port']), smtp_result(smtp_error)).inc()
                 logger.warning(f"SMTP error for {config['server']}: {smtp_error}")
                 continue
         
-        # If all SMTP configs fail, save to email queue for manual processing
-        await save_email_to_queue(email, outfit_details, image_data)
-        logger.info(f"Email queued for manual processing: {email}")
+        # If all SMTP configs fail, hand the email to the outbox worker
+        if queue_on_failure:
+            await save_email_to_queue(email, outfit_details, image_data)
+            logger.info(f"Email queued for retry: {email}")
         return False
         
     except Exception as e:
         logger.error(f"Error in send_email_with_image: {e}")
         return False
 
+# Email outbox. Failed emails are email_queue documents that any replica can
+# claim and retry; attachments live in image storage, never on local disk.
+EMAIL_OUTBOX_INTERVAL_SECONDS = settings.email_outbox_interval_seconds
+EMAIL_OUTBOX_MAX_ATTEMPTS = settings.email_outbox_max_attempts
+EMAIL_OUTBOX_CLAIM_SECONDS = settings.email_outbox_claim_seconds
+EMAIL_OUTBOX_BATCH_SIZE = settings.email_outbox_batch_size
+
+async def enqueue_email(record: dict) -> dict:
+    """Add an email to the outbox, to be sent by the next outbox run"""
+    email_queue_record = {
+        "id": str(uuid.uuid4()),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": datetime.now(timezone.utc),
+        **record
+    }
+    await db.email_queue.insert_one(email_queue_record)
+    return email_queue_record
+
 async def save_email_to_queue(email: str, outfit_details: dict, image_data: bytes):
-    """Save email request to database for manual processing"""
+    """Save a generation email and its image to the outbox"""
     try:
-        email_queue_record = {
-            "id": str(uuid.uuid4()),
+        queue_id = str(uuid.uuid4())
+        image_key = f"email_queue/{queue_id}.png"
+        await image_storage.put(image_key, image_data, "image/png")
+        await enqueue_email({
+            "id": queue_id,
+            "kind": "outfit",
             "email": email,
             "outfit_details": outfit_details,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "status": "pending",
-            "image_saved": False
-        }
-        
-        # Save image to queue folder
-        queue_folder = Path("/app/email_queue")
-        queue_folder.mkdir(exist_ok=True)
-        
-        image_filename = f"queued_{email_queue_record['id']}.png"
-        image_path = queue_folder / image_filename
-        
-        with open(image_path, 'wb') as f:
-            f.write(image_data)
-        
-        email_queue_record["image_path"] = str(image_path)
-        email_queue_record["image_saved"] = True
-        
-        # Save to database
-        await db.email_queue.insert_one(email_queue_record)
-        
-        logger.info(f"Email queued successfully: {email} -> {image_filename}")
+            "image_key": image_key
+        })
+        logger.info(f"Email queued successfully: {email} -> {image_key}")
         
     except Exception as e:
         logger.error(f"Error saving email to queue: {e}")
 
+async def claim_outbox_email() -> Optional[dict]:
+    """Claim the next due email, or one whose claim expired with its worker"""
+    now = datetime.now(timezone.utc)
+    return await db.email_queue.find_one_and_update(
+        {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "pending", "next_attempt_at": {"$exists": False}},
+            {"status": "sending", "claimed_until": {"$lte": now}}
+        ]},
+        {
+            "$set": {
+                "status": "sending",
+                "claimed_by": INSTANCE_ID,
+                "claimed_until": now + timedelta(seconds=EMAIL_OUTBOX_CLAIM_SECONDS)
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def deliver_outbox_email(item: dict) -> bool:
+    if item.get("kind") == "images":
+        image_data_list = []
+        for image_id in item["image_ids"]:
+            stored = await read_image(image_id)
+            if stored is not None:
+                image_data, image_format = stored
+                image_data_list.append({
+                    'data': image_data,
+                    'filename': f"tenue_variante_{len(image_data_list) + 1}.{IMAGE_FORMATS[image_format]['extension']}"
+                })
+        if not image_data_list:
+            raise FileNotFoundError(f"No image left for queued email {item['id']}")
+        return await send_multiple_email_with_images(item["email"], image_data_list, item["subject"], item["body"])
+    
+    if item.get("image_key"):
+        image_data = await image_storage.get(item["image_key"])
+    else:
+        # Queued before the outbox, when images were written to /app/email_queue
+        async with aiofiles.open(item["image_path"], 'rb') as f:
+            image_data = await f.read()
+    if image_data is None:
+        raise FileNotFoundError(f"Image of queued email {item['id']} is missing")
+    return await send_email_with_image(item["email"], image_data, item["outfit_details"], queue_on_failure=False)
+
+async def process_email_outbox() -> dict:
+    """Send due outbox emails, rescheduling failures with exponential backoff"""
+    result = {"sent": 0, "retried": 0, "failed": 0}
+    for _ in range(EMAIL_OUTBOX_BATCH_SIZE):
+        item = await claim_outbox_email()
+        if item is None:
+            break
+        
+        error = None
+        try:
+            delivered = await deliver_outbox_email(item)
+        except Exception as e:
+            delivered = False
+            error = str(e)
+            logger.error(f"Error sending queued email {item['id']}: {e}")
+        
+        now = datetime.now(timezone.utc)
+        claim = {"id": item["id"], "claimed_by": INSTANCE_ID}
+        if delivered:
+            await db.email_queue.update_one(claim, {"$set": {"status": "sent", "sent_at": now}, "$unset": {"claimed_until": ""}})
+            if item.get("image_key"):
+                await image_storage.delete(item["image_key"])
+            result["sent"] += 1
+        elif item["attempts"] >= EMAIL_OUTBOX_MAX_ATTEMPTS:
+            await db.email_queue.update_one(claim, {"$set": {"status": "failed", "last_error": error}, "$unset": {"claimed_until": ""}})
+            result["failed"] += 1
+        else:
+            delay = min(EMAIL_OUTBOX_INTERVAL_SECONDS * 2 ** (item["attempts"] - 1), 3600)
+            await db.email_queue.update_one(claim, {
+                "$set": {"status": "pending", "next_attempt_at": now + timedelta(seconds=delay), "last_error": error},
+                "$unset": {"claimed_until": ""}
+            })
+            result["retried"] += 1
+    
+    if any(result.values()):
+        logger.info(f"Email outbox run: {result}")
+    return result
+
 # API Routes - Authentication (removed duplicate endpoints)
 
 # Removed duplicate get_current_user_info endpoint
@@ -736,8 +2561,9 @@ async def create_user_by_admin(
 @api_router.get("/admin/users")
 async def get_all_users(current_user: User = Depends(get_admin_user)):
     """Get all users (admin only)"""
-    users = await db.users.find({}, {"password": 0, "verification_token": 0}).to_list(1000)
-    return [User(**user).dict() for user in users]
+    users = await db.users.find({}, {"_id": 0, **{name: 1 for name in USER_LIST_FIELDS}}).to_list(1000)
+    defaults = {name: USER_DEFAULTS[name] for name in USER_LIST_FIELDS if name in USER_DEFAULTS}
+    return FastJSONResponse([{**defaults, **user} for user in users])
 
 # Removed duplicate endpoint - using the more comprehensive one below
 
@@ -787,14 +2613,15 @@ async def generate_outfit(
     current_user: User = Depends(get_current_user)
 ):
     """Generate groom outfit visualization (requires authentication)"""
+    timer = StageTimer("generate")
+    outfit_record = None
+    reservation = None
     
     try:
-        # Check if user has remaining image generation credits
-        if current_user.images_used_total >= current_user.images_limit_total:
-            raise HTTPException(
-                status_code=403, 
-                detail=f"Image generation limit exceeded. Used: {current_user.images_used_total}/{current_user.images_limit_total}"
-            )
+        # Reserve an image generation credit before doing any work
+        with timer.stage("credit_reserve"):
+            reservation = await CreditReservation.acquire(current_user.id)
+        
         # Validate file types
         if not model_image.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="Model file must be an image")
@@ -809,10 +2636,11 @@ async def generate_outfit(
             raise HTTPException(status_code=400, detail="Accessory file must be an image")
         
         # Read image data
-        model_data = await model_image.read()
-        fabric_data = await fabric_image.read() if fabric_image else None
-        shoe_data = await shoe_image.read() if shoe_image else None
-        accessory_data = await accessory_image.read() if accessory_image else None
+        with timer.stage("read_uploads"):
+            model_data = await model_image.read()
+            fabric_data = await fabric_image.read() if fabric_image else None
+            shoe_data = await shoe_image.read() if shoe_image else None
+            accessory_data = await accessory_image.read() if accessory_image else None
         
         # Create outfit request
         outfit_request = OutfitRequestCreate(
@@ -832,46 +2660,47 @@ async def generate_outfit(
         # Save to database with user information FIRST (before image generation)
         outfit_record = OutfitRequest(**outfit_request.dict())
         outfit_record.user_email = current_user.email  # Add the connected user's email
-        await db.outfit_requests.insert_one(outfit_record.dict())
+        outfit_record.status = "pending"
+        outfit_record.image_format = IMAGE_STORAGE_FORMAT
+        outfit_record.root_request_id = outfit_record.id
+        with timer.stage("db_insert"):
+            await db.outfit_requests.insert_one(outfit_record.dict())
         
         # Generate image
-        generated_image = await generate_outfit_image(model_data, fabric_data, shoe_data, accessory_data, outfit_request)
+        async with model_limiter.slot(current_user.id, current_user.role, timer):
+            generated_image, master_image = await generate_outfit_image(model_data, fabric_data, shoe_data, accessory_data, outfit_request, timer)
         
         # Save generated image
-        image_filename = f"generated_{outfit_record.id}.png"
-        image_path = Path(f"/app/generated_images/{image_filename}")
-        image_path.parent.mkdir(exist_ok=True)
+        generated_filename = image_filename(outfit_record.id)
+        with timer.stage("file_write"):
+            master_format = await store_generated_image(outfit_record.id, generated_image, master_image)
         
-        async with aiofiles.open(image_path, 'wb') as f:
-            await f.write(generated_image)
+        # Charge the reserved credit, the updated counters come back with the update
+        with timer.stage("credit_update"):
+            user_credits = await reservation.commit()
         
-        # Increment user's image usage count
-        await db.users.update_one(
-            {"id": current_user.id},
-            {"$inc": {"images_used_total": 1}}
+        await save_request_timings(
+            outfit_record.id, timer, "success",
+            {"master_format": master_format, "status": "succeeded"}
         )
-        
-        # Get updated user info for response
-        updated_user_data = await db.users.find_one({"id": current_user.id})
-        updated_user = User(**updated_user_data)
+        await record_request_stats(outfit_record.dict())
         
         return {
             "success": True,
             "request_id": outfit_record.id,
-            "image_filename": image_filename,
-            "download_url": f"/api/download/{image_filename}",
+            "image_filename": generated_filename,
+            "download_url": f"/api/download/{generated_filename}",
+            "signed_url": signed_download_url(generated_filename),
             "message": "Outfit generated successfully!",
-            "user_credits": {
-                "used": updated_user.images_used_total,
-                "limit": updated_user.images_limit_total,
-                "remaining": updated_user.images_limit_total - updated_user.images_used_total
-            }
+            "user_credits": user_credits
         }
         
-    except HTTPException:
+    except HTTPException as e:
+        await abandon_generation(reservation, outfit_record.id if outfit_record else None, str(e.detail), timer=timer)
         raise
     except Exception as e:
         logger.error(f"Error in generate_outfit: {e}")
+        await abandon_generation(reservation, outfit_record.id if outfit_record else None, str(e), timer=timer)
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.post("/send-multiple")
@@ -889,23 +2718,32 @@ async def send_multiple_images(request: dict):
         # Collect all image data
         image_data_list = []
         for image_id in image_ids:
-            image_path = Path(f"/app/generated_images/generated_{image_id}.png")
-            if image_path.exists():
-                with open(image_path, 'rb') as f:
-                    image_data_list.append({
-                        'data': f.read(),
-                        'filename': f"tenue_variante_{len(image_data_list) + 1}.png"
-                    })
+            stored = await read_image(image_id)
+            if stored is not None:
+                image_data, image_format = stored
+                image_data_list.append({
+                    'data': image_data,
+                    'filename': f"tenue_variante_{len(image_data_list) + 1}.{IMAGE_FORMATS[image_format]['extension']}"
+                })
         
         if not image_data_list:
             raise HTTPException(status_code=404, detail="Aucune image trouvée")
         
-        # Send email with multiple attachments
+        # Send email with multiple attachments, the outbox retries on failure
         success = await send_multiple_email_with_images(email, image_data_list, subject, body)
+        if not success:
+            await enqueue_email({
+                "kind": "images",
+                "email": email,
+                "subject": subject,
+                "body": body,
+                "image_ids": image_ids
+            })
         
         return {
             "success": success,
-            "message": f"{len(image_data_list)} images envoyées" if success else "Échec de l'envoi"
+            "queued": not success,
+            "message": f"{len(image_data_list)} images envoyées" if success else "Échec de l'envoi, nouvel essai automatique en cours"
         }
         
     except Exception as e:
@@ -915,10 +2753,11 @@ async def send_multiple_images(request: dict):
 async def send_multiple_email_with_images(email: str, image_data_list: list, subject: str, body: str):
     """Send email with multiple image attachments"""
     try:
-        smtp_server = os.getenv('SMTP_SERVER', 'mail.infomaniak.com')
-        smtp_port = int(os.getenv('SMTP_PORT', '587'))
-        sender_email = os.getenv('SENDER_EMAIL')
-        sender_password = os.getenv('SENDER_PASSWORD')
+        config = get_settings()
+        smtp_server = config.smtp_server
+        smtp_port = config.smtp_port
+        sender_email = config.sender_email
+        sender_password = config.smtp_password
         
         if not sender_email or not sender_password:
             logger.warning("Email credentials not configured")
@@ -945,69 +2784,541 @@ async def send_multiple_email_with_images(email: str, image_data_list: list, sub
         
         # Send email
         try:
-            with smtplib.SMTP(smtp_server, smtp_port) as server:
-                server.starttls()
-                server.login(sender_email, sender_password)
-                server.send_message(msg)
+            await asyncio.to_thread(smtp_send, smtp_server, smtp_port, sender_email, sender_password, msg)
             
+            SMTP_ATTEMPTS.labels(smtp_server, str(smtp_port), "success").inc()
             logger.info(f"Multiple images email sent successfully to {email}")
             return True
             
         except Exception as smtp_error:
+            SMTP_ATTEMPTS.labels(smtp_server, str(smtp_port), smtp_result(smtp_error)).inc()
             logger.error(f"SMTP error: {smtp_error}")
             return False
         
     except Exception as e:
-        logger.error(f"Error preparing multiple email: {e}")
-        return False
+        logger.error(f"Error preparing multiple email: {e}")
+        return False
+
+@api_router.get("/download/{filename}")
+async def download_image(filename: str, request: Request, format: Optional[str] = None):
+    """Download generated image, in the stored format or transcoded for clients that need PNG"""
+    if DOWNLOAD_REQUIRE_SIGNATURE:
+        raise HTTPException(status_code=403, detail="A signed download URL is required")
+    return await serve_image(filename, request, format)
+
+@api_router.get("/download/signed/{filename}")
+async def download_signed_image(filename: str, request: Request, expires: int, sig: str, format: Optional[str] = None):
+    """Download generated image through a signed, expiring URL"""
+    if not verify_download_signature(filename, expires, sig):
+        raise HTTPException(status_code=403, detail="Invalid or expired download link")
+    # Shared caches must not keep the image, the browser only while the link is valid
+    return await serve_image(filename, request, format, cache_control=f"private, max-age={max(0, expires - int(time.time()))}")
+
+class BundleDownloadRequest(BaseModel):
+    request_ids: List[str]
+
+DOWNLOAD_BUNDLE_MAX_ITEMS = settings.download_bundle_max_items
+
+class ZipChunkWriter(io.RawIOBase):
+    """Unseekable sink for zipfile, handing back what was written since the last drain"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+async def zip_stream(entries: list) -> AsyncIterator[bytes]:
+    """Stream a ZIP of (name, key, date_time) storage objects chunk by chunk.
+
+    Members are stored, images are already compressed. The sink cannot seek,
+    so zipfile writes sizes and CRCs in data descriptors after each member and
+    memory stays at one storage chunk whatever the archive size.
+    """
+    sink = ZipChunkWriter()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        for name, key, date_time in entries:
+            with archive.open(zipfile.ZipInfo(name, date_time=date_time), mode="w") as member:
+                async for chunk in image_storage.stream(key):
+                    member.write(chunk)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
+
+@api_router.post("/download/bundle")
+async def download_bundle(bundle: BundleDownloadRequest, current_user: User = Depends(get_current_user)):
+    """Download several generated images as one ZIP, streamed from storage"""
+    request_ids = list(dict.fromkeys(bundle.request_ids))
+    if not request_ids:
+        raise HTTPException(status_code=400, detail="Aucune image sélectionnée")
+    if len(request_ids) > DOWNLOAD_BUNDLE_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Au plus {DOWNLOAD_BUNDLE_MAX_ITEMS} images par archive")
+    
+    # Ownership of every image in one query: requests of other users are
+    # reported like missing ones, so ids cannot be probed
+    query = {"id": {"$in": request_ids}, **SUCCEEDED_REQUESTS}
+    if current_user.role != UserRole.ADMIN:
+        query["user_email"] = current_user.email
+    requests = {
+        request["id"]: request
+        for request in await db.outfit_requests.find(
+            query, {"_id": 0, "id": 1, "timestamp": 1}
+        ).to_list(len(request_ids))
+    }
+    missing = [request_id for request_id in request_ids if request_id not in requests]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Requests not found: {', '.join(missing)}")
+    
+    # Locate every image before the first byte is sent, errors can still be reported
+    entries = []
+    for request_id, resolved in zip(request_ids, await asyncio.gather(*(resolve_image(request_id) for request_id in request_ids))):
+        resolved = resolved or await restore_cold_image(request_id)
+        if not resolved:
+            missing.append(request_id)
+            continue
+        key, image_format = resolved
+        timestamp = requests[request_id].get("timestamp")
+        if not isinstance(timestamp, datetime):
+            timestamp = datetime.now(timezone.utc)
+        entries.append((image_filename(request_id, image_format), key, timestamp.timetuple()[:6]))
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Images not found: {', '.join(missing)}")
+    
+    archive_name = f"tenues_{datetime.now(timezone.utc):%Y-%m-%d}.zip"
+    return StreamingResponse(
+        (chunk async for chunk in zip_stream(entries) if chunk),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{archive_name}"', "Cache-Control": "no-store"}
+    )
+
+@api_router.get("/images/{request_id}/url")
+async def get_signed_image_url(request_id: str, current_user: User = Depends(get_current_user)):
+    """Issue a signed, expiring download URL for an image the user can access"""
+    outfit_request = await db.outfit_requests.find_one({"id": request_id}, {"_id": 0, "user_email": 1})
+    if not outfit_request:
+        raise HTTPException(status_code=404, detail="Request not found")
+    if outfit_request.get("user_email") != current_user.email and current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Access denied to this request")
+    
+    return {
+        "url": signed_download_url(image_filename(request_id)),
+        "expires_in": DOWNLOAD_URL_TTL_SECONDS
+    }
+
+async def serve_image(filename: str, request: Request, format: Optional[str] = None, cache_control: Optional[str] = None):
+    """Build the response for an image download, offloading the bytes when configured"""
+    match = GENERATED_FILENAME_PATTERN.match(filename)
+    if not match:
+        raise HTTPException(status_code=404, detail="Image not found")
+    request_id, requested_extension = match.groups()
+    
+    resolved = await resolve_image(request_id) or await restore_cold_image(request_id)
+    if not resolved:
+        raise HTTPException(status_code=404, detail="Image not found")
+    key, stored_format = resolved
+    
+    served_format = negotiate_image_format(stored_format, requested_extension, format, request.headers.get("accept", ""))
+    if served_format != stored_format:
+        key = await ensure_rendition(request_id, key, served_format)
+    
+    info = await image_storage.stat(key)
+    if not info:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    media_type = IMAGE_FORMATS[served_format]["mime"]
+    served_filename = image_filename(request_id, served_format)
+    etag = image_etag(request_id, served_format, info.size)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control or f"public, max-age={IMAGE_CACHE_MAX_AGE_SECONDS}, immutable",
+        "Accept-Ranges": "bytes",
+        "Vary": "Accept"
+    }
+    
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    local_path = image_storage.local_path(key)
+    if DOWNLOAD_OFFLOAD != "none":
+        if local_path is None:
+            presigned_url = await image_storage.presign(key, DOWNLOAD_URL_TTL_SECONDS)
+            if presigned_url:
+                return RedirectResponse(presigned_url, status_code=307)
+        elif DOWNLOAD_OFFLOAD == "x-accel-redirect":
+            # nginx serves the file from an internal location, ranges and conditional requests included
+            return Response(headers={**headers, "Content-Type": media_type, "X-Accel-Redirect": f"{DOWNLOAD_ACCEL_PREFIX}{key}"})
+        elif DOWNLOAD_OFFLOAD == "x-sendfile":
+            return Response(headers={**headers, "Content-Type": media_type, "X-Sendfile": str(local_path)})
+    
+    byte_range = None
+    range_header = request.headers.get("range")
+    if range_header:
+        if_range = request.headers.get("if-range")
+        if not if_range or etag_matches(if_range, etag):
+            byte_range = parse_byte_range(range_header, info.size)
+    
+    if byte_range:
+        start, end = byte_range
+        return StreamingResponse(
+            image_storage.stream(key, start=start, end=end),
+            status_code=206,
+            media_type=media_type,
+            headers={
+                **headers,
+                "Content-Range": f"bytes {start}-{end}/{info.size}",
+                "Content-Length": str(end - start + 1)
+            }
+        )
+    
+    if local_path:
+        return FileResponse(
+            path=local_path,
+            filename=served_filename,
+            media_type=media_type,
+            headers=headers
+        )
+    
+    return StreamingResponse(
+        image_storage.stream(key),
+        media_type=media_type,
+        headers={
+            **headers,
+            "Content-Length": str(info.size),
+            "Content-Disposition": f'attachment; filename="{served_filename}"'
+        }
+    )
+
+@api_router.get("/admin/requests")
+async def get_all_requests(
+    fields: Optional[str] = None,
+    status: str = "succeeded",
+    export: bool = False,
+    admin_user: User = Depends(get_admin_user)
+):
+    """Get all outfit requests for admin view, filtered by ?status=succeeded|pending|failed|all.
+
+    With ?export=true the signed links last DOWNLOAD_EXPORT_URL_TTL_SECONDS, for spreadsheets.
+    """
+    url_ttl = DOWNLOAD_EXPORT_URL_TTL_SECONDS if export else None
+    rows = await find_request_rows(request_status_query(status), request_fields(fields), signed_urls=True, url_ttl=url_ttl)
+    return FastJSONResponse(rows)
+
+# Admin statistics, maintained incrementally in the stats collection as
+# {_id: "<kind>:<key>", kind, key, count} documents
+STATS_CACHE_TTL_SECONDS = settings.stats_cache_ttl_seconds
+STATS_DIMENSIONS = ("atmosphere", "suit_type")
+stats_cache = TTLCache(maxsize=1, ttl=STATS_CACHE_TTL_SECONDS)
+
+def stats_day(timestamp) -> str:
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    return (timestamp or datetime.now(timezone.utc)).strftime('%Y-%m-%d')
+
+def stats_counter(kind: str, key: str, delta: int) -> UpdateOne:
+    return UpdateOne(
+        {"_id": f"{kind}:{key}"},
+        {"$inc": {"count": delta}, "$setOnInsert": {"kind": kind, "key": key}},
+        upsert=True
+    )
+
+async def record_request_stats(request: dict, delta: int = 1, images: int = None):
+    """Add (or with delta=-1 remove) a request to the stats counters"""
+    operations = [
+        stats_counter("total", "requests", delta),
+        stats_counter("total", "images", delta if images is None else images),
+        stats_counter("day", stats_day(request.get("timestamp")), delta)
+    ]
+    for dimension in STATS_DIMENSIONS:
+        operations.append(stats_counter(dimension, request.get(dimension) or "unknown", delta))
+    if request.get("user_email"):
+        operations.append(stats_counter("user", request["user_email"], delta))
+    
+    try:
+        await db.stats.bulk_write(operations, ordered=False)
+        stats_cache.clear()
+    except Exception as e:
+        logger.error(f"Error updating stats for request {request.get('id')}: {e}")
 
-@api_router.get("/download/{filename}")
-async def download_image(filename: str):
-    """Download generated image"""
-    image_path = Path(f"/app/generated_images/{filename}")
+async def rebuild_stats() -> dict:
+    """Recompute every stats counter from outfit_requests"""
+    documents = {}
     
-    if not image_path.exists():
-        raise HTTPException(status_code=404, detail="Image not found")
+    def add(kind: str, key: str, count: int):
+        documents[f"{kind}:{key}"] = {"_id": f"{kind}:{key}", "kind": kind, "key": key, "count": count}
     
-    return FileResponse(
-        path=image_path,
-        filename=filename,
-        media_type='image/png'
-    )
+    add("total", "requests", await db.outfit_requests.count_documents(SUCCEEDED_REQUESTS))
+    # One image per succeeded request until retention archives it; masters,
+    # renditions and archived copies are not images of the gallery
+    add("total", "images", await db.outfit_requests.count_documents({**SUCCEEDED_REQUESTS, "archived_at": {"$exists": False}}))
+    
+    groupings = {
+        "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+        "atmosphere": {"$ifNull": ["$atmosphere", "unknown"]},
+        "suit_type": {"$ifNull": ["$suit_type", "unknown"]},
+        "user": "$user_email"
+    }
+    pipeline = [{"$match": SUCCEEDED_REQUESTS}, {"$facet": {
+        kind: [{"$group": {"_id": expression, "count": {"$sum": 1}}}]
+        for kind, expression in groupings.items()
+    }}]
+    facets = (await db.outfit_requests.aggregate(pipeline).to_list(1))[0]
+    for kind, rows in facets.items():
+        for row in rows:
+            if row["_id"] is not None:
+                add(kind, row["_id"], row["count"])
+    
+    await db.stats.delete_many({})
+    if documents:
+        await db.stats.insert_many(list(documents.values()))
+    stats_cache.clear()
+    return {"counters": len(documents)}
 
-@api_router.get("/admin/requests", response_model=List[OutfitRequest])
-async def get_all_requests():
-    """Get all outfit requests for admin view"""
-    requests = await db.outfit_requests.find().sort("timestamp", -1).to_list(1000)
-    return [OutfitRequest(**request) for request in requests]
+async def load_admin_stats() -> dict:
+    counters = await db.stats.find({}, {"_id": 0}).to_list(None)
+    by_kind = defaultdict(dict)
+    for counter in counters:
+        by_kind[counter["kind"]][counter["key"]] = counter["count"]
+    
+    def ranked(kind: str, limit: int = None) -> list:
+        rows = sorted(
+            ({"_id": key, "count": count} for key, count in by_kind[kind].items() if count > 0),
+            key=lambda row: row["count"],
+            reverse=True
+        )
+        return rows[:limit] if limit else rows
+    
+    return {
+        "total_requests": by_kind["total"].get("requests", 0),
+        "today_requests": by_kind["day"].get(stats_day(datetime.now(timezone.utc)), 0),
+        "atmosphere_stats": ranked("atmosphere", 10),
+        "suit_type_stats": ranked("suit_type"),
+        "top_users": ranked("user", 10),
+        "generated_images_count": by_kind["total"].get("images", 0)
+    }
 
 @api_router.get("/admin/stats")
 async def get_admin_stats():
     """Get admin statistics"""
-    total_requests = await db.outfit_requests.count_documents({})
-    recent_requests = await db.outfit_requests.count_documents({
-        "timestamp": {"$gte": datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)}
-    })
+    if "admin" not in stats_cache:
+        stats_cache["admin"] = await load_admin_stats()
+    return stats_cache["admin"]
+
+@api_router.post("/admin/stats/rebuild")
+async def rebuild_admin_stats(admin_user: User = Depends(get_admin_user)):
+    """Recompute the statistics counters from scratch (admin only)"""
+    return {"success": True, **(await rebuild_stats())}
+
+# Analytics, served from one pre-aggregated daily_rollups document per day
+ANALYTICS_ROLLUP_INTERVAL_SECONDS = settings.analytics_rollup_interval_seconds
+ANALYTICS_DIMENSIONS = ("atmosphere", "suit_type", "lapel_type", "pocket_type", "shoe_type", "accessory_type", "gender")
+
+def day_start(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+async def rollup_day(day: datetime) -> dict:
+    """Aggregate the requests of one UTC day into its daily_rollups document"""
+    start = day_start(day)
+    end = start + timedelta(days=1)
+    facets = {
+        "totals": [{"$group": {
+            "_id": None,
+            "requests": {"$sum": 1},
+            "modifications": {"$sum": {"$cond": [{"$ifNull": ["$original_request_id", False]}, 1, 0]}}
+        }}],
+        "users": [
+            {"$group": {"_id": "$user_email", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1}}
+        ]
+    }
+    for dimension in ANALYTICS_DIMENSIONS:
+        facets[dimension] = [
+            {"$group": {"_id": f"${dimension}", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1}}
+        ]
+    result = (await db.outfit_requests.aggregate([
+        {"$match": {**SUCCEEDED_REQUESTS, "timestamp": {"$gte": start, "$lt": end}}},
+        {"$facet": facets}
+    ]).to_list(1))[0]
     
-    # Get requests by atmosphere
-    pipeline = [
-        {"$group": {"_id": "$atmosphere", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}}
-    ]
-    atmosphere_stats = await db.outfit_requests.aggregate(pipeline).to_list(10)
+    totals = result["totals"][0] if result["totals"] else {"requests": 0, "modifications": 0}
+    rollup = {
+        "_id": start.strftime('%Y-%m-%d'),
+        "date": start,
+        "requests": totals["requests"],
+        "modifications": totals["modifications"],
+        "options": {
+            dimension: [{"value": row["_id"], "count": row["count"]} for row in result[dimension] if row["_id"] is not None]
+            for dimension in ANALYTICS_DIMENSIONS
+        },
+        "users": [{"user": row["_id"], "count": row["count"]} for row in result["users"] if row["_id"]],
+        "computed_at": datetime.now(timezone.utc)
+    }
+    await db.daily_rollups.replace_one({"_id": rollup["_id"]}, rollup, upsert=True)
+    return rollup
+
+async def rollup_days(days: int) -> dict:
+    """Recompute the rollups of the last `days` days, today included"""
+    today = day_start(datetime.now(timezone.utc))
+    for offset in range(days):
+        await rollup_day(today - timedelta(days=offset))
+    return {"days": days}
+
+async def backfill_rollups() -> dict:
+    """Compute rollups for every day since the first request"""
+    first = await db.outfit_requests.find({}, {"timestamp": 1}).sort("timestamp", 1).limit(1).to_list(1)
+    if not first or not isinstance(first[0].get("timestamp"), datetime):
+        return {"days": 0}
+    first_day = first[0]["timestamp"]
+    if first_day.tzinfo is None:
+        first_day = first_day.replace(tzinfo=timezone.utc)
+    return await rollup_days((day_start(datetime.now(timezone.utc)) - day_start(first_day)).days + 1)
+
+async def analytics_rollup_job():
+    """Keep today's and yesterday's rollups fresh, backfilling on first run"""
+    if await db.daily_rollups.estimated_document_count() == 0:
+        result = await backfill_rollups()
+        logger.info(f"Analytics rollups backfilled: {result['days']} days")
+    # Yesterday is recomputed too, to pick up requests that landed around midnight
+    await rollup_days(2)
+
+def analytics_period(day: str, granularity: str) -> str:
+    if granularity == "week":
+        year, week, _ = datetime.strptime(day, '%Y-%m-%d').isocalendar()
+        return f"{year}-W{week:02d}"
+    if granularity == "month":
+        return day[:7]
+    return day
+
+@api_router.get("/admin/analytics")
+async def get_admin_analytics(
+    days: int = 90,
+    granularity: str = "day",
+    admin_user: User = Depends(get_admin_user)
+):
+    """Usage analytics over the last `days` days (admin only)"""
+    if granularity not in ("day", "week", "month"):
+        raise HTTPException(status_code=400, detail="granularity must be 'day', 'week' or 'month'")
+    days = max(1, min(days, 3660))
+    
+    since = (day_start(datetime.now(timezone.utc)) - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    rollups = await db.daily_rollups.find({"_id": {"$gte": since}}, {"date": 0, "computed_at": 0}).sort("_id", 1).to_list(None)
+    
+    series = {}
+    options = {dimension: defaultdict(int) for dimension in ANALYTICS_DIMENSIONS}
+    users = defaultdict(lambda: {"requests": 0, "active_days": 0})
+    total_requests = 0
+    total_modifications = 0
+    
+    for rollup in rollups:
+        period = analytics_period(rollup["_id"], granularity)
+        point = series.setdefault(period, {"period": period, "requests": 0, "modifications": 0})
+        point["requests"] += rollup["requests"]
+        point["modifications"] += rollup["modifications"]
+        total_requests += rollup["requests"]
+        total_modifications += rollup["modifications"]
+        for dimension in ANALYTICS_DIMENSIONS:
+            for row in rollup.get("options", {}).get(dimension, []):
+                options[dimension][row["value"]] += row["count"]
+        for row in rollup.get("users", []):
+            users[row["user"]]["requests"] += row["count"]
+            users[row["user"]]["active_days"] += 1
     
     return {
+        "days": days,
+        "granularity": granularity,
+        "series": list(series.values()),
         "total_requests": total_requests,
-        "today_requests": recent_requests,
-        "atmosphere_stats": atmosphere_stats,
-        "generated_images_count": len(list(Path("/app/generated_images").glob("*.png"))) if Path("/app/generated_images").exists() else 0
+        "total_modifications": total_modifications,
+        "modification_rate": round(total_modifications / total_requests, 4) if total_requests else 0,
+        "option_popularity": {
+            dimension: sorted(
+                ({"value": value, "count": count} for value, count in counts.items()),
+                key=lambda row: row["count"],
+                reverse=True
+            )
+            for dimension, counts in options.items()
+        },
+        "user_activity": sorted(
+            ({"user": user, **activity} for user, activity in users.items()),
+            key=lambda row: row["requests"],
+            reverse=True
+        )[:50]
+    }
+
+@api_router.get("/admin/settings")
+async def get_admin_settings(
+    current_settings: Settings = Depends(get_settings),
+    admin_user: User = Depends(get_admin_user)
+):
+    """Current configuration, secrets masked (admin only)"""
+    return {
+        "settings": current_settings.model_dump(mode="json"),
+        "reloadable": sorted(RELOADABLE_SETTINGS)
+    }
+
+# A reload is applied by the worker handling it, then announced by bumping
+# the version in app_config; every worker polls it and reloads in turn, each
+# from its own environment and backend/.env.
+SETTINGS_SYNC_INTERVAL_SECONDS = settings.settings_sync_interval_seconds
+SETTINGS_VERSION_ID = "settings_version"
+settings_version = None  # Version this process runs, None until the first sync
+
+async def sync_settings():
+    """Reload the settings when another worker announced a newer version"""
+    global settings_version
+    document = await db.app_config.find_one({"_id": SETTINGS_VERSION_ID})
+    version = document["version"] if document else 0
+    if settings_version is not None and version > settings_version:
+        try:
+            result = reload_settings()
+            logger.info(f"Settings reloaded to version {version}: {result}")
+        except ValidationError as e:
+            logger.error(f"Settings version {version} is invalid here, settings unchanged: {e.error_count()} errors")
+    settings_version = version
+
+@api_router.post("/admin/settings/reload")
+async def reload_admin_settings(admin_user: User = Depends(get_admin_user)):
+    """Reload the configuration without restarting, in every worker (admin only)"""
+    global settings_version
+    try:
+        result = reload_settings()
+    except ValidationError as e:
+        # Keep the current settings; report what is wrong without echoing values
+        errors = [f"{'.'.join(str(part) for part in error['loc']) or 'settings'}: {error['msg']}" for error in e.errors()]
+        raise HTTPException(status_code=400, detail={"message": "Invalid configuration, settings unchanged", "errors": errors})
+    
+    document = await db.app_config.find_one_and_update(
+        {"_id": SETTINGS_VERSION_ID},
+        {"$inc": {"version": 1}, "$set": {"reloaded_by": admin_user.email, "reloaded_at": datetime.now(timezone.utc)}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    settings_version = document["version"]
+    logger.info(f"Settings reloaded by {admin_user.email}, version {settings_version}: {result}")
+    return {
+        "success": True,
+        **result,
+        "instance": INSTANCE_ID,
+        "version": settings_version,
+        "propagation_seconds": SETTINGS_SYNC_INTERVAL_SECONDS
     }
 
 @api_router.get("/admin/email-queue")
 async def get_email_queue():
-    """Get pending email queue for admin view"""
+    """Get the emails still waiting in the outbox, or given up on, for admin view"""
     try:
-        queue_items = await db.email_queue.find({"status": "pending"}).sort("timestamp", -1).to_list(100)
+        queue_items = await db.email_queue.find(
+            {"status": {"$in": ["pending", "sending", "failed"]}}
+        ).sort("timestamp", -1).to_list(100)
         
         # Convert ObjectId to string for JSON serialization
         for item in queue_items:
@@ -1019,30 +3330,619 @@ async def get_email_queue():
         logger.error(f"Error fetching email queue: {e}")
         return {"success": False, "queue": []}
 
+# Retention and lifecycle. A scheduled sweep expires requests by age, by the
+# status of their owner and to keep storage under budget, either deleting them
+# or archiving their image, and cleans up the email outbox.
+RETENTION_MAX_AGE_DAYS = settings.retention_max_age_days
+RETENTION_INACTIVE_USER_DAYS = settings.retention_inactive_user_days
+RETENTION_STORAGE_BUDGET_BYTES = settings.retention_storage_budget_bytes
+RETENTION_ACTION = settings.retention_action
+RETENTION_EMAIL_QUEUE_DAYS = settings.retention_email_queue_days
+RETENTION_DELETE_ORPHAN_FILES = settings.retention_delete_orphan_files
+RETENTION_BATCH_SIZE = settings.retention_batch_size
+RETENTION_SWEEP_INTERVAL_SECONDS = settings.retention_sweep_interval_seconds
+# Files younger than this are never reported as orphans: their request may still be in flight
+ORPHAN_GRACE_SECONDS = 3600
+
+async def remove_request(request_id: str) -> Optional[dict]:
+    """Delete a request record, then its images, keeping the stats counters in sync.
+
+    The record goes first: a failure afterwards leaves an orphan file, which
+    the sweep detects, rather than a record pointing at a missing image.
+    """
+    deleted_request = await db.outfit_requests.find_one_and_delete({"id": request_id})
+    if not deleted_request:
+        return None
+    image_deleted = await delete_image(request_id, deleted_request)
+    # Pending and failed requests were never added to the counters, and
+    # archiving already took the image of an archived one off them
+    counted = deleted_request.get("status") in ("succeeded", None)
+    image_counted = counted and image_deleted and not deleted_request.get("archived_at")
+    await record_request_stats(deleted_request, -1 if counted else 0, -1 if image_counted else 0)
+    return deleted_request
+
+async def archive_request(request: dict) -> bool:
+    """Move the image of a request under archive/ and mark the record archived"""
+    resolved = await resolve_image(request["id"])
+    archive_master_key = None
+    if resolved:
+        key, image_format = resolved
+        await image_storage.move(key, ARCHIVE_PREFIX + key)
+        master = master_key(request["id"], request["master_format"]) if request.get("master_format") else None
+        if master and await image_storage.stat(master):
+            # Kept with the image so a later modification does not start from the watermarked copy
+            archive_master_key = ARCHIVE_PREFIX + master
+            await image_storage.move(master, archive_master_key)
+        for other_key in request_hot_keys(request):
+            if other_key not in (key, master):
+                await image_storage.delete(other_key)
+    result = await db.outfit_requests.update_one(
+        {"id": request["id"], "archived_at": {"$exists": False}},
+        {"$set": {
+            "archived_at": datetime.now(timezone.utc),
+            "archive_key": ARCHIVE_PREFIX + resolved[0] if resolved else None,
+            "archive_master_key": archive_master_key
+        }}
+    )
+    if resolved and result.modified_count:
+        await record_request_stats(request, 0, -1)
+    return result.modified_count == 1
+
+async def stat_hot_keys(request: dict) -> list:
+    """(key, size) of the live keys a request occupies"""
+    keys = request_hot_keys(request)
+    infos = await asyncio.gather(*(image_storage.stat(key) for key in keys))
+    return [(key, info.size) for key, info in zip(keys, infos) if info]
+
+async def expire_request(request: dict, action: str, present: Optional[list] = None) -> int:
+    """Apply the retention action to one request, returning the live bytes it freed"""
+    if present is None:
+        present = await stat_hot_keys(request)
+    if action == "archive":
+        await archive_request(request)
+    else:
+        await remove_request(request["id"])
+    # Count what is actually gone, whichever keys the action removed
+    remaining = await asyncio.gather(*(image_storage.stat(key) for key, _ in present))
+    return sum(size for (_, size), info in zip(present, remaining) if info is None)
+
+async def sweep_requests(query: dict, action: str, dry_run: bool, bytes_to_free: int = 0) -> dict:
+    """Expire matching requests, oldest first, streaming them in batches.
+
+    With bytes_to_free the sweep stops once that many live bytes (images,
+    masters and renditions, the keys the budget is measured over) are freed,
+    and requests holding none of those bytes are skipped rather than expired.
+    """
+    query = {**query, "archived_at": {"$exists": False}}
+    result = {"matched": 0, "expired": 0, "skipped": 0, "failed": 0, "bytes": 0}
+    cursor = db.outfit_requests.find(query, {"_id": 0}).sort("timestamp", 1).batch_size(RETENTION_BATCH_SIZE)
+    async for request in cursor:
+        if bytes_to_free and result["bytes"] >= bytes_to_free:
+            break
+        result["matched"] += 1
+        try:
+            present = await stat_hot_keys(request)
+            if bytes_to_free and not present:
+                result["skipped"] += 1
+            elif dry_run:
+                result["bytes"] += sum(size for _, size in present)
+            else:
+                result["bytes"] += await expire_request(request, action, present)
+                result["expired"] += 1
+        except Exception as e:
+            result["failed"] += 1
+            logger.error(f"Retention could not expire request {request['id']}: {e}")
+    return result
+
+async def inactive_user_emails() -> list:
+    """Owners of requests who are deactivated or no longer exist"""
+    emails = [email for email in await db.outfit_requests.distinct("user_email") if email]
+    active = set(await db.users.distinct("email", {"email": {"$in": emails}, "is_active": {"$ne": False}}))
+    return [email for email in emails if email not in active]
+
+async def sweep_email_queue(dry_run: bool) -> dict:
+    """Drop sent and failed outbox emails older than RETENTION_EMAIL_QUEUE_DAYS, with their attachment"""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=RETENTION_EMAIL_QUEUE_DAYS)).isoformat()
+    query = {"status": {"$in": ["sent", "failed"]}, "timestamp": {"$lt": cutoff}}
+    if dry_run:
+        return {"matched": await db.email_queue.count_documents(query), "deleted": 0}
+    
+    deleted = 0
+    async for item in db.email_queue.find(query, {"_id": 0, "id": 1, "image_key": 1, "image_path": 1}).batch_size(RETENTION_BATCH_SIZE):
+        if item.get("image_key"):
+            await image_storage.delete(item["image_key"])
+        elif item.get("image_path"):
+            # Attachment written to /app/email_queue before the outbox existed
+            Path(item["image_path"]).unlink(missing_ok=True)
+        await db.email_queue.delete_one({"id": item["id"]})
+        deleted += 1
+    return {"matched": deleted, "deleted": deleted}
+
+async def find_orphan_files(delete: bool = False, sample_size: int = 20) -> dict:
+    """Stream storage keys and report (or delete) generated images whose request no longer exists"""
+    result = {"scanned": 0, "orphans": 0, "deleted": 0, "bytes": 0, "sample": []}
+    grace_cutoff = datetime.now(timezone.utc) - timedelta(seconds=ORPHAN_GRACE_SECONDS)
+    
+    async def check(batch: list):
+        ids = list({request_id for _, request_id in batch})
+        existing = set(await db.outfit_requests.distinct("id", {"id": {"$in": ids}}))
+        for key, request_id in batch:
+            if request_id in existing:
+                continue
+            info = await image_storage.stat(key)
+            if info is None or info.modified_at > grace_cutoff:
+                continue
+            result["orphans"] += 1
+            result["bytes"] += info.size
+            if len(result["sample"]) < sample_size:
+                result["sample"].append(key)
+            if delete and await image_storage.delete(key):
+                result["deleted"] += 1
+    
+    batch = []
+    async for key in image_storage.list_keys():
+        # Masters and renditions are checked too, they are orphans as well without a record
+        request_id = hot_image_request_id(key)
+        if not request_id:
+            continue
+        result["scanned"] += 1
+        batch.append((key, request_id))
+        if len(batch) >= RETENTION_BATCH_SIZE:
+            await check(batch)
+            batch = []
+    if batch:
+        await check(batch)
+    return result
+
+async def run_retention_sweep(dry_run: bool = False) -> dict:
+    """Apply every enabled retention policy once"""
+    now = datetime.now(timezone.utc)
+    report = {"dry_run": dry_run, "action": RETENTION_ACTION, "policies": {}}
+    
+    if RETENTION_MAX_AGE_DAYS:
+        report["policies"]["max_age"] = await sweep_requests(
+            {"timestamp": {"$lt": now - timedelta(days=RETENTION_MAX_AGE_DAYS)}}, RETENTION_ACTION, dry_run
+        )
+    
+    if RETENTION_INACTIVE_USER_DAYS:
+        report["policies"]["inactive_users"] = await sweep_requests(
+            {
+                "user_email": {"$in": await inactive_user_emails()},
+                "timestamp": {"$lt": now - timedelta(days=RETENTION_INACTIVE_USER_DAYS)}
+            },
+            RETENTION_ACTION, dry_run
+        )
+    
+    if RETENTION_STORAGE_BUDGET_BYTES:
+        # Archived copies, cold bundles and email attachments do not count against the budget
+        _, used_bytes = await image_storage.usage(is_hot_image_key)
+        excess = used_bytes - RETENTION_STORAGE_BUDGET_BYTES
+        report["policies"]["storage_budget"] = {"used_bytes": used_bytes, "budget_bytes": RETENTION_STORAGE_BUDGET_BYTES}
+        if excess > 0:
+            # Cold-bundled requests have no image in the hot tier to free
+            query = {"cold_bundle": {"$exists": False}}
+            report["policies"]["storage_budget"].update(await sweep_requests(query, RETENTION_ACTION, dry_run, bytes_to_free=excess))
+    
+    if RETENTION_EMAIL_QUEUE_DAYS:
+        report["email_queue"] = await sweep_email_queue(dry_run)
+    
+    _storage_usage_cache["at"] = 0.0
+    logger.info(f"Retention sweep: {report}")
+    return report
+
+async def retention_sweep_job():
+    await run_retention_sweep()
+
+@api_router.post("/admin/retention/sweep")
+async def sweep_retention(dry_run: bool = True, admin_user: User = Depends(get_admin_user)):
+    """Run the retention policies now; a dry run (the default) only reports (admin only)"""
+    return await run_retention_sweep(dry_run=dry_run)
+
+# Cold tier. Images older than COLD_ARCHIVE_AFTER_DAYS are packed into monthly
+# tar bundles under cold/, a prefix an S3 lifecycle rule can move to a cheaper
+# storage class. cold_index maps each request to the offset of its image in the
+# bundle, so a download reads that range only and keeps the image under
+# cold-cache/ for COLD_CACHE_TTL_SECONDS.
+COLD_ARCHIVE_AFTER_DAYS = settings.cold_archive_after_days
+COLD_BUNDLE_MAX_BYTES = settings.cold_bundle_max_bytes
+COLD_CACHE_TTL_SECONDS = settings.cold_cache_ttl_seconds
+COLD_ARCHIVE_INTERVAL_SECONDS = settings.cold_archive_interval_seconds
+# Members are gzipped when it saves at least this much (legacy PNGs), WebP is stored as is
+COLD_MIN_COMPRESSION_SAVING = 0.05
+
+def pack_cold_bundle(images: list) -> tuple:
+    """Build a tar of (request_id, image_format, data, master) images, returning (bytes, {request_id: entry}).
+
+    master is None or (master_format, data); a packed master is described by
+    the "master" field of its image's entry.
+    """
+    buffer = io.BytesIO()
+    compression = {}
+    with tarfile.open(fileobj=buffer, mode="w", format=tarfile.USTAR_FORMAT) as tar:
+        members = []
+        for request_id, image_format, data, master in images:
+            members.append((f"{request_id}.{IMAGE_FORMATS[image_format]['extension']}", data))
+            if master:
+                master_format, master_data = master
+                members.append((f"{request_id}.master.{IMAGE_FORMATS[master_format]['extension']}", master_data))
+        for name, data in members:
+            compressed = gzip.compress(data, compresslevel=6)
+            if len(compressed) <= len(data) * (1 - COLD_MIN_COMPRESSION_SAVING):
+                compression[name] = "gzip"
+                data, name = compressed, name + ".gz"
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(data))
+    bundle = buffer.getvalue()
+    
+    entries = {}
+    masters = {image[0]: image[3][0] for image in images if image[3]}
+    with tarfile.open(fileobj=io.BytesIO(bundle)) as tar:
+        for member in tar.getmembers():
+            name = member.name.removesuffix(".gz")
+            request_id, kind = name.split(".")[:2]
+            location = {"offset": member.offset_data, "size": member.size, "compression": compression.get(name)}
+            if kind == "master":
+                entries.setdefault(request_id, {})["master"] = {**location, "format": masters[request_id]}
+            else:
+                entries.setdefault(request_id, {}).update(location)
+    return bundle, entries
+
+async def write_cold_bundle(month: str, images: list) -> int:
+    """Upload a bundle of (request_id, key, image_format, data, master), index it, then drop the hot copies.
+
+    Returns the size of the bundle."""
+    bundle_key = f"{COLD_PREFIX}{month}/{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.tar"
+    bundle, entries = await asyncio.to_thread(
+        pack_cold_bundle, [(request_id, image_format, data, master) for request_id, _, image_format, data, master in images]
+    )
+    await image_storage.put(bundle_key, bundle, "application/x-tar")
+    
+    archived_at = datetime.now(timezone.utc)
+    await db.cold_index.bulk_write([
+        ReplaceOne(
+            {"_id": request_id},
+            {"bundle_key": bundle_key, "image_format": image_format, "month": month, "archived_at": archived_at, **entries[request_id]},
+            upsert=True
+        )
+        for request_id, _, image_format, _, _ in images
+    ], ordered=False)
+    request_ids = [image[0] for image in images]
+    await db.outfit_requests.update_many({"id": {"$in": request_ids}}, {"$set": {"cold_bundle": bundle_key}})
+    for request_id, key, _, _, master in images:
+        await image_storage.delete(key)
+        if master:
+            # Packed with the image, modifications read it from the bundle
+            await image_storage.delete(master_key(request_id, master[0]))
+        for rendition_format in IMAGE_FORMATS:
+            await image_storage.delete(rendition_key(request_id, rendition_format))
+    
+    # Requests deleted while the bundle was built must not keep an index entry
+    existing = set(await db.outfit_requests.distinct("id", {"id": {"$in": request_ids}}))
+    for request_id in request_ids:
+        if request_id not in existing:
+            await delete_image(request_id)
+    return len(bundle)
+
+async def read_cold_entry(entry: dict) -> bytes:
+    end = entry["offset"] + entry["size"] - 1
+    data = b"".join([chunk async for chunk in image_storage.stream(entry["bundle_key"], start=entry["offset"], end=end)])
+    if entry.get("compression") == "gzip":
+        data = await asyncio.to_thread(gzip.decompress, data)
+    return data
+
+async def read_cold_master(request_id: str) -> Optional[bytes]:
+    """Master of an image packed in a cold bundle, None if it was bundled without one"""
+    entry = await db.cold_index.find_one({"_id": request_id}, {"bundle_key": 1, "master": 1})
+    if not entry or not entry.get("master"):
+        return None
+    return await read_cold_entry({**entry["master"], "bundle_key": entry["bundle_key"]})
+
+async def read_cold_image(request_id: str) -> Optional[tuple]:
+    """Return (bytes, format) of an image packed in a cold bundle"""
+    entry = await db.cold_index.find_one({"_id": request_id})
+    if not entry:
+        return None
+    return await read_cold_entry(entry), entry["image_format"]
+
+async def restore_cold_image(request_id: str) -> Optional[tuple]:
+    """Restore a bundled image under cold-cache/ and return (key, format) like resolve_image"""
+    entry = await db.cold_index.find_one({"_id": request_id})
+    if not entry:
+        return None
+    key = COLD_CACHE_PREFIX + image_key(request_id, entry["image_format"])
+    if not await image_storage.stat(key):
+        data = await read_cold_entry(entry)
+        await image_storage.put(key, data, IMAGE_FORMATS[entry["image_format"]]["mime"])
+    await db.cold_index.update_one(
+        {"_id": request_id},
+        {"$set": {"cached_until": datetime.now(timezone.utc) + timedelta(seconds=COLD_CACHE_TTL_SECONDS)}}
+    )
+    return key, entry["image_format"]
+
+async def evict_cold_cache(dry_run: bool = False) -> int:
+    """Drop restored images (and their renditions) whose cache time is over"""
+    now = datetime.now(timezone.utc)
+    evicted = 0
+    async for entry in db.cold_index.find({"cached_until": {"$lt": now}}, {"_id": 1, "image_format": 1}):
+        evicted += 1
+        if dry_run:
+            continue
+        await image_storage.delete(COLD_CACHE_PREFIX + image_key(entry["_id"], entry["image_format"]))
+        for rendition_format in IMAGE_FORMATS:
+            await image_storage.delete(rendition_key(entry["_id"], rendition_format))
+        await db.cold_index.update_one({"_id": entry["_id"], "cached_until": {"$lt": now}}, {"$unset": {"cached_until": ""}})
+    return evicted
+
+async def run_cold_archival(dry_run: bool = False) -> dict:
+    """Bundle the images of old requests, one bundle per month and at most COLD_BUNDLE_MAX_BYTES each"""
+    report = {"dry_run": dry_run, "matched": 0, "bundled": 0, "bundles": 0, "missing": 0, "failed": 0, "image_bytes": 0, "bundle_bytes": 0}
+    if COLD_ARCHIVE_AFTER_DAYS:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=COLD_ARCHIVE_AFTER_DAYS)
+        query = {
+            **SUCCEEDED_REQUESTS,
+            "timestamp": {"$lt": cutoff},
+            "archived_at": {"$exists": False},
+            "cold_bundle": {"$exists": False}
+        }
+        month = None
+        images = []
+        pending_bytes = 0
+        
+        async def flush():
+            try:
+                report["bundle_bytes"] += await write_cold_bundle(month, images)
+                report["bundled"] += len(images)
+                report["bundles"] += 1
+            except Exception as e:
+                report["failed"] += len(images)
+                logger.error(f"Could not write cold bundle for {month}: {e}")
+        
+        cursor = db.outfit_requests.find(query, {"_id": 0, "id": 1, "timestamp": 1, "master_format": 1}).sort("timestamp", 1).batch_size(RETENTION_BATCH_SIZE)
+        async for request in cursor:
+            request_month = request["timestamp"].strftime('%Y-%m')
+            if images and (request_month != month or pending_bytes >= COLD_BUNDLE_MAX_BYTES):
+                await flush()
+                images, pending_bytes = [], 0
+            month = request_month
+            
+            resolved = await resolve_image(request["id"])
+            if not resolved:
+                report["missing"] += 1
+                continue
+            key, image_format = resolved
+            report["matched"] += 1
+            if dry_run:
+                info = await image_storage.stat(key)
+                report["image_bytes"] += info.size if info else 0
+                continue
+            data = await image_storage.get(key)
+            if data is None:
+                report["missing"] += 1
+                continue
+            master = None
+            if request.get("master_format"):
+                master_data = await image_storage.get(master_key(request["id"], request["master_format"]))
+                if master_data is not None:
+                    master = (request["master_format"], master_data)
+                    pending_bytes += len(master_data)
+            images.append((request["id"], key, image_format, data, master))
+            pending_bytes += len(data)
+            report["image_bytes"] += len(data)
+        if images:
+            await flush()
+    
+    report["cache_evicted"] = await evict_cold_cache(dry_run)
+    if report["bundles"]:
+        _storage_usage_cache["at"] = 0.0
+    logger.info(f"Cold archival: {report}")
+    return report
+
+async def cold_archival_job():
+    await run_cold_archival()
+
+@api_router.post("/admin/cold-archive")
+async def archive_cold_images(dry_run: bool = True, admin_user: User = Depends(get_admin_user)):
+    """Pack old images into monthly bundles now; a dry run (the default) only reports (admin only)"""
+    return await run_cold_archival(dry_run=dry_run)
+
+# Reconciliation between outfit_requests and image storage. Crashes and
+# partial failures can leave records without an image, generations stuck in
+# pending with a reserved credit, failed records that kept their file and files
+# without a record; the job reports them and, when repairing, fixes them.
+RECONCILE_INTERVAL_SECONDS = settings.reconcile_interval_seconds
+RECONCILE_PENDING_TIMEOUT_SECONDS = settings.reconcile_pending_timeout_seconds
+RECONCILE_REPAIR = settings.reconcile_repair
+RECONCILE_SAMPLE_SIZE = 20
+
+async def release_stale_reservation(user_email: Optional[str]):
+    """Give back the credit reserved by a generation that never completed"""
+    if user_email:
+        await db.users.update_one(
+            {"email": user_email, "images_reserved_total": {"$gte": 1}},
+            {"$inc": {"images_reserved_total": -1}}
+        )
+
+async def commit_stale_reservation(user_email: Optional[str]):
+    """Charge the credit reserved by a generation whose image was stored before it stopped"""
+    if user_email:
+        await db.users.update_one(
+            {"email": user_email, "images_reserved_total": {"$gte": 1}},
+            {"$inc": {"images_reserved_total": -1, "images_used_total": 1}}
+        )
+
+async def reconcile_requests(repair: bool = False) -> dict:
+    """Check every live request record against image storage, streaming them in batches"""
+    report = {
+        "repair": repair,
+        "scanned": 0,
+        "missing_image": 0,
+        "stale_pending": 0,
+        "failed_with_image": 0,
+        "status_backfilled": 0,
+        "repaired": 0,
+        "errors": 0,
+        "sample": []
+    }
+    stale_cutoff = datetime.now(timezone.utc) - timedelta(seconds=RECONCILE_PENDING_TIMEOUT_SECONDS)
+    
+    def flag(kind: str, request: dict):
+        report[kind] += 1
+        if len(report["sample"]) < RECONCILE_SAMPLE_SIZE:
+            report["sample"].append({"id": request["id"], "problem": kind, "status": request.get("status")})
+    
+    async def set_status(request: dict, status: str, reason: Optional[str] = None) -> bool:
+        update = {"status": status}
+        if status == "failed":
+            update.update(failure_reason=reason, failed_at=datetime.now(timezone.utc))
+        # Only touch records still in the state we inspected, in-flight generations may have moved on
+        result = await db.outfit_requests.update_one(
+            {"id": request["id"], "status": request.get("status")}, {"$set": update}
+        )
+        return result.modified_count == 1
+    
+    async def reconcile(request: dict, resolved: Optional[tuple]):
+        status = request.get("status")
+        if status == "pending":
+            timestamp = request.get("timestamp")
+            if isinstance(timestamp, datetime) and timestamp.tzinfo is None:
+                timestamp = timestamp.replace(tzinfo=timezone.utc)
+            if not isinstance(timestamp, datetime) or timestamp > stale_cutoff:
+                return
+            flag("stale_pending", request)
+            if not repair:
+                return
+            if resolved:
+                # The image was stored, the process stopped before marking the request
+                if await set_status(request, "succeeded"):
+                    await commit_stale_reservation(request.get("user_email"))
+                    await record_request_stats(request)
+                    report["repaired"] += 1
+            elif await set_status(request, "failed", "interrupted"):
+                # No image means the credit was never committed
+                await release_stale_reservation(request.get("user_email"))
+                report["repaired"] += 1
+        elif status == "failed":
+            if resolved:
+                flag("failed_with_image", request)
+                if repair and await delete_image(request["id"], request):
+                    await record_request_stats(request, 0, -1)
+                    report["repaired"] += 1
+        elif not resolved:
+            flag("missing_image", request)
+            if repair and await set_status(request, "failed", "image_missing"):
+                await record_request_stats(request, -1, 0)
+                report["repaired"] += 1
+        elif status is None and repair:
+            # Records created before the status field
+            if await set_status(request, "succeeded"):
+                report["status_backfilled"] += 1
+    
+    async def locate(request: dict) -> Optional[tuple]:
+        if request.get("cold_bundle"):
+            entry = await db.cold_index.find_one({"_id": request["id"]}, {"bundle_key": 1, "image_format": 1})
+            return (entry["bundle_key"], entry["image_format"]) if entry else None
+        return await resolve_image(request["id"])
+    
+    async def check(batch: list):
+        resolved = await asyncio.gather(*(locate(request) for request in batch))
+        for request, image in zip(batch, resolved):
+            report["scanned"] += 1
+            try:
+                await reconcile(request, image)
+            except Exception as e:
+                report["errors"] += 1
+                logger.error(f"Reconciliation failed for request {request['id']}: {e}")
+    
+    projection = {"_id": 0, "timings": 0, "fabric_description": 0, "custom_shoe_description": 0, "custom_accessory_description": 0}
+    batch = []
+    async for request in db.outfit_requests.find({"archived_at": {"$exists": False}}, projection).batch_size(RETENTION_BATCH_SIZE):
+        batch.append(request)
+        if len(batch) >= RETENTION_BATCH_SIZE:
+            await check(batch)
+            batch = []
+    if batch:
+        await check(batch)
+    return report
+
+async def run_reconciliation(dry_run: bool = False) -> dict:
+    """Reconcile request records, then look for files without a record"""
+    repair = RECONCILE_REPAIR and not dry_run
+    report = {"dry_run": dry_run, "requests": await reconcile_requests(repair=repair)}
+    report["orphan_files"] = await find_orphan_files(delete=RETENTION_DELETE_ORPHAN_FILES and not dry_run)
+    if report["requests"]["repaired"] or report["orphan_files"]["deleted"]:
+        _storage_usage_cache["at"] = 0.0
+    logger.info(f"Reconciliation: {report}")
+    return report
+
+async def reconciliation_job():
+    await run_reconciliation()
+
+@api_router.post("/admin/reconcile")
+async def reconcile_storage(dry_run: bool = True, admin_user: User = Depends(get_admin_user)):
+    """Check request records against image storage; a dry run (the default) only reports (admin only)"""
+    return await run_reconciliation(dry_run=dry_run)
+
 @api_router.delete("/admin/request/{request_id}")
 async def delete_request(request_id: str):
     """Delete a specific request and its associated image"""
     try:
-        # Delete from database
-        result = await db.outfit_requests.delete_one({"id": request_id})
-        
-        if result.deleted_count == 0:
+        deleted_request = await remove_request(request_id)
+        if not deleted_request:
             raise HTTPException(status_code=404, detail="Request not found")
         
-        # Delete associated image file
-        image_path = Path(f"/app/generated_images/generated_{request_id}.png")
-        if image_path.exists():
-            image_path.unlink()
-        
         return {"success": True, "message": "Request deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@api_router.get("/requests", response_model=List[OutfitRequest])
-async def get_requests():
+@api_router.get("/requests")
+async def get_requests(fields: Optional[str] = None):
     """Get all outfit requests"""
-    requests = await db.outfit_requests.find().sort("timestamp", -1).to_list(1000)
-    return [OutfitRequest(**request) for request in requests]
+    return FastJSONResponse(await find_request_rows(SUCCEEDED_REQUESTS, request_fields(fields)))
+
+@api_router.get("/requests/{request_id}")
+async def get_request(request_id: str, fields: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    """Get the full details of one outfit request"""
+    selected = request_fields(fields or "all")
+    request = await db.outfit_requests.find_one(
+        {"id": request_id},
+        {"_id": 0, "user_email": 1, **{name: 1 for name in selected}}
+    )
+    if not request:
+        raise HTTPException(status_code=404, detail="Request not found")
+    if current_user.role != UserRole.ADMIN and request.get("user_email") != current_user.email:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    defaults = {name: REQUEST_DEFAULTS[name] for name in selected if name in REQUEST_DEFAULTS}
+    return FastJSONResponse({**defaults, **{name: request[name] for name in selected if name in request}})
+
+@api_router.get("/requests/{request_id}/lineage")
+async def get_request_lineage(request_id: str, current_user: User = Depends(get_current_user)):
+    """Modification chain of a request: its ancestors, its descendants and every request sharing its root"""
+    request = await db.outfit_requests.find_one({"id": request_id}, {**LINEAGE_PROJECTION, "user_email": 1})
+    if not request:
+        raise HTTPException(status_code=404, detail="Request not found")
+    if current_user.role != UserRole.ADMIN and request.get("user_email") != current_user.email:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    # One indexed query on root_request_id, the root itself may predate the field
+    root_request_id, ancestors = await request_lineage(request)
+    query = {"$or": [{"id": root_request_id}, {"root_request_id": root_request_id}], **SUCCEEDED_REQUESTS}
+    if current_user.role != UserRole.ADMIN:
+        query["user_email"] = current_user.email
+    nodes = await find_request_rows(query, REQUEST_SUMMARY_FIELDS + ("original_request_id", "lineage_depth", "lineage_path"))
+    nodes.sort(key=lambda node: (node["lineage_depth"], node["timestamp"]))
+    return FastJSONResponse({
+        "request_id": request_id,
+        "root_request_id": root_request_id,
+        "lineage_depth": len(ancestors),
+        "ancestors": ancestors,
+        "descendants": [node["id"] for node in nodes if request_id in (node.get("lineage_path") or [])],
+        "nodes": nodes
+    })
 
 # Authentication endpoints
 @api_router.post("/auth/register")
@@ -1209,12 +4109,18 @@ async def update_user(user_id: str, user_update: UserUpdate, admin_user: User =
 
 @api_router.delete("/admin/users/{user_id}")
 async def delete_user(user_id: str, admin_user: User = Depends(get_admin_user)):
-    """Delete user (admin only)"""
+    """Delete user and their requests and images (admin only)"""
     try:
-        result = await db.users.delete_one({"id": user_id})
-        if result.deleted_count == 0:
+        user = await db.users.find_one_and_delete({"id": user_id}, {"email": 1})
+        if not user:
             raise HTTPException(status_code=404, detail="User not found")
-        return {"message": "User deleted successfully"}
+        
+        requests_deleted = 0
+        async for request in db.outfit_requests.find({"user_email": user["email"]}, {"_id": 0, "id": 1}):
+            if await remove_request(request["id"]):
+                requests_deleted += 1
+        
+        return {"message": "User deleted successfully", "requests_deleted": requests_deleted}
     except HTTPException:
         raise
     except Exception as e:
@@ -1421,22 +4327,92 @@ class ImageModificationRequest(BaseModel):
     request_id: str
     modification_description: str
 
+async def create_modification_record(
+    original_request: dict,
+    modification_description: str,
+    current_user: User,
+    request_id: str
+) -> dict:
+    """Insert the pending record of a modification of original_request, before any model call.
+
+    The record owns one reserved credit: if the process dies before it
+    settles, the reconciler fails it and gives the credit back.
+    """
+    root_request_id, ancestors = await request_lineage(original_request)
+    new_request = OutfitRequest(**original_request)
+    new_request.id = request_id
+    new_request.timestamp = datetime.now(timezone.utc)
+    new_request.user_email = current_user.email  # Current user as creator
+    new_request.status = "pending"
+    new_request.failure_reason = None
+    new_request.image_format = IMAGE_STORAGE_FORMAT
+    new_request.original_request_id = original_request["id"]
+    new_request.root_request_id = root_request_id
+    new_request.lineage_path = ancestors + [original_request["id"]]
+    new_request.lineage_depth = len(new_request.lineage_path)
+    
+    new_request_dict = new_request.dict()
+    new_request_dict["modification_description"] = modification_description
+    await db.outfit_requests.insert_one(new_request_dict)
+    return new_request_dict
+
+async def run_modification(
+    original_request: dict,
+    new_request: dict,
+    current_user: User,
+    reservation: CreditReservation,
+    timer: StageTimer
+) -> dict:
+    """Modify the image of original_request into the pending new_request, charging one reserved credit.
+
+    Returns the user credits after the charge. On failure the caller abandons new_request.
+    """
+    request_id = new_request["id"]
+    # Start from the unwatermarked master, downscaled to the model input size
+    with timer.stage("read_original"):
+        base_image = await read_modification_base(original_request)
+    if base_image is None:
+        raise HTTPException(status_code=404, detail="Original image not found")
+    
+    # Create modified image using AI
+    async with model_limiter.slot(current_user.id, current_user.role, timer):
+        modified_image, master_image = await modify_outfit_image(
+            base_image,
+            OutfitRequest(**original_request),
+            new_request["modification_description"],
+            timer
+        )
+    
+    # Save modified image
+    with timer.stage("file_write"):
+        master_format = await store_generated_image(request_id, modified_image, master_image)
+    
+    # Charge the reserved credit, the updated counters come back with the update
+    with timer.stage("credit_update"):
+        user_credits = await reservation.commit(1)
+    
+    await save_request_timings(request_id, timer, "success", {"master_format": master_format, "status": "succeeded"})
+    await record_request_stats(new_request)
+    return user_credits
+
 @api_router.post("/modify-image")
 async def modify_existing_image(
     modification_request: ImageModificationRequest,
     current_user: User = Depends(get_current_user)
 ):
     """Modify an existing generated image with minor changes"""
+    timer = StageTimer("modify")
+    reservation = None
+    new_request_id = str(uuid.uuid4())
+    
     try:
-        # Check if user has remaining image generation credits
-        if current_user.images_used_total >= current_user.images_limit_total:
-            raise HTTPException(
-                status_code=403, 
-                detail=f"Image generation limit exceeded. Used: {current_user.images_used_total}/{current_user.images_limit_total}"
-            )
+        # Reserve an image generation credit before doing any work
+        with timer.stage("credit_reserve"):
+            reservation = await CreditReservation.acquire(current_user.id)
         
         # Find the original request
-        original_request = await db.outfit_requests.find_one({"id": modification_request.request_id})
+        with timer.stage("db_lookup"):
+            original_request = await db.outfit_requests.find_one({"id": modification_request.request_id})
         if not original_request:
             raise HTTPException(status_code=404, detail="Original request not found")
         
@@ -1444,106 +4420,166 @@ async def modify_existing_image(
         if original_request.get("user_email") != current_user.email and current_user.role != UserRole.ADMIN:
             raise HTTPException(status_code=403, detail="Access denied to this request")
         
-        # Check if the original image exists
-        original_image_path = Path(f"/app/generated_images/generated_{modification_request.request_id}.png")
-        if not original_image_path.exists():
-            raise HTTPException(status_code=404, detail="Original image not found")
-        
-        # Read the original image
-        with open(original_image_path, 'rb') as f:
-            original_image_data = f.read()
-        
-        # Create modified image using AI
-        modified_image = await modify_outfit_image(
-            original_image_data,
-            OutfitRequest(**original_request),
-            modification_request.modification_description
-        )
-        
-        # Create a new request record for the modified image
-        new_request = OutfitRequest(**original_request)
-        new_request.id = str(uuid.uuid4())  # New unique ID
-        new_request.timestamp = datetime.now(timezone.utc)
-        new_request.user_email = current_user.email  # Current user as creator
-        
-        # Save the new request to database
-        new_request_dict = new_request.dict()
-        new_request_dict["modification_description"] = modification_request.modification_description
-        new_request_dict["original_request_id"] = modification_request.request_id
-        await db.outfit_requests.insert_one(new_request_dict)
-        
-        # Save modified image
-        image_filename = f"generated_{new_request.id}.png"
-        image_path = Path(f"/app/generated_images/{image_filename}")
-        
-        async with aiofiles.open(image_path, 'wb') as f:
-            await f.write(modified_image)
-        
-        # Increment user's image usage count
-        await db.users.update_one(
-            {"id": current_user.id},
-            {"$inc": {"images_used_total": 1}}
-        )
-        
-        # Get updated user info for response
-        updated_user_data = await db.users.find_one({"id": current_user.id})
-        updated_user = User(**updated_user_data)
+        with timer.stage("db_insert"):
+            new_request = await create_modification_record(
+                original_request, modification_request.modification_description, current_user, new_request_id
+            )
+        user_credits = await run_modification(original_request, new_request, current_user, reservation, timer)
+        modified_filename = image_filename(new_request_id)
         
         return {
             "success": True,
-            "request_id": new_request.id,
-            "image_filename": image_filename,
-            "download_url": f"/api/download/{image_filename}",
+            "request_id": new_request_id,
+            "image_filename": modified_filename,
+            "download_url": f"/api/download/{modified_filename}",
+            "signed_url": signed_download_url(modified_filename),
             "message": "Image modified successfully!",
             "modification_description": modification_request.modification_description,
-            "user_credits": {
-                "used": updated_user.images_used_total,
-                "limit": updated_user.images_limit_total,
-                "remaining": updated_user.images_limit_total - updated_user.images_used_total
-            }
+            "user_credits": user_credits
         }
         
-    except HTTPException:
+    except HTTPException as e:
+        await abandon_generation(reservation, new_request_id, str(e.detail), timer=timer)
         raise
     except Exception as e:
         logger.error(f"Error in modify_existing_image: {e}")
+        await abandon_generation(reservation, new_request_id, str(e), timer=timer)
         raise HTTPException(status_code=500, detail=str(e))
 
-async def modify_outfit_image(
-    original_image_data: bytes,
-    original_request: OutfitRequest,
+class BatchModificationRequest(BaseModel):
+    request_ids: List[str]
     modification_description: str
-) -> bytes:
-    """Modify an existing outfit image using Gemini with specific changes"""
+
+MODIFY_BATCH_MAX_ITEMS = settings.modify_batch_max_items
+# Batches whose client went away, kept referenced until their modifications settle
+settling_batches = set()
+
+async def settle_batch(tasks: list, reservation: CreditReservation):
+    """Wait for the modifications of a batch, then give back the credits they did not use"""
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return await reservation.release()
+
+@api_router.post("/modify-image/batch")
+async def modify_images_batch(
+    batch: BatchModificationRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Apply one modification to several images.
+
+    Streams one JSON line per image as soon as it is done, then a summary line.
+    """
+    request_ids = list(dict.fromkeys(batch.request_ids))
+    if not request_ids:
+        raise HTTPException(status_code=400, detail="Aucune image sélectionnée")
+    if len(request_ids) > MODIFY_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Au plus {MODIFY_BATCH_MAX_ITEMS} images par lot")
     
+    # Ownership of every image in one query
+    originals = {
+        request["id"]: request
+        for request in await db.outfit_requests.find(
+            {"id": {"$in": request_ids}, **SUCCEEDED_REQUESTS}, {"_id": 0}
+        ).to_list(len(request_ids))
+    }
+    missing = [request_id for request_id in request_ids if request_id not in originals]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Original requests not found: {', '.join(missing)}")
+    if current_user.role != UserRole.ADMIN and any(
+        request.get("user_email") != current_user.email for request in originals.values()
+    ):
+        raise HTTPException(status_code=403, detail="Access denied to these requests")
+    
+    # Refuse before reserving credits when the model queue is already too long
+    model_limiter.check_capacity(current_user.id, current_user.role)
+    # One reservation for the whole batch, each success charges its credit
+    reservation = await CreditReservation.acquire(current_user.id, count=len(request_ids))
+    # Items start as the user's slots free up, so only those about to run
+    # wait in the limiter queue and are subject to its timeout
+    pacing = asyncio.Semaphore(model_limiter.max_per_user)
+    
+    # Every item gets its pending record up front, each one owning a reserved
+    # credit the reconciler can give back if the process dies mid-batch
+    new_requests = {}
     try:
-        # Get Emergent LLM key
-        api_key = os.getenv('EMERGENT_LLM_KEY')
-        
-        # Create chat instance
-        chat = LlmChat(
-            api_key=api_key, 
-            session_id=f"outfit_modify_{uuid.uuid4()}", 
-            system_message="You are a professional fashion designer specializing in wedding attire modifications."
-        )
-        chat.with_model("gemini", "gemini-2.5-flash-image-preview").with_params(modalities=["image", "text"])
-        
-        # Convert original image to base64
-        original_base64 = base64.b64encode(original_image_data).decode('utf-8')
-        
-        # Build modification prompt with improved suit composition logic
-        atmosphere_desc = ATMOSPHERE_OPTIONS.get(original_request.atmosphere, original_request.atmosphere)
-        person_term = "mariée" if original_request.gender == "femme" else "marié"
-        gender_desc = "femme" if original_request.gender == "femme" else "homme"
-        
-        # Add suit composition details for modification
-        suit_composition_note = ""
-        if "2 pièces" in original_request.suit_type.lower():
-            suit_composition_note = "IMPORTANT: This is a 2-piece suit (jacket + trousers ONLY, NO vest visible)"
-        elif "3 pièces" in original_request.suit_type.lower():
-            suit_composition_note = "IMPORTANT: This is a 3-piece suit (jacket + trousers + vest/waistcoat, vest MUST be visible)"
+        for request_id in request_ids:
+            new_requests[request_id] = await create_modification_record(
+                originals[request_id], batch.modification_description, current_user, str(uuid.uuid4())
+            )
+    except Exception:
+        for new_request in new_requests.values():
+            await abandon_generation(None, new_request["id"])
+        await reservation.release()
+        raise
+    
+    async def modify_one(request_id: str) -> dict:
+        timer = StageTimer("modify")
+        new_request_id = new_requests[request_id]["id"]
+        try:
+            with timer.stage("batch_wait"):
+                await pacing.acquire()
+            try:
+                await run_modification(originals[request_id], new_requests[request_id], current_user, reservation, timer)
+            finally:
+                pacing.release()
+        except Exception as e:
+            if isinstance(e, HTTPException):
+                error = str(e.detail)
+            else:
+                error = str(e)
+                logger.error(f"Error in batch modification of {request_id}: {e}")
+            await abandon_generation(None, new_request_id, error, timer=timer)
+            return {"request_id": request_id, "success": False, "error": error}
         
-        prompt = f"""Based on the attached wedding photo, create a modified version with the following specific changes:
+        modified_filename = image_filename(new_request_id)
+        return {
+            "request_id": request_id,
+            "success": True,
+            "new_request_id": new_request_id,
+            "image_filename": modified_filename,
+            "download_url": f"/api/download/{modified_filename}",
+            "signed_url": signed_download_url(modified_filename)
+        }
+    
+    tasks = [asyncio.create_task(modify_one(request_id)) for request_id in request_ids]
+    
+    async def results():
+        succeeded = 0
+        try:
+            for finished in asyncio.as_completed(tasks):
+                result = await finished
+                succeeded += result["success"]
+                yield orjson.dumps(result) + b"\n"
+            user_credits = await reservation.release()
+            yield orjson.dumps({
+                "done": True,
+                "succeeded": succeeded,
+                "failed": len(tasks) - succeeded,
+                "modification_description": batch.modification_description,
+                "user_credits": user_credits
+            }) + b"\n"
+        finally:
+            if reservation.pending:
+                # The client went away: let the started modifications finish
+                settling = asyncio.create_task(settle_batch(tasks, reservation))
+                settling_batches.add(settling)
+                settling.add_done_callback(settling_batches.discard)
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+def build_modification_prompt(original_request: OutfitRequest, modification_description: str) -> str:
+    """Build the prompt asking the model to apply a modification to an existing image"""
+    atmosphere_desc = ATMOSPHERE_OPTIONS.get(original_request.atmosphere, original_request.atmosphere)
+    person_term = "mariée" if original_request.gender == "femme" else "marié"
+    gender_desc = "femme" if original_request.gender == "femme" else "homme"
+    
+    # Add suit composition details for modification
+    suit_composition_note = ""
+    if "2 pièces" in original_request.suit_type.lower():
+        suit_composition_note = "IMPORTANT: This is a 2-piece suit (jacket + trousers ONLY, NO vest visible)"
+    elif "3 pièces" in original_request.suit_type.lower():
+        suit_composition_note = "IMPORTANT: This is a 3-piece suit (jacket + trousers + vest/waistcoat, vest MUST be visible)"
+    
+    prompt = f"""Based on the attached wedding photo, create a modified version with the following specific changes:
 
 MODIFICATION REQUEST: {modification_description}
 
@@ -1577,69 +4613,86 @@ TECHNICAL REQUIREMENTS:
 - Focus: Ensure modifications are seamlessly integrated
 
 Generate the modified wedding image with only the requested changes, keeping everything else identical to the original."""
+    return prompt
+
+async def modify_outfit_image(
+    original_image_data: bytes,
+    original_request: OutfitRequest,
+    modification_description: str,
+    timer: Optional[StageTimer] = None
+) -> tuple:
+    """Modify an existing outfit image using Gemini with specific changes, returning (watermarked, master)"""
+    timer = timer or StageTimer("modify")
+    
+    try:
+        # Convert original image to base64
+        original_base64 = base64.b64encode(original_image_data).decode('utf-8')
+        
+        # Build modification prompt with improved suit composition logic
+        prompt = build_modification_prompt(original_request, modification_description)
         
         # Create message with original image
         file_contents = [ImageContent(original_base64)]
         msg = UserMessage(text=prompt, file_contents=file_contents)
         
-        # Generate modified image
-        text, images = await chat.send_message_multimodal_response(msg)
+        # Generate modified image, a fresh chat session is opened for every attempt
+        with timer.stage("model_call"):
+            text, images = await model_policy.call(
+                lambda: new_image_chat(
+                    "outfit_modify",
+                    "You are a professional fashion designer specializing in wedding attire modifications."
+                ),
+                msg,
+                "modify"
+            )
         
         if images and len(images) > 0:
             # Decode base64 image
             image_bytes = base64.b64decode(images[0]['data'])
             
-            # Apply watermark
-            watermarked_image = await apply_watermark(image_bytes)
-            
-            return watermarked_image
+            # Apply watermark, keeping the unwatermarked master for further modifications
+            with timer.stage("watermark"):
+                return await finish_generated_image(image_bytes)
         else:
             raise HTTPException(status_code=500, detail="Failed to modify image")
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error modifying outfit image: {e}")
         raise HTTPException(status_code=500, detail=f"Image modification failed: {str(e)}")
 
-# Include router in main app
-app.include_router(api_router)
-
 # User's own requests endpoint (for all authenticated users)
-@api_router.get("/my-requests", response_model=List[OutfitRequest])
-async def get_my_requests(current_user: User = Depends(get_current_user)):
+@api_router.get("/my-requests")
+async def get_my_requests(fields: Optional[str] = None, current_user: User = Depends(get_current_user)):
     """Get current user's own outfit requests"""
+    selected = request_fields(fields)
     try:
-        my_requests = await db.outfit_requests.find(
-            {"user_email": current_user.email}
-        ).sort("timestamp", -1).to_list(1000)
-        return [OutfitRequest(**request) for request in my_requests]
+        return FastJSONResponse(await find_request_rows({"user_email": current_user.email, **SUCCEEDED_REQUESTS}, selected, signed_urls=True))
     except Exception as e:
         logger.error(f"Error fetching user requests: {e}")
         raise HTTPException(status_code=500, detail="Could not fetch your requests")
 
 @api_router.get("/user/requests")
-async def get_user_requests(current_user: User = Depends(get_current_user)):
+async def get_user_requests(fields: Optional[str] = None, current_user: User = Depends(get_current_user)):
     """Get requests for the current user"""
-    requests = await db.outfit_requests.find({"user_email": current_user.email}).sort("timestamp", -1).to_list(1000)
-    return [OutfitRequest(**request) for request in requests]
+    return FastJSONResponse(await find_request_rows({"user_email": current_user.email, **SUCCEEDED_REQUESTS}, request_fields(fields), signed_urls=True))
+
+# Include router in main app, once every route above is declared
+app.include_router(api_router)
+
+app.add_middleware(PrometheusMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+    allow_origins=settings.cors_origins.split(','),
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
-
-@app.on_event("startup")
-async def startup_event():
-    """Create default admin user on startup"""
+async def create_default_admin():
+    """Create default admin user on first start"""
     try:
         # Check if admin exists
         admin_email = "charles@blandindelloye.com"
@@ -1663,6 +4716,119 @@ async def startup_event():
     except Exception as e:
         logger.error(f"Error creating default admin: {e}")
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+async def seed_stats():
+    """Build the stats counters on first start, they are maintained incrementally afterwards"""
+    try:
+        # The lease keeps replicas starting together from rebuilding at the same time
+        if await db.stats.estimated_document_count() == 0 and await acquire_lease("stats-seed", 300):
+            result = await rebuild_stats()
+            logger.info(f"Stats counters built: {result['counters']}")
+    except Exception as e:
+        logger.error(f"Error building stats counters: {e}")
+
+async def ensure_indexes():
+    """Create the indexes behind the hot queries (no-ops when they already exist)"""
+    await db.outfit_requests.create_index("id")
+    await db.outfit_requests.create_index([("user_email", 1), ("timestamp", -1)])
+    await db.outfit_requests.create_index([("timestamp", -1)])
+    await db.outfit_requests.create_index([("status", 1), ("timestamp", -1)])
+    await db.outfit_requests.create_index("root_request_id", sparse=True)
+    await db.users.create_index("email")
+    await db.cold_index.create_index("bundle_key")
+    await db.cold_index.create_index("cached_until", sparse=True)
+    await db.email_queue.create_index([("status", 1), ("next_attempt_at", 1)])
+
+class AppContext:
+    """Process-wide resources, built once by the lifespan handler.
+
+    Each startup step is timed; the durations are logged, exported as the
+    tailorview_startup_seconds gauge and reported by /health.
+    """
+
+    def __init__(self):
+        self.background_jobs = []
+        self.startup_ms = {}
+        self.started_at = None
+
+    @property
+    def settings(self) -> Settings:
+        return get_settings()
+
+    @contextmanager
+    def _step(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.startup_ms[name] = round(elapsed * 1000, 1)
+            STARTUP_SECONDS.labels(name).set(elapsed)
+
+    async def start(self):
+        start = time.perf_counter()
+        # Fail fast when Mongo is unreachable rather than serving errors
+        with self._step("mongo"):
+            open_database()
+            await client.admin.command("ping")
+        with self._step("indexes"):
+            await ensure_indexes()
+        with self._step("default_admin"):
+            await create_default_admin()
+        with self._step("stats"):
+            await seed_stats()
+        with self._step("image_executor"):
+            start_image_executor()
+        with self._step("caches"):
+            stats_cache["admin"] = await load_admin_stats()
+        with self._step("background_jobs"):
+            self.start_background_jobs()
+        
+        total = time.perf_counter() - start
+        self.startup_ms["total"] = round(total * 1000, 1)
+        STARTUP_SECONDS.labels("total").set(total)
+        self.started_at = datetime.now(timezone.utc)
+        if COORDINATION_BACKEND == "mongo" and IMAGE_STORAGE_BACKEND == "local":
+            logger.warning(f"Shared coordination with local image storage: {IMAGE_STORAGE_DIR} must be a volume shared by every replica")
+        logger.info(f"Startup completed in {self.startup_ms['total']} ms: {self.startup_ms}")
+
+    def start_background_jobs(self):
+        self.background_jobs.append(asyncio.create_task(
+            run_periodic("analytics-rollup", analytics_rollup_job, ANALYTICS_ROLLUP_INTERVAL_SECONDS)
+        ))
+        # Claims make the outbox safe to drain from every replica at once
+        self.background_jobs.append(asyncio.create_task(
+            run_periodic("email-outbox", process_email_outbox, EMAIL_OUTBOX_INTERVAL_SECONDS, leader_only=False)
+        ))
+        self.background_jobs.append(asyncio.create_task(
+            run_periodic("retention-sweep", retention_sweep_job, RETENTION_SWEEP_INTERVAL_SECONDS)
+        ))
+        self.background_jobs.append(asyncio.create_task(
+            run_periodic("reconcile", reconciliation_job, RECONCILE_INTERVAL_SECONDS)
+        ))
+        self.background_jobs.append(asyncio.create_task(
+            run_periodic("cold-archive", cold_archival_job, COLD_ARCHIVE_INTERVAL_SECONDS)
+        ))
+        # Every worker follows the settings version
+        self.background_jobs.append(asyncio.create_task(
+            run_periodic("settings-sync", sync_settings, SETTINGS_SYNC_INTERVAL_SECONDS, leader_only=False)
+        ))
+
+    async def stop(self):
+        for job in self.background_jobs:
+            job.cancel()
+        await asyncio.gather(*self.background_jobs, return_exceptions=True)
+        self.background_jobs.clear()
+        stop_image_executor()
+        close_database()
+
+app_context = AppContext()
+
+@app.get("/health")
+async def health():
+    """Liveness and startup report of this process"""
+    return {
+        "status": "ok",
+        "instance": INSTANCE_ID,
+        "started_at": app_context.started_at,
+        "startup_ms": app_context.startup_ms
+    }
@@ -262,7 +262,7 @@ L'équipe Blandin & Delloye`
         const newImage = {
           id: response.data.request_id,
           filename: response.data.image_filename,
-          download_url: response.data.download_url,
+          download_url: response.data.signed_url,
           details: { ...formData }
         };
         setGeneratedImages(prev => [newImage, ...prev]);
@@ -309,9 +309,11 @@ L'équipe Blandin & Delloye`
     });
   };
 
-  const downloadExcel = () => {
+  const downloadExcel = async () => {
+    // The admin list only carries summaries; the export needs the descriptions too
+    const response = await axios.get(`${API}/admin/requests?fields=all&export=true`);
     const worksheet = XLSX.utils.json_to_sheet(
-      adminRequests.map(request => ({
+      response.data.map(request => ({
         ID: request.id,
         Utilisateur: request.user_email || 'N/A',
         Ambiance: request.atmosphere,
@@ -323,7 +325,7 @@ L'équipe Blandin & Delloye`
         Email: request.email || 'N/A',
         'Description tissu': request.fabric_description || 'N/A',
         Date: new Date(request.timestamp).toLocaleDateString('fr-FR'),
-        'Lien téléchargement': `${BACKEND_URL}/api/download/generated_${request.id}.png`
+        'Lien téléchargement': `${BACKEND_URL}${request.signed_url}`
       }))
     );
     
@@ -365,6 +367,39 @@ L'équipe Blandin & Delloye`
     }
   };
 
+  const downloadSelectedImages = async () => {
+    if (selectedImages.length === 0) {
+      toast.error("Veuillez sélectionner au moins une image");
+      return;
+    }
+
+    try {
+      const response = await axios.post(
+        `${API}/download/bundle`,
+        { request_ids: selectedImages },
+        { responseType: 'blob' }
+      );
+      const url = window.URL.createObjectURL(response.data);
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = `tenues_${new Date().toISOString().split('T')[0]}.zip`;
+      document.body.appendChild(link);
+      link.click();
+      link.remove();
+      window.URL.revokeObjectURL(url);
+    } catch (error) {
+      console.error('Bundle download error:', error);
+      
+      if (error.response?.status === 401) {
+        toast.error("Session expirée. Reconnexion nécessaire.");
+        handleLogout();
+        return;
+      }
+      
+      toast.error("Erreur lors du téléchargement des images");
+    }
+  };
+
   const sendMultipleImages = async () => {
     if (selectedImages.length === 0) {
       toast.error("Veuillez sélectionner au moins une image");
@@ -436,7 +471,7 @@ L'équipe Blandin & Delloye`
         const newImage = {
           id: response.data.request_id,
           filename: response.data.image_filename,
-          download_url: response.data.download_url,
+          download_url: response.data.signed_url,
           details: {
             ...formData,
             modification_description: response.data.modification_description
@@ -836,14 +871,25 @@ L'équipe Blandin & Delloye`
                       Images générées
                     </CardTitle>
                     {selectedImages.length > 0 && (
-                      <Button 
-                        size="sm" 
-                        onClick={sendMultipleImages}
-                        className={isDarkMode ? 'bg-green-800 hover:bg-green-700' : ''}
-                      >
-                        <Mail className="w-4 h-4 mr-2" />
-                        Envoyer ({selectedImages.length})
-                      </Button>
+                      <div className="flex gap-2">
+                        <Button 
+                          size="sm" 
+                          variant="outline"
+                          onClick={downloadSelectedImages}
+                          className={isDarkMode ? 'border-green-800 text-green-300 hover:bg-green-900' : ''}
+                        >
+                          <Download className="w-4 h-4 mr-2" />
+                          Télécharger ({selectedImages.length})
+                        </Button>
+                        <Button 
+                          size="sm" 
+                          onClick={sendMultipleImages}
+                          className={isDarkMode ? 'bg-green-800 hover:bg-green-700' : ''}
+                        >
+                          <Mail className="w-4 h-4 mr-2" />
+                          Envoyer ({selectedImages.length})
+                        </Button>
+                      </div>
                     )}
                   </div>
                 </CardHeader>
@@ -1036,7 +1082,7 @@ L'équipe Blandin & Delloye`
                             <TableRow key={request.id} className={isDarkMode ? 'border-slate-700' : ''}>
                               <TableCell>
                                 <img
-                                  src={`${BACKEND_URL}/api/download/generated_${request.id}.png`}
+                                  src={`${BACKEND_URL}${request.signed_url}`}
                                   alt="Generated outfit"
                                   className="w-16 h-16 object-cover rounded border"
                                   onError={(e) => {
@@ -1063,7 +1109,7 @@ L'équipe Blandin & Delloye`
                               </TableCell>
                               <TableCell>
                                 <a
-                                  href={`${BACKEND_URL}/api/download/generated_${request.id}.png`}
+                                  href={`${BACKEND_URL}${request.signed_url}`}
                                   download
                                   className="text-blue-600 hover:text-blue-800 dark:text-blue-400"
                                 >
@@ -1160,7 +1206,7 @@ L'équipe Blandin & Delloye`
                               <TableRow key={request.id} className={isDarkMode ? 'border-slate-700' : ''}>
                                 <TableCell>
                                   <img
-                                    src={`${BACKEND_URL}/api/download/generated_${request.id}.png`}
+                                    src={`${BACKEND_URL}${request.signed_url}`}
                                     alt="Generated outfit"
                                     className="w-16 h-16 object-cover rounded border"
                                     onError={(e) => {
@@ -1209,7 +1255,7 @@ L'équipe Blandin & Delloye`
                                       <Mail className="w-4 h-4" />
                                     </Button>
                                     <a
-                                      href={`${BACKEND_URL}/api/download/generated_${request.id}.png`}
+                                      href={`${BACKEND_URL}${request.signed_url}`}
                                       download
                                       className={`${isDarkMode ? 'text-green-400 hover:text-green-300' : 'text-blue-600 hover:text-blue-800'}`}
                                       title="Télécharger l'image"
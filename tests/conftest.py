@@ -0,0 +1,73 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+REPO_DIR = Path(__file__).parent.parent
+BACKEND_DIR = REPO_DIR / "backend"
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'tailorview_test')
+os.environ.setdefault('EMERGENT_LLM_KEY', 'test')
+sys.path.insert(0, str(BACKEND_DIR))
+
+mongomock = pytest.importorskip("mongomock")
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def find_one_and_update(original):
+    """mongomock looks the updated document up again with the original filter, so a
+    conditional update whose $expr no longer holds afterwards returns None; Mongo
+    returns the document it matched"""
+    def wrapper(self, filter, update, *args, **kwargs):
+        match = self.find_one(filter, {"_id": 1}, sort=kwargs.get("sort"))
+        if match is not None:
+            filter = {"_id": match["_id"]}
+        return original(self, filter, update, *args, **kwargs)
+    return wrapper
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """A fresh in-memory database in place of Mongo"""
+    collection = mongomock.collection.Collection
+    monkeypatch.setattr(collection, "find_one_and_update", find_one_and_update(collection.find_one_and_update))
+    database = mongomock_motor.AsyncMongoMockClient()["tailorview_test"]
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    """Local image storage in a temporary directory"""
+    image_storage = server.LocalImageStorage(tmp_path / "images")
+    monkeypatch.setattr(server, "image_storage", image_storage)
+    return image_storage
+
+
+@pytest.fixture
+def api(db, storage):
+    # No lifespan: the routes run against the in-memory database
+    return TestClient(server.app)
+
+
+@pytest.fixture
+def login(db):
+    """Sign the API client in as a user stored in the database"""
+    def sign_in(email: str = "client@example.com", role: str = server.UserRole.CLIENT, **fields) -> server.User:
+        user = server.User(nom="Client", email=email, role=role, **fields)
+        asyncio.run(db.users.insert_one(user.dict()))
+        server.app.dependency_overrides[server.get_current_user] = lambda: user
+        return user
+    yield sign_in
+    server.app.dependency_overrides.pop(server.get_current_user, None)
@@ -0,0 +1,93 @@
+"""Batch modifications streamed as NDJSON"""
+import asyncio
+import uuid
+
+import orjson
+import pytest
+from PIL import Image
+
+import server
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """Stand-in for the image model, recording the prompts it is given"""
+    descriptions = []
+
+    async def modify_outfit_image(image, original_request, modification_description, timer):
+        descriptions.append(modification_description)
+        return b"modified", b"master"
+
+    monkeypatch.setattr(server, "modify_outfit_image", modify_outfit_image)
+    monkeypatch.setattr(server, "model_limiter", server.ModelCallLimiter(max_concurrency=4, max_per_user=2, max_wait=30))
+    return descriptions
+
+
+def make_original(db, storage, user_email: str, with_image: bool = True) -> str:
+    request = server.OutfitRequest(
+        atmosphere="elegant",
+        suit_type="Costume 2 pièces",
+        lapel_type="Revers cranté",
+        pocket_type="Poches passepoilées",
+        shoe_type="Richelieu",
+        accessory_type="Cravate",
+        user_email=user_email,
+        image_format="webp",
+        status="succeeded",
+    ).dict()
+    asyncio.run(db.outfit_requests.insert_one(request))
+    if with_image:
+        data = server.encode_image(Image.new("RGB", (32, 32), "navy"), "webp")
+        asyncio.run(storage.put(server.image_key(request["id"], "webp"), data))
+    return request["id"]
+
+
+def test_batch_streams_one_line_per_image_then_a_summary(api, login, db, storage, model):
+    user = login(images_limit_total=5)
+    modified = [make_original(db, storage, user.email) for _ in range(2)]
+    missing_image = make_original(db, storage, user.email, with_image=False)
+
+    response = api.post("/api/modify-image/batch", json={
+        "request_ids": modified + [missing_image],
+        "modification_description": "cravate bleue"
+    })
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [orjson.loads(line) for line in response.text.splitlines()]
+
+    *items, summary = lines
+    assert {item["request_id"] for item in items} == set(modified) | {missing_image}
+    failed = [item for item in items if not item["success"]]
+    assert failed == [{"request_id": missing_image, "success": False, "error": "Original image not found"}]
+    for item in items:
+        if item["success"]:
+            assert item["image_filename"] == server.image_filename(item["new_request_id"])
+            assert item["signed_url"].startswith("/api/download/signed/")
+    assert summary["done"] and (summary["succeeded"], summary["failed"]) == (2, 1)
+    assert summary["user_credits"]["remaining"] == 3
+    assert model == ["cravate bleue", "cravate bleue"]
+
+    # Only the successes are charged, the failed item keeps its record as failed
+    owner = asyncio.run(db.users.find_one({"id": user.id}))
+    assert (owner["images_used_total"], owner["images_reserved_total"]) == (2, 0)
+    statuses = {
+        request["original_request_id"]: request["status"]
+        for request in asyncio.run(db.outfit_requests.find({"original_request_id": {"$ne": None}}).to_list(None))
+    }
+    assert statuses == {modified[0]: "succeeded", modified[1]: "succeeded", missing_image: "failed"}
+
+
+def test_batch_is_refused_as_a_whole(api, login, db, storage, model):
+    user = login(images_limit_total=1)
+    own = [make_original(db, storage, user.email) for _ in range(2)]
+    foreign = make_original(db, storage, "other@example.com")
+    body = {"modification_description": "cravate bleue"}
+
+    assert api.post("/api/modify-image/batch", json={**body, "request_ids": []}).status_code == 400
+    assert api.post("/api/modify-image/batch", json={**body, "request_ids": [own[0], foreign]}).status_code == 403
+    assert api.post("/api/modify-image/batch", json={**body, "request_ids": [own[0], str(uuid.uuid4())]}).status_code == 404
+    # Two images, one credit left: nothing starts
+    assert api.post("/api/modify-image/batch", json={**body, "request_ids": own}).status_code == 403
+    assert model == []
+    owner = asyncio.run(db.users.find_one({"id": user.id}))
+    assert (owner["images_used_total"], owner["images_reserved_total"]) == (0, 0)
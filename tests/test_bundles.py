@@ -0,0 +1,68 @@
+"""ZIP bundles of generated images streamed from storage"""
+import asyncio
+import io
+import uuid
+import zipfile
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+
+
+def make_request(db, storage, user_email: str, data: bytes) -> str:
+    request_id = str(uuid.uuid4())
+    asyncio.run(db.outfit_requests.insert_one({
+        "id": request_id,
+        "status": "succeeded",
+        "image_format": "webp",
+        "user_email": user_email,
+        "timestamp": datetime(2026, 5, 1, 12, 30, tzinfo=timezone.utc),
+    }))
+    asyncio.run(storage.put(server.image_key(request_id, "webp"), data))
+    return request_id
+
+
+@pytest.mark.anyio
+async def test_zip_stream_builds_a_valid_archive(storage):
+    # Larger than a storage chunk, so members are written in several pieces
+    images = {f"generated_{i}.webp": bytes([i]) * server.STORAGE_CHUNK_SIZE * (i + 1) + b"end" for i in range(3)}
+    for name, data in images.items():
+        await storage.put(name, data)
+
+    entries = [(name, name, (2026, 5, 1, 12, 30, 0)) for name in images]
+    archive = b"".join([chunk async for chunk in server.zip_stream(entries)])
+
+    with zipfile.ZipFile(io.BytesIO(archive)) as bundle:
+        assert bundle.testzip() is None
+        assert bundle.namelist() == list(images)
+        for info in bundle.infolist():
+            assert info.compress_type == zipfile.ZIP_STORED
+            assert info.date_time == (2026, 5, 1, 12, 30, 0)
+            assert bundle.read(info) == images[info.filename]
+
+
+def test_bundle_download_of_own_images(api, login, db, storage):
+    user = login()
+    request_ids = [make_request(db, storage, user.email, bytes([i]) * 100) for i in range(2)]
+
+    response = api.post("/api/download/bundle", json={"request_ids": request_ids})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(response.content)) as bundle:
+        assert bundle.namelist() == [server.image_filename(request_id, "webp") for request_id in request_ids]
+
+
+def test_bundle_treats_foreign_images_as_missing(api, login, db, storage):
+    own = make_request(db, storage, "client@example.com", b"own")
+    foreign = make_request(db, storage, "other@example.com", b"foreign")
+    unknown = str(uuid.uuid4())
+
+    login()
+    for request_ids in ([own, foreign], [own, unknown]):
+        response = api.post("/api/download/bundle", json={"request_ids": request_ids})
+        assert response.status_code == 404
+        assert response.json()["detail"] == f"Requests not found: {request_ids[1]}"
+
+    login("admin@example.com", server.UserRole.ADMIN)
+    assert api.post("/api/download/bundle", json={"request_ids": [own, foreign]}).status_code == 200
@@ -0,0 +1,52 @@
+"""Atomic credit reservations around model calls"""
+import asyncio
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def make_user(db, limit: int, used: int = 0) -> server.User:
+    user = server.User(nom="Client", email="client@example.com", images_limit_total=limit, images_used_total=used)
+    await db.users.insert_one(user.dict())
+    return user
+
+
+async def credits(db, user: server.User) -> tuple:
+    data = await db.users.find_one({"id": user.id})
+    return data["images_used_total"], data.get("images_reserved_total", 0)
+
+
+async def test_concurrent_reservations_stop_at_the_limit(db):
+    user = await make_user(db, limit=3, used=1)
+
+    results = await asyncio.gather(
+        *(server.CreditReservation.acquire(user.id) for _ in range(4)),
+        return_exceptions=True
+    )
+    granted = [result for result in results if isinstance(result, server.CreditReservation)]
+    refused = [result for result in results if isinstance(result, server.HTTPException)]
+    assert len(granted) == 2
+    assert [error.status_code for error in refused] == [403, 403]
+    assert await credits(db, user) == (1, 2)
+
+
+async def test_commit_charges_and_release_gives_back(db):
+    user = await make_user(db, limit=5)
+    reservation = await server.CreditReservation.acquire(user.id, count=3)
+    assert await credits(db, user) == (0, 3)
+
+    summary = await reservation.commit(1)
+    assert await credits(db, user) == (1, 2)
+    assert summary["remaining"] == 2
+    assert reservation.pending == 2
+
+    summary = await reservation.release()
+    assert await credits(db, user) == (1, 0)
+    assert summary["remaining"] == 4
+    # Nothing is left to hand back or charge
+    await reservation.release()
+    await reservation.commit()
+    assert await credits(db, user) == (1, 0)
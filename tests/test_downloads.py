@@ -0,0 +1,122 @@
+"""Download links and the routes handing them out"""
+import asyncio
+import io
+import uuid
+
+import pytest
+from PIL import Image
+
+import server
+
+
+@pytest.fixture
+def stored_image(storage):
+    """Id of a request whose image is stored as WebP"""
+    request_id = str(uuid.uuid4())
+    data = server.encode_image(Image.new("RGB", (32, 32), "red"), "webp")
+    asyncio.run(storage.put(server.image_key(request_id, "webp"), data))
+    return request_id
+
+
+def test_admin_request_list_requires_an_admin(api):
+    response = api.get("/api/admin/requests")
+    assert response.status_code in (401, 403)
+    assert "signed_url" not in response.text
+
+
+def test_signed_url_is_stable_within_its_window(monkeypatch):
+    monkeypatch.setattr(server.time, "time", lambda: 7200 + 10)
+    first = server.signed_download_url("generated_x.png", ttl=3600)
+    monkeypatch.setattr(server.time, "time", lambda: 7200 + 3000)
+    assert server.signed_download_url("generated_x.png", ttl=3600) == first
+    assert "expires=14400" in first
+
+
+@pytest.mark.parametrize("requested, explicit, accept, served", [
+    ("png", None, "image/avif,image/webp,*/*", "webp"),
+    ("png", None, "image/png,*/*", "png"),
+    ("png", None, "", "png"),
+    ("webp", None, "", "webp"),
+    ("png", "jpeg", "image/webp", "jpeg"),
+    ("png", "tiff", "image/webp;q=0.9", "webp"),
+])
+def test_negotiate_image_format(requested, explicit, accept, served):
+    assert server.negotiate_image_format("webp", requested, explicit, accept) == served
+
+
+def test_download_serves_the_accepted_rendition(api, stored_image):
+    url = f"/api/download/{server.image_filename(stored_image, 'png')}"
+
+    modern = api.get(url, headers={"Accept": "image/webp,*/*"})
+    assert modern.status_code == 200
+    assert modern.headers["content-type"] == "image/webp"
+    assert modern.headers["vary"] == "Accept"
+
+    legacy = api.get(url, headers={"Accept": "*/*"})
+    assert legacy.status_code == 200
+    assert legacy.headers["content-type"] == "image/png"
+    assert Image.open(io.BytesIO(legacy.content)).format == "PNG"
+
+
+@pytest.mark.parametrize("header, byte_range", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=900-", (900, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=500-5000", (500, 999)),
+    ("bytes=0-1,5-6", None),
+    ("items=0-1", None),
+    ("bytes=a-b", None),
+])
+def test_parse_byte_range(header, byte_range):
+    assert server.parse_byte_range(header, 1000) == byte_range
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=1500-2000", "bytes=10-5"])
+def test_parse_byte_range_unsatisfiable(header):
+    with pytest.raises(server.HTTPException) as error:
+        server.parse_byte_range(header, 1000)
+    assert error.value.status_code == 416
+    assert error.value.headers["Content-Range"] == "bytes */1000"
+
+
+def test_download_honours_ranges_and_etags(api, stored_image):
+    url = f"/api/download/{server.image_filename(stored_image, 'webp')}"
+    full = api.get(url)
+    etag = full.headers["etag"]
+    assert "immutable" in full.headers["cache-control"]
+
+    partial = api.get(url, headers={"Range": "bytes=-10"})
+    assert partial.status_code == 206
+    assert partial.content == full.content[-10:]
+    assert partial.headers["content-range"] == f"bytes {len(full.content) - 10}-{len(full.content) - 1}/{len(full.content)}"
+
+    # A stale If-Range gets the whole image back
+    assert api.get(url, headers={"Range": "bytes=0-9", "If-Range": '"other"'}).status_code == 200
+    assert api.get(url, headers={"Range": f"bytes={len(full.content)}-"}).status_code == 416
+
+    cached = api.get(url, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    assert not cached.content
+    assert api.get(url, headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_download_signature_rejects_expired_and_tampered_links(monkeypatch):
+    monkeypatch.setattr(server.time, "time", lambda: 10_000)
+    signature = server.sign_download("generated_x.png", 12_000)
+    assert server.verify_download_signature("generated_x.png", 12_000, signature)
+
+    assert not server.verify_download_signature("generated_x.png", 9_999, server.sign_download("generated_x.png", 9_999))
+    assert not server.verify_download_signature("generated_x.png", 13_000, signature)
+    assert not server.verify_download_signature("generated_y.png", 12_000, signature)
+    assert not server.verify_download_signature("generated_x.png", 12_000, signature[:-1] + ("A" if signature[-1] != "A" else "B"))
+
+
+def test_signed_route_refuses_a_tampered_link(api, stored_image):
+    url = server.signed_download_url(server.image_filename(stored_image, "webp"))
+    response = api.get(url)
+    assert response.status_code == 200
+    assert response.headers["cache-control"].startswith("private, max-age=")
+
+    assert api.get(url.replace("expires=", "expires=1")).status_code == 403
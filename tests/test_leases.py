@@ -0,0 +1,41 @@
+"""Leases held by background jobs"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_long_job_keeps_its_lease(db):
+    other_instance_got_it = []
+
+    async def job():
+        for _ in range(4):
+            await asyncio.sleep(0.1)
+            lease = await db.leases.find_one({"_id": "job"})
+            other_instance_got_it.append(lease["expires_at"].replace(tzinfo=timezone.utc) <= datetime.now(timezone.utc))
+        return "done"
+
+    assert await server.acquire_lease("job", 0.15)
+    assert await server.run_leased("job", job, 0.15) == "done"
+    assert not any(other_instance_got_it)
+
+
+async def test_job_stops_when_its_lease_is_lost(db):
+    finished = asyncio.Event()
+
+    async def job():
+        await asyncio.sleep(1)
+        finished.set()
+
+    assert await server.acquire_lease("job", 0.15)
+    await db.leases.update_one(
+        {"_id": "job"},
+        {"$set": {"holder": "another-instance", "expires_at": datetime.now(timezone.utc) + timedelta(minutes=5)}}
+    )
+    await server.run_leased("job", job, 0.15)
+    await asyncio.sleep(0)
+    assert not finished.is_set()
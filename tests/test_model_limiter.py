@@ -0,0 +1,64 @@
+"""Queue estimates and slot scheduling of the model call limiter"""
+import asyncio
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_estimated_wait_counts_the_user_queue():
+    limiter = server.ModelCallLimiter(max_concurrency=8, max_per_user=2, max_wait=30)
+    limiter._durations.append(10.0)
+    client = server.ROLE_PRIORITIES[server.UserRole.CLIENT]
+    for _ in range(2):
+        await limiter._acquire("alice", server.UserRole.CLIENT)
+
+    # The cluster has room but alice has to wait for one of her own calls
+    assert limiter.estimated_wait(client) == 0.0
+    assert limiter.estimated_wait(client, "alice") == 10.0
+    assert limiter.estimated_wait(client, "bob") == 0.0
+
+    limiter.max_wait = 5
+    with pytest.raises(server.HTTPException) as rejected:
+        limiter.check_capacity("alice", server.UserRole.CLIENT)
+    assert rejected.value.status_code == 429
+    limiter.check_capacity("bob", server.UserRole.CLIENT)
+
+
+async def test_slots_respect_both_caps_and_role_priority():
+    limiter = server.ModelCallLimiter(max_concurrency=2, max_per_user=1, max_wait=60)
+    running = []
+    order = []
+    release = asyncio.Event()
+
+    async def call(user_id: str, role: str):
+        async with limiter.slot(user_id, role):
+            running.append(user_id)
+            order.append(user_id)
+            assert limiter.active <= 2
+            assert limiter.active_per_user[user_id] == 1
+            await release.wait()
+            running.remove(user_id)
+
+    # alice's second call waits for her first, carol and the admin wait for a free slot
+    tasks = [asyncio.create_task(call(user_id, role)) for user_id, role in [
+        ("alice", server.UserRole.CLIENT),
+        ("alice", server.UserRole.CLIENT),
+        ("bob", server.UserRole.CLIENT),
+        ("carol", server.UserRole.CLIENT),
+        ("admin", server.UserRole.ADMIN),
+    ]]
+    try:
+        for _ in range(3):
+            await asyncio.sleep(0)
+        assert sorted(running) == ["alice", "bob"]
+        assert len(limiter._waiters) == 3
+    finally:
+        release.set()
+    await asyncio.gather(*tasks)
+    # Freed slots go to the admin first, then in arrival order
+    assert order[2] == "admin"
+    assert order[3:] == ["alice", "carol"]
+    assert limiter.active == 0 and not limiter._waiters
@@ -0,0 +1,33 @@
+"""Circuit breaker of the image model call policy"""
+import asyncio
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+class HangingChat:
+    async def send_message_multimodal_response(self, msg):
+        await asyncio.Event().wait()
+
+
+async def test_cancelled_probe_lets_the_next_call_probe():
+    breaker = server.CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    policy = server.ModelCallPolicy(
+        timeout=60, max_attempts=1, base_delay=0, max_delay=0,
+        hedge_enabled=False, hedge_percentile=0.9, breaker=breaker
+    )
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+
+    probe = asyncio.ensure_future(policy.call(HangingChat, None, "generate"))
+    await asyncio.sleep(0.01)
+    assert breaker.state == breaker.HALF_OPEN and not breaker.allow()
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    assert breaker.state == breaker.HALF_OPEN
+    assert breaker.allow()
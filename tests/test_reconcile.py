@@ -0,0 +1,61 @@
+"""Reconciliation of request records left behind by interrupted generations"""
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_interrupted_modification_gives_its_credit_back(db, storage, monkeypatch):
+    monkeypatch.setattr(server, "RECONCILE_PENDING_TIMEOUT_SECONDS", 0)
+    user = server.User(nom="Client", email="client@example.com", images_reserved_total=1)
+    await db.users.insert_one(user.dict())
+    original = {
+        "id": str(uuid.uuid4()),
+        "status": "succeeded",
+        "user_email": user.email,
+        "atmosphere": "elegant",
+        "suit_type": "Costume 2 pièces",
+        "lapel_type": "Revers cranté",
+        "pocket_type": "Poches passepoilées",
+        "shoe_type": "Richelieu",
+        "accessory_type": "Cravate",
+        "timestamp": datetime.now(timezone.utc),
+    }
+    await db.outfit_requests.insert_one(dict(original))
+    await storage.put(server.image_key(original["id"]), b"image")
+
+    # The process dies after the record is written, before the model answers
+    new_request = await server.create_modification_record(original, "cravate bleue", user, str(uuid.uuid4()))
+    assert (await db.outfit_requests.find_one({"id": new_request["id"]}))["status"] == "pending"
+
+    report = await server.reconcile_requests(repair=True)
+    assert report["stale_pending"] == 1
+    assert (await db.outfit_requests.find_one({"id": new_request["id"]}))["status"] == "failed"
+    owner = await db.users.find_one({"email": user.email})
+    assert (owner["images_used_total"], owner["images_reserved_total"]) == (0, 0)
+
+
+async def test_interrupted_generation_with_its_image_is_charged(db, storage, monkeypatch):
+    monkeypatch.setattr(server, "RECONCILE_PENDING_TIMEOUT_SECONDS", 0)
+    user = server.User(nom="Client", email="client@example.com", images_reserved_total=1)
+    await db.users.insert_one(user.dict())
+    request = {
+        "id": str(uuid.uuid4()),
+        "status": "pending",
+        "image_format": "webp",
+        "user_email": user.email,
+        "timestamp": datetime.now(timezone.utc),
+    }
+    await db.outfit_requests.insert_one(dict(request))
+    # The image was stored, the process died before marking the request
+    await storage.put(server.image_key(request["id"], "webp"), b"image")
+
+    report = await server.reconcile_requests(repair=True)
+    assert report["stale_pending"] == 1
+    assert (await db.outfit_requests.find_one({"id": request["id"]}))["status"] == "succeeded"
+    owner = await db.users.find_one({"email": user.email})
+    assert (owner["images_used_total"], owner["images_reserved_total"]) == (1, 0)
@@ -0,0 +1,60 @@
+"""Request lists and the per-request detail routes"""
+import asyncio
+import uuid
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def stored_request(db):
+    """A succeeded request of client@example.com with a fabric description"""
+    request = server.OutfitRequest(
+        atmosphere="elegant",
+        suit_type="Costume 2 pièces",
+        lapel_type="Revers cranté",
+        pocket_type="Poches passepoilées",
+        shoe_type="Richelieu",
+        accessory_type="Cravate",
+        fabric_description="Flanelle grise",
+        user_email="client@example.com",
+        status="succeeded",
+    ).dict()
+    asyncio.run(db.outfit_requests.insert_one(dict(request)))
+    return request
+
+
+def test_my_requests_are_projected_summaries(api, login, stored_request):
+    login()
+    rows = api.get("/api/my-requests").json()
+    assert [row["id"] for row in rows] == [stored_request["id"]]
+    assert set(rows[0]) == set(server.REQUEST_SUMMARY_FIELDS) | {"signed_url"}
+
+    rows = api.get("/api/my-requests", params={"fields": "id,fabric_description"}).json()
+    assert {key: value for key, value in rows[0].items() if key != "signed_url"} == {
+        "id": stored_request["id"], "fabric_description": "Flanelle grise"
+    }
+    assert api.get("/api/my-requests", params={"fields": "id,password"}).status_code == 400
+
+
+def test_other_users_requests_are_not_listed(api, login, stored_request):
+    login("other@example.com")
+    assert api.get("/api/my-requests").json() == []
+
+
+def test_request_detail_is_for_its_owner_and_admins(api, login, stored_request):
+    url = f"/api/requests/{stored_request['id']}"
+    login()
+    detail = api.get(url).json()
+    assert detail["fabric_description"] == "Flanelle grise"
+    assert detail["lineage_path"] == []
+
+    login("other@example.com")
+    assert api.get(url).status_code == 403
+    assert api.get(f"{url}/lineage").status_code == 403
+
+    login("admin@example.com", server.UserRole.ADMIN)
+    assert api.get(url).json()["id"] == stored_request["id"]
+    assert api.get(f"{url}/lineage").json()["root_request_id"] == stored_request["id"]
+    assert api.get(f"/api/requests/{uuid.uuid4()}").status_code == 404
@@ -0,0 +1,164 @@
+"""Retention sweep against the storage budget, on local storage and an in-memory database"""
+import io
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from PIL import Image
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+IMAGE_BYTES = 1000
+MASTER_BYTES = 1000
+RENDITION_BYTES = 500
+
+
+async def make_request(db, storage, age_days: int, rendition: bool = False) -> dict:
+    """A succeeded request with its image and master, optionally a PNG rendition"""
+    request = {
+        "id": str(uuid.uuid4()),
+        "status": "succeeded",
+        "image_format": "webp",
+        "master_format": "webp",
+        "user_email": "client@example.com",
+        "atmosphere": "elegant",
+        "suit_type": "Costume 2 pièces",
+        "timestamp": datetime.now(timezone.utc) - timedelta(days=age_days),
+    }
+    await db.outfit_requests.insert_one(dict(request))
+    await storage.put(server.image_key(request["id"], "webp"), b"i" * IMAGE_BYTES)
+    await storage.put(server.master_key(request["id"], "webp"), b"m" * MASTER_BYTES)
+    if rendition:
+        await storage.put(server.rendition_key(request["id"], "png"), b"r" * RENDITION_BYTES)
+    return request
+
+
+@pytest.fixture
+def budget(monkeypatch):
+    def set_budget(bytes_: int, action: str):
+        monkeypatch.setattr(server, "RETENTION_STORAGE_BUDGET_BYTES", bytes_)
+        monkeypatch.setattr(server, "RETENTION_ACTION", action)
+        monkeypatch.setattr(server, "RETENTION_MAX_AGE_DAYS", 0)
+        monkeypatch.setattr(server, "RETENTION_INACTIVE_USER_DAYS", 0)
+        monkeypatch.setattr(server, "RETENTION_EMAIL_QUEUE_DAYS", 0)
+    return set_budget
+
+
+async def live_ids(db) -> set:
+    return set(await db.outfit_requests.distinct("id", {"archived_at": {"$exists": False}}))
+
+
+async def test_archive_budget_is_stable_across_runs(db, storage, budget):
+    requests = [await make_request(db, storage, age_days=30 - i) for i in range(3)]
+    # 6000 live bytes, 1500 over budget: archiving the oldest request frees 2000
+    budget(4500, "archive")
+
+    report = await server.run_retention_sweep()
+    assert report["policies"]["storage_budget"]["expired"] == 1
+    assert await live_ids(db) == {requests[1]["id"], requests[2]["id"]}
+
+    # Archived copies live on the same storage but no longer count
+    report = await server.run_retention_sweep()
+    assert report["policies"]["storage_budget"]["used_bytes"] == 4000
+    assert "expired" not in report["policies"]["storage_budget"]
+    assert await live_ids(db) == {requests[1]["id"], requests[2]["id"]}
+    assert await storage.stat(server.ARCHIVE_PREFIX + server.image_key(requests[0]["id"], "webp"))
+    assert await storage.stat(server.master_key(requests[0]["id"], "webp")) is None
+    assert await storage.stat(server.ARCHIVE_PREFIX + server.master_key(requests[0]["id"], "webp"))
+
+
+async def test_delete_budget_credits_masters_and_renditions(db, storage, budget):
+    oldest = await make_request(db, storage, age_days=30, rendition=True)
+    newer = await make_request(db, storage, age_days=10)
+    # 4500 live bytes, 2000 over budget: the oldest request alone frees 2500
+    budget(2500, "delete")
+
+    report = await server.run_retention_sweep()
+    assert report["policies"]["storage_budget"]["expired"] == 1
+    assert report["policies"]["storage_budget"]["bytes"] == IMAGE_BYTES + MASTER_BYTES + RENDITION_BYTES
+    assert await db.outfit_requests.find_one({"id": oldest["id"]}) is None
+    assert await db.outfit_requests.find_one({"id": newer["id"]})
+    assert await storage.stat(server.image_key(newer["id"], "webp"))
+
+
+async def test_budget_dry_run_changes_nothing(db, storage, budget):
+    requests = [await make_request(db, storage, age_days=30 - i) for i in range(2)]
+    budget(1000, "delete")
+
+    report = await server.run_retention_sweep(dry_run=True)
+    assert report["policies"]["storage_budget"]["matched"] == 2
+    assert await live_ids(db) == {request["id"] for request in requests}
+    assert (await storage.usage(server.is_hot_image_key))[1] == 4000
+
+
+async def test_budget_ignores_offline_copies(db, storage, budget):
+    await make_request(db, storage, age_days=30)
+    await storage.put(server.COLD_PREFIX + "2026-01/bundle.tar", b"c" * 10_000)
+    await storage.put("email_queue/attachment.png", b"e" * 10_000)
+    budget(2000, "delete")
+
+    report = await server.run_retention_sweep()
+    assert report["policies"]["storage_budget"]["used_bytes"] == 2000
+    assert len(await live_ids(db)) == 1
+
+
+async def test_budget_spares_requests_without_live_bytes(db, storage, budget):
+    cold = await make_request(db, storage, age_days=60)
+    await storage.delete(server.image_key(cold["id"], "webp"))
+    await storage.delete(server.master_key(cold["id"], "webp"))
+    await db.outfit_requests.update_one({"id": cold["id"]}, {"$set": {"cold_bundle": "cold/2026-01/0.tar"}})
+    missing = await make_request(db, storage, age_days=50)
+    await storage.delete(server.image_key(missing["id"], "webp"))
+    await storage.delete(server.master_key(missing["id"], "webp"))
+    newest = await make_request(db, storage, age_days=10)
+    budget(1000, "delete")
+
+    report = await server.run_retention_sweep()
+    assert report["policies"]["storage_budget"]["skipped"] == 1
+    assert report["policies"]["storage_budget"]["expired"] == 1
+    assert await live_ids(db) == {cold["id"], missing["id"]}
+    assert await db.outfit_requests.find_one({"id": newest["id"]}) is None
+
+
+def solid_image(color: str) -> bytes:
+    return server.encode_image(Image.new("RGB", (64, 64), color), "webp")
+
+
+async def modification_base_color(request_id: str) -> tuple:
+    request = await server.db.outfit_requests.find_one({"id": request_id}, {"_id": 0})
+    data = await server.read_modification_base(request)
+    return Image.open(io.BytesIO(data)).convert("RGB").getpixel((32, 32))
+
+
+async def make_watermarked_request(db, storage) -> dict:
+    """A request whose stored image (blue) differs from its master (red)"""
+    request = await make_request(db, storage, age_days=400)
+    await storage.put(server.image_key(request["id"], "webp"), solid_image("blue"))
+    await storage.put(server.master_key(request["id"], "webp"), solid_image("red"))
+    return request
+
+
+async def test_archived_request_is_modified_from_its_master(db, storage):
+    request = await make_watermarked_request(db, storage)
+    assert await server.archive_request(request)
+
+    red, _, blue = await modification_base_color(request["id"])
+    assert red > 200 and blue < 50
+
+
+async def test_cold_bundled_request_is_modified_from_its_master(db, storage, monkeypatch):
+    request = await make_watermarked_request(db, storage)
+    monkeypatch.setattr(server, "COLD_ARCHIVE_AFTER_DAYS", 180)
+
+    report = await server.run_cold_archival()
+    assert report["bundled"] == 1
+    assert await storage.stat(server.master_key(request["id"], "webp")) is None
+
+    red, _, blue = await modification_base_color(request["id"])
+    assert red > 200 and blue < 50
+    # The image itself still comes back from the bundle
+    data, image_format = await server.read_image(request["id"])
+    assert image_format == "webp"
+    assert Image.open(io.BytesIO(data)).convert("RGB").getpixel((32, 32))[2] > 200
@@ -0,0 +1,46 @@
+"""Rebuild of the stats counters"""
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_rebuild_counts_one_image_per_live_request(db, storage):
+    for status, archived in (("succeeded", False), ("succeeded", False), ("succeeded", True), ("failed", False)):
+        request = {"id": str(uuid.uuid4()), "status": status, "timestamp": datetime.now(timezone.utc)}
+        if archived:
+            request["archived_at"] = datetime.now(timezone.utc)
+        await db.outfit_requests.insert_one(request)
+        await storage.put(server.image_key(request["id"], "webp"), b"image")
+        await storage.put(server.master_key(request["id"], "webp"), b"master")
+        await storage.put(server.rendition_key(request["id"], "png"), b"rendition")
+
+    await server.rebuild_stats()
+    totals = {row["key"]: row["count"] async for row in db.stats.find({"kind": "total"})}
+    assert totals == {"requests": 3, "images": 2}
+
+
+async def test_deleting_an_archived_request_keeps_counters_in_line(db, storage):
+    requests = []
+    for _ in range(2):
+        request = {
+            "id": str(uuid.uuid4()), "status": "succeeded", "image_format": "webp",
+            "atmosphere": "elegant", "suit_type": "Costume 2 pièces", "timestamp": datetime.now(timezone.utc)
+        }
+        await db.outfit_requests.insert_one(dict(request))
+        await storage.put(server.image_key(request["id"], "webp"), b"image")
+        await server.record_request_stats(request)
+        requests.append(request)
+
+    assert await server.archive_request(requests[0])
+    assert await server.remove_request(requests[0]["id"])
+    counters = {row["_id"]: row["count"] async for row in db.stats.find()}
+
+    await server.rebuild_stats()
+    rebuilt = {row["_id"]: row["count"] async for row in db.stats.find()}
+    assert counters["total:images"] == rebuilt["total:images"] == 1
+    assert counters["total:requests"] == rebuilt["total:requests"] == 1
@@ -0,0 +1,88 @@
+"""Image storage keys of request records"""
+import uuid
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_local_list_keys_walks_the_whole_tree(storage):
+    keys = {server.image_key(str(uuid.uuid4()), "webp") for _ in range(2500)}
+    for key in keys:
+        await storage.put(key, b"image")
+    await storage.put(".hidden", b"hidden")
+
+    assert {key async for key in storage.list_keys()} == keys
+
+
+async def test_delete_image_only_touches_the_record_keys(db, storage, monkeypatch):
+    request = {"id": str(uuid.uuid4()), "status": "succeeded", "image_format": "webp", "master_format": "webp"}
+    await db.outfit_requests.insert_one(dict(request))
+    await storage.put(server.image_key(request["id"], "webp"), b"image")
+    await storage.put(server.master_key(request["id"], "webp"), b"master")
+    await storage.put(server.rendition_key(request["id"], "png"), b"rendition")
+
+    deleted_keys = []
+    delete = storage.delete
+
+    async def tracked_delete(key):
+        deleted_keys.append(key)
+        return await delete(key)
+
+    monkeypatch.setattr(storage, "delete", tracked_delete)
+    assert await server.delete_image(request["id"])
+    assert sorted(deleted_keys) == sorted(server.request_hot_keys(request))
+    assert [key async for key in storage.list_keys()] == []
+
+
+async def test_delete_image_without_record_tries_every_location(db, storage):
+    request_id = str(uuid.uuid4())
+    await storage.put(server.ARCHIVE_PREFIX + server.image_key(request_id, "png"), b"archived")
+    await storage.put(server.master_key(request_id, "jpeg"), b"master")
+
+    assert await server.delete_image(request_id)
+    assert [key async for key in storage.list_keys()] == []
+
+
+async def test_local_storage_round_trip(storage):
+    key = server.image_key(str(uuid.uuid4()), "webp")
+    await storage.put(key, b"0123456789")
+
+    assert await storage.get(key) == b"0123456789"
+    assert (await storage.stat(key)).size == 10
+    assert b"".join([chunk async for chunk in storage.stream(key, chunk_size=3, start=2, end=6)]) == b"23456"
+
+    await storage.move(key, server.ARCHIVE_PREFIX + key)
+    assert await storage.get(key) is None
+    assert await storage.stat(key) is None
+    assert await storage.delete(server.ARCHIVE_PREFIX + key)
+    assert not await storage.delete(server.ARCHIVE_PREFIX + key)
+    assert await storage.usage() == (0, 0)
+
+
+async def test_local_storage_rejects_keys_outside_its_root(storage):
+    with pytest.raises(ValueError):
+        await storage.put("../outside.png", b"image")
+    with pytest.raises(ValueError):
+        await storage.get("ab/../../outside.png")
+
+
+async def test_migration_moves_flat_images_into_shards(db, storage):
+    request_id = str(uuid.uuid4())
+    await storage.put(server.legacy_image_key(request_id), b"flat")
+    await storage.put("notes.txt", b"other")
+    # Readers fall back to the flat key until the image has moved
+    assert await server.resolve_image(request_id) == (server.legacy_image_key(request_id), "png")
+
+    report = await server.migrate_image_layout(dry_run=True)
+    assert (report["moved"], report["skipped"]) == (1, 1)
+    assert await storage.stat(server.legacy_image_key(request_id))
+
+    report = await server.migrate_image_layout()
+    assert (report["moved"], report["skipped"], report["failed"]) == (1, 1, 0)
+    sharded = server.image_key(request_id, "png")
+    assert sharded.startswith(server.image_shard(request_id) + "/")
+    assert await server.resolve_image(request_id) == (sharded, "png")
+    assert await storage.get(sharded) == b"flat"
@@ -0,0 +1,24 @@
+"""Pipeline timings recorded on request documents"""
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_failed_generation_keeps_its_timings(db, storage):
+    request_id = str(uuid.uuid4())
+    await db.outfit_requests.insert_one({"id": request_id, "status": "pending", "timestamp": datetime.now(timezone.utc)})
+    timer = server.StageTimer("generate")
+    with timer.stage("model"):
+        pass
+
+    await server.abandon_generation(None, request_id, "Délai dépassé", timer=timer)
+    request = await db.outfit_requests.find_one({"id": request_id})
+    assert request["status"] == "failed"
+    assert request["failure_reason"] == "Délai dépassé"
+    assert request["timings"]["outcome"] == "failed"
+    assert "model" in request["timings"]["stages_ms"]